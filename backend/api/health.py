@@ -0,0 +1,42 @@
+from datetime import datetime
+
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from services.health_service import readiness
+from settings import settings
+
+router = APIRouter(prefix="/api/health", tags=["health"])
+
+
+def _base(status: str) -> dict:
+    return {
+        "status": status,
+        "timestamp": datetime.utcnow().isoformat(),
+        "service": "agenterra-local-app-backend-v1",
+        "version": settings.SERVICE_VERSION
+    }
+
+
+@router.get("")
+async def health_check():
+    """健康检查接口（存活探测，不访问任何依赖）"""
+
+    return JSONResponse(content=_base("healthy"), status_code=200)
+
+
+@router.get("/live")
+async def liveness():
+    """存活探测"""
+
+    return JSONResponse(content=_base("alive"), status_code=200)
+
+
+@router.get("/ready")
+def readiness_check():
+    """就绪探测：数据库、连接池、主密钥、缓存预热，结果短暂缓存"""
+
+    ready, checks = readiness()
+    content = _base("ready" if ready else "not_ready")
+    content["checks"] = checks
+    return JSONResponse(content=content, status_code=200 if ready else 503)
@@ -0,0 +1,21 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from database import get_read_db
+from models.v1.services import Service
+from schemas.v1.changes import ChangePage
+from services.change_service import TRACKED, read_page
+
+router = APIRouter(prefix="/api/v1/changes", tags=["changes"])
+
+
+@router.get("", response_model=ChangePage)
+def get_changes(since: int = Query(default=0, ge=0), limit: int = Query(default=500, ge=1, le=1000),
+                entity: str = Query(None), service: str = Query(None), db: Session = Depends(get_read_db)):
+    if entity and entity not in TRACKED:
+        raise HTTPException(status_code=400, detail=f"entity must be one of {', '.join(TRACKED)}")
+    service_id = None
+    if service:
+        service_id = db.query(Service.id).filter(Service.code == service).scalar()
+        if service_id is None:
+            raise HTTPException(status_code=404, detail="service not found")
+    return read_page(db, since, limit, entity, service_id)
@@ -1,9 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from database import get_db
-from models.v1.configs import Config, ConfigVersion
+from database import get_db, get_read_db
+from models.v1.configs import Config, ConfigVersion, ConfigLayer, ConfigMergedView
 from models.v1.services import Service
-from schemas.v1.configs import ConfigCreate, ConfigUpdate, ConfigOut, ConfigVersionOut, RollbackReq, ImportTextReq
+from schemas.v1.configs import ConfigCreate, ConfigUpdate, ConfigOut, ConfigVersionOut, RollbackReq, ImportTextReq, \
+    ValidateReq, ValidateResultOut, LayerUpsert, LayerOut, MergedViewOut
+from services.config_service import parse_content, validate_schema, refresh_views, normalize_content, env_layer_map, \
+    prepare_content, ensure_layer_plain
+from services import secret_service
+from services.webhook_service import enqueue_config_change
+from database import SessionLocal
 import difflib
 import json
 import re
@@ -14,7 +21,7 @@ def is_valid_version(v: str) -> bool:
     return bool(re.fullmatch(r"\d+\.\d+\.\d+", v))
 
 @router.get("")
-def list_configs(service: str = Query(None), env: str = Query(None), db: Session = Depends(get_db)):
+def list_configs(service: str = Query(None), env: str = Query(None), db: Session = Depends(get_read_db)):
     q = db.query(Config).join(Service)
     if service:
         q = q.filter(Service.code == service)
@@ -31,35 +38,22 @@ def create_config(payload: ConfigCreate, db: Session = Depends(get_db)):
     s = db.query(Service).filter(Service.code == payload.service_code).first()
     if not s:
         raise HTTPException(status_code=404)
-    if payload.format != "json":
-        raise HTTPException(status_code=400, detail="format must be json")
-    try:
-        obj = json.loads(payload.content)
-    except Exception:
-        raise HTTPException(status_code=400, detail="content must be valid json")
+    content_str, str_map = normalize_content(payload.format, payload.content)
     if not is_valid_version(payload.version):
         raise HTTPException(status_code=400, detail="version must be x.y.z")
     exists = db.query(Config).filter(Config.service_id == s.id, Config.env == payload.env).first()
     if exists:
         raise HTTPException(status_code=409,
                             detail=f"Config for service '{payload.service_code}' and env '{payload.env}' already exists")
-    str_map = {}
-    if isinstance(obj, dict):
-        for k, v in obj.items():
-            if isinstance(v, (dict, list)):
-                str_map[k] = json.dumps(v, ensure_ascii=False)
-            else:
-                str_map[k] = str(v)
-    else:
-        raise HTTPException(status_code=400, detail="content must be object")
-    content_str = json.dumps(str_map, ensure_ascii=False, indent=2)
-    c = Config(service_id=s.id, env=payload.env, format=payload.format, content=content_str,
+    c = Config(service_id=s.id, env=payload.env, format=payload.format, content="",
                schema_def=payload.schema_def, version=payload.version)
     db.add(c)
-    db.commit()
-    db.refresh(c)
+    db.flush()
+    c.content = prepare_content(db, c, payload.format, content_str, str_map, payload.schema_def)
     snap = ConfigVersion(config_id=c.id, version=payload.version, content=c.content)
     db.add(snap)
+    refresh_views(db, configs=[c])
+    enqueue_config_change(db, c, "config.created")
     db.commit()
     db.refresh(c)
     return c
@@ -70,12 +64,7 @@ def update_config(config_id: int, payload: ConfigUpdate, db: Session = Depends(g
     c = db.query(Config).filter(Config.id == config_id).first()
     if not c:
         raise HTTPException(status_code=404)
-    if c.format != "json":
-        raise HTTPException(status_code=400, detail="format must be json")
-    try:
-        obj = json.loads(payload.content)
-    except Exception:
-        raise HTTPException(status_code=400, detail="content must be valid json")
+    content_str, str_map = normalize_content(c.format, payload.content)
     if not is_valid_version(payload.version) or not is_valid_version(payload.base_version):
         raise HTTPException(status_code=400, detail="version must be x.y.z")
     if c.version != payload.base_version:
@@ -84,31 +73,151 @@ def update_config(config_id: int, payload: ConfigUpdate, db: Session = Depends(g
                                          ConfigVersion.version == payload.version).first()
     if dup:
         raise HTTPException(status_code=409, detail="version already exists")
-    str_map = {}
-    if isinstance(obj, dict):
-        for k, v in obj.items():
-            if isinstance(v, (dict, list)):
-                str_map[k] = json.dumps(v, ensure_ascii=False)
-            else:
-                str_map[k] = str(v)
-    else:
-        raise HTTPException(status_code=400, detail="content must be object")
-    c.content = json.dumps(str_map, ensure_ascii=False, indent=2)
+    c.content = prepare_content(db, c, c.format, content_str, str_map, payload.schema_def)
     c.schema_def = payload.schema_def
     c.updated_by = payload.updated_by
     snap = ConfigVersion(config_id=c.id, version=payload.version, content=c.content)
     c.version = payload.version
     db.add(snap)
     db.add(c)
+    refresh_views(db, configs=[c])
+    enqueue_config_change(db, c, "config.updated")
     db.commit()
     db.refresh(c)
     return c
 
 
+@router.post("/validate", response_model=list[ValidateResultOut])
+def validate_configs(payload: ValidateReq, db: Session = Depends(get_db)):
+    s = db.query(Service).filter(Service.code == payload.service_code).first()
+    if not s:
+        raise HTTPException(status_code=404, detail="service not found")
+    rows = db.query(Config).filter(Config.service_id == s.id).order_by(Config.env.asc()).all()
+    results = []
+    for c in rows:
+        schema_def = payload.schema_def if payload.schema_def is not None else c.schema_def
+        try:
+            errors = validate_schema(schema_def, secret_service.decrypt_map(db, c.id, env_layer_map(c)))
+        except ValueError:
+            errors = [{"key": "", "error": "content parse failed"}]
+        except HTTPException as e:
+            errors = [{"key": "", "error": str(e.detail)}]
+        results.append({"config_id": c.id, "env": c.env, "version": c.version, "valid": not errors,
+                        "errors": errors})
+    return results
+
+
+@router.get("/layers", response_model=list[LayerOut])
+def list_layers(scope: str = Query(None), service: str = Query(None), env: str = Query(None),
+                db: Session = Depends(get_read_db)):
+    q = db.query(ConfigLayer)
+    if scope:
+        q = q.filter(ConfigLayer.scope == scope)
+    if service:
+        q = q.join(Service, ConfigLayer.service_id == Service.id).filter(Service.code == service)
+    if env:
+        q = q.filter(ConfigLayer.env == env)
+    return q.order_by(ConfigLayer.id.asc()).all()
+
+
+@router.post("/layers", response_model=LayerOut)
+def upsert_layer(payload: LayerUpsert, db: Session = Depends(get_db)):
+    layer_map = parse_content("json", payload.content)
+    content = json.dumps(layer_map, ensure_ascii=False, indent=2)
+    service_id = None
+    env = None
+    instance = None
+    if payload.scope != "global":
+        s = db.query(Service).filter(Service.code == payload.service_code).first()
+        if not s:
+            raise HTTPException(status_code=404, detail="service not found")
+        service_id = s.id
+    if payload.scope == "instance":
+        if not payload.env or not payload.instance:
+            raise HTTPException(status_code=400, detail="instance layer requires env and instance")
+        env = payload.env
+        instance = payload.instance
+    ensure_layer_plain(db, layer_map, payload.scope, service_id, env)
+    scope_key = ConfigLayer.make_scope_key(payload.scope, service_id, env, instance)
+    layer = db.query(ConfigLayer).filter(ConfigLayer.scope_key == scope_key).with_for_update().first()
+    if not layer:
+        layer = ConfigLayer(scope=payload.scope, service_id=service_id, env=env, instance=instance,
+                            scope_key=scope_key, content=content, version=1, updated_by=payload.updated_by)
+        db.add(layer)
+        try:
+            db.flush()
+        except IntegrityError:
+            # 并发请求已先插入同一层，改为更新该行
+            db.rollback()
+            layer = db.query(ConfigLayer).filter(ConfigLayer.scope_key == scope_key).with_for_update().one()
+            layer.version = ConfigLayer.version + 1
+    else:
+        # 在 SQL 中自增，不支持行锁的库（SQLite）上并发更新也不会丢版本
+        layer.version = ConfigLayer.version + 1
+    layer.content = content
+    layer.updated_by = payload.updated_by
+    _refresh_layer_dependents(db, layer)
+    db.commit()
+    db.refresh(layer)
+    return layer
+
+
+@router.delete("/layers/{layer_id}")
+def delete_layer(layer_id: int, db: Session = Depends(get_db)):
+    layer = db.query(ConfigLayer).filter(ConfigLayer.id == layer_id).first()
+    if not layer:
+        raise HTTPException(status_code=404)
+    db.delete(layer)
+    _refresh_layer_dependents(db, layer)
+    db.commit()
+    return {"ok": True}
+
+
+def _refresh_layer_dependents(db: Session, layer: ConfigLayer) -> int:
+    if layer.scope == "global":
+        return refresh_views(db, all_configs=True)
+    if layer.scope == "service":
+        return refresh_views(db, service_ids=[layer.service_id])
+    return refresh_views(db, configs=db.query(Config).filter(Config.service_id == layer.service_id,
+                                                             Config.env == layer.env).all())
+
+
+@router.post("/views/rebuild")
+def rebuild_views(db: Session = Depends(get_db)):
+    changed = refresh_views(db, all_configs=True)
+    db.commit()
+    return {"changed": changed}
+
+
+@router.post("/secrets/rewrap")
+def rewrap_secrets(background_tasks: BackgroundTasks):
+    background_tasks.add_task(_run_rewrap_data_keys)
+    return {"scheduled": True}
+
+
+def _run_rewrap_data_keys():
+    db = SessionLocal()
+    try:
+        secret_service.rewrap_data_keys(db)
+    finally:
+        db.close()
+
+
+@router.get("/{config_id}/merged", response_model=MergedViewOut)
+def get_merged_view(config_id: int, instance: str = Query(""), db: Session = Depends(get_read_db)):
+    rows = db.query(ConfigMergedView).filter(ConfigMergedView.config_id == config_id,
+                                             ConfigMergedView.instance.in_([instance, ""])).all()
+    if not rows:
+        raise HTTPException(status_code=404)
+    v = max(rows, key=lambda r: r.instance)
+    return {"config_id": v.config_id, "instance": v.instance, "etag": v.etag, "deps": v.deps,
+            "content": json.loads(v.content)}
+
+
 # 发布概念已移除
 
 @router.get("/{config_id}/versions", response_model=list[ConfigVersionOut])
-def list_versions(config_id: int, db: Session = Depends(get_db)):
+def list_versions(config_id: int, db: Session = Depends(get_read_db)):
     rows = db.query(ConfigVersion).filter(ConfigVersion.config_id == config_id).order_by(
         ConfigVersion.created_at.asc()).all()
     return [{"version": r.version, "summary": r.summary, "created_by": r.created_by, "created_at": str(r.created_at)}
@@ -130,18 +239,22 @@ def rollback(config_id: int, payload: RollbackReq, db: Session = Depends(get_db)
                                          ConfigVersion.version == payload.new_version).first()
     if dup:
         raise HTTPException(status_code=409, detail="version already exists")
-    c.content = v.content
+    # 历史版本可能早于 secret 标记，按当前 schema 重新校验与封装
+    content_str, str_map = normalize_content(c.format, v.content)
+    c.content = prepare_content(db, c, c.format, content_str, str_map, c.schema_def)
     snap = ConfigVersion(config_id=c.id, version=payload.new_version, content=c.content, summary=payload.summary)
     c.version = payload.new_version
     db.add(snap)
     db.add(c)
+    refresh_views(db, configs=[c])
+    enqueue_config_change(db, c, "config.rolled_back")
     db.commit()
     return {"version": c.version}
 
 
 @router.get("/{config_id}/diff")
 def diff_versions(config_id: int, from_version: str = Query(..., alias="from"),
-                  to_version: str = Query(..., alias="to"), db: Session = Depends(get_db)):
+                  to_version: str = Query(..., alias="to"), db: Session = Depends(get_read_db)):
     a = db.query(ConfigVersion).filter(ConfigVersion.config_id == config_id,
                                        ConfigVersion.version == from_version).first()
     b = db.query(ConfigVersion).filter(ConfigVersion.config_id == config_id,
@@ -177,13 +290,15 @@ def import_config(payload: ImportTextReq, db: Session = Depends(get_db)):
     if not c:
         if not is_valid_version(payload.new_version):
             raise HTTPException(status_code=400, detail="version must be x.y.z")
-        c = Config(service_id=s.id, env=payload.env, format="json", content=content, version=payload.new_version,
+        c = Config(service_id=s.id, env=payload.env, format="json", content="", version=payload.new_version,
                    updated_by=payload.updated_by)
         db.add(c)
-        db.commit()
-        db.refresh(c)
+        db.flush()
+        c.content = prepare_content(db, c, "json", content, kv, None)
         snap = ConfigVersion(config_id=c.id, version=payload.new_version, content=c.content, summary="import create")
         db.add(snap)
+        refresh_views(db, configs=[c])
+        enqueue_config_change(db, c, "config.imported")
         db.commit()
         return {"id": c.id, "version": c.version}
     # overwrite existing
@@ -197,11 +312,13 @@ def import_config(payload: ImportTextReq, db: Session = Depends(get_db)):
                                          ConfigVersion.version == payload.new_version).first()
     if dup:
         raise HTTPException(status_code=409, detail="version already exists")
-    c.content = content
+    c.content = prepare_content(db, c, "json", content, kv, c.schema_def)
     c.updated_by = payload.updated_by
     snap = ConfigVersion(config_id=c.id, version=payload.new_version, content=c.content, summary="import overwrite")
     c.version = payload.new_version
     db.add(snap)
     db.add(c)
+    refresh_views(db, configs=[c])
+    enqueue_config_change(db, c, "config.imported")
     db.commit()
     return {"id": c.id, "version": c.version}
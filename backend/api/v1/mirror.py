@@ -0,0 +1,62 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from sqlalchemy.orm import Session
+from database import get_db
+from schemas.v1.changes import ChangePage
+from schemas.v1.mirror import MirrorRowsReq
+from services import change_service, mirror_service
+from settings import settings
+from tasks.mirror_sync_task import mirror, mirror_enabled
+
+import hmac
+
+router = APIRouter(prefix="/api/v1/mirror", tags=["mirror"])
+
+MAX_ROWS_PER_REQUEST = 2000
+# 同步接口固定读主库：镜像把 /rows 中缺失的行当作已删除，若清单或流水与行数据分别来自进度不同的副本，
+# 尚未复制到副本的行会被误删，且游标已越过对应变更
+
+
+def _check_sync_token(authorization: str | None) -> None:
+    expected = str(settings.MIRROR_SYNC_TOKEN or "")
+    # 未配置同步口令的主库不对外提供镜像数据
+    if not expected or mirror_enabled():
+        raise HTTPException(status_code=404)
+    token = authorization.split(" ", 1)[1] if authorization and authorization.lower().startswith("bearer ") else ""
+    if not hmac.compare_digest(token.encode(), expected.encode()):
+        raise HTTPException(status_code=401, detail="invalid mirror sync token")
+
+
+@router.get("/manifest")
+def get_manifest(authorization: str | None = Header(default=None, alias="Authorization"),
+                 db: Session = Depends(get_db)):
+    _check_sync_token(authorization)
+    # 先取稳定 revision 再生成清单：清单至少包含该 revision 之前的全部变更，镜像从这里接着读变更流水
+    revision = change_service.stable_revision(db)
+    return {"revision": revision, "tables": mirror_service.build_manifest(db)}
+
+
+@router.get("/changes", response_model=ChangePage)
+def get_changes(since: int = Query(default=0, ge=0), limit: int = Query(default=500, ge=1, le=MAX_ROWS_PER_REQUEST),
+                authorization: str | None = Header(default=None, alias="Authorization"),
+                db: Session = Depends(get_db)):
+    _check_sync_token(authorization)
+    return change_service.read_page(db, since, limit)
+
+
+@router.post("/rows")
+def get_rows(payload: MirrorRowsReq, authorization: str | None = Header(default=None, alias="Authorization"),
+             db: Session = Depends(get_db)):
+    _check_sync_token(authorization)
+    unknown = set(payload.tables) - set(mirror_service.MODELS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"unknown tables: {', '.join(sorted(unknown))}")
+    if sum(len(ids) for ids in payload.tables.values()) > MAX_ROWS_PER_REQUEST:
+        raise HTTPException(status_code=400, detail=f"at most {MAX_ROWS_PER_REQUEST} rows per request")
+    return mirror_service.dump_rows(db, payload.tables)
+
+
+@router.get("/status")
+def mirror_status():
+    if not mirror_enabled():
+        return {"enabled": False, "serving": bool(settings.MIRROR_SYNC_TOKEN)}
+    return mirror.status()
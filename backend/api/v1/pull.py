@@ -1,57 +1,85 @@
-from fastapi import APIRouter, Depends, Header, Request, HTTPException
+from fastapi import APIRouter, Depends, Header, Request, HTTPException, Query
 from sqlalchemy.orm import Session
-from database import get_db
-from middleware.logging import get_logger
-from models.v1.configs import Config
+from database import get_read_db
+from settings import settings
+from utils.logging import get_logger, sample_logger, phase
+from models.v1.configs import Config, ConfigMergedView
 from models.v1.services import Service, ServiceIpAllow
 from utils.jwt_utils import verify_bearer
-from utils.ip_allow import extract_client_ip, is_ip_allowed
+from utils.ip_allow import extract_client_ip, ip_rules
 from fastapi.responses import Response, JSONResponse
 from schemas.response import ok, unauthorized, not_found, internal_error, bad_request
+from services.config_service import get_view_content, get_view_rendered, to_str_map
+from services import secret_service
+from utils.config_formats import FORMATS, MEDIA_TYPES, negotiate, parse, render
+from sqlalchemy import and_
 import json
 import ipaddress
 
-logger = get_logger(__name__)
+# 拉取是最高频的接口，INFO 级日志按 LOG_PULL_SAMPLE_RATE 采样
+logger = sample_logger(get_logger(__name__), float(settings.LOG_PULL_SAMPLE_RATE or 0.01))
 router = APIRouter(prefix="/api/v1/pull", tags=["pull"])
 
 
 @router.get("/{service_code}/{env}")
 def pull_config(service_code: str, env: str, request: Request,
                 authorization: str | None = Header(default=None, alias="Authorization"),
-                if_none_match: str | None = Header(default=None, alias="If-None-Match"), db: Session = Depends(get_db)):
+                if_none_match: str | None = Header(default=None, alias="If-None-Match"),
+                accept: str | None = Header(default=None, alias="Accept"),
+                instance: str | None = Query(default=None), fmt: str | None = Query(default=None, alias="format"),
+                db: Session = Depends(get_read_db)):
     if not authorization or not authorization.lower().startswith("bearer "):
         return unauthorized("authorization header missing or not bearer")
     token = authorization.split(" ", 1)[1]
-    verify_bearer(token, db, service_code, env)
+    with phase("auth"):
+        verify_bearer(token, db, service_code, env)
     s = db.query(Service).filter(Service.code == service_code).first()
     if not s:
         return not_found(f"service '{service_code}' not found")
-    client_ip = extract_client_ip(request)
-    logger.info(client_ip)
-    if not is_ip_allowed(db, s.id, env, client_ip):
+    # 前置 IP 闸门已校验过时直接复用其结果，未启用闸门时这里用同一份进程内规则缓存兜底
+    client_ip = request.scope.get("state", {}).get("client_ip") or extract_client_ip(request)
+    try:
+        ip_obj = ipaddress.ip_address(client_ip)
+    except ValueError:
+        raise HTTPException(status_code=403, detail="client ip invalid")
+    if not ip_rules.is_allowed(service_code, env, ip_obj):
         raise HTTPException(status_code=403, detail="ip not allowed")
-    c = db.query(Config).filter(Config.service_id == s.id, Config.env == env).first()
+    # 只取版本与视图元数据，内容按 (view_id, etag) 命中进程内缓存后才会加载
+    instances = [instance, ""] if instance else [""]
+    c = db.query(Config.id, Config.format, Config.version, ConfigMergedView.id.label("view_id"),
+                 ConfigMergedView.etag, ConfigMergedView.deps).outerjoin(
+        ConfigMergedView, and_(ConfigMergedView.config_id == Config.id, ConfigMergedView.instance.in_(instances))
+    ).filter(Config.service_id == s.id, Config.env == env).order_by(ConfigMergedView.instance.desc()).first()
     if not c:
         return not_found(f"config not found for service '{service_code}' env '{env}'")
-    etag = str(c.version)
+    etag = str(c.etag or c.version)
+    # 供访问日志中间件记录实际下发的版本
+    request.state.pull = {"version": c.version, "instance": instance}
+    logger.info(f"pull {service_code}/{env} version={c.version} ip={client_ip}")
     if if_none_match == etag:
-        return Response(status_code=304, headers={"ETag": etag})
-    ct = "application/json"
-    if c.format != "json":
-        return bad_request("format must be json")
-    try:
-        parsed = json.loads(c.content)
-    except Exception:
-        return internal_error("content parse failed")
-    str_map = {}
-    if isinstance(parsed, dict):
-        for k, v in parsed.items():
-            if isinstance(v, (dict, list)):
-                str_map[k] = json.dumps(v, ensure_ascii=False)
-            else:
-                str_map[k] = str(v)
+        return Response(status_code=304, headers={"ETag": etag, "Vary": "Accept"})
+    if fmt and fmt not in FORMATS:
+        return bad_request(f"format must be one of {', '.join(FORMATS)}")
+    want = fmt or negotiate(accept)
+    if c.view_id is None:
+        # 视图尚未物化（历史数据），退回解析原始内容
+        content = db.query(Config.content).filter(Config.id == c.id).scalar()
+        try:
+            str_map = secret_service.decrypt_map(db, c.id, to_str_map(parse(c.format, content)))
+        except Exception:
+            return internal_error("content parse failed")
+        if want and want != "json":
+            raw = want == c.format and secret_service.ENC_PREFIX not in content
+            with phase("ser"):
+                text = content if raw else render(want, str_map)
+            return Response(content=text, media_type=MEDIA_TYPES[want], headers={"ETag": etag, "Vary": "Accept"})
+    elif want and want != "json":
+        with phase("ser"):
+            text = get_view_rendered(db, c.id, c.view_id, etag, c.deps, want, c.format)
+        return Response(content=text, media_type=MEDIA_TYPES[want], headers={"ETag": etag, "Vary": "Accept"})
     else:
-        return internal_error("content must be object")
+        str_map = get_view_content(db, c.id, c.view_id, etag)
+    ct = "application/json"
     payload = {
         "service_code": service_code,
         "env": env,
@@ -61,4 +89,5 @@ def pull_config(service_code: str, env: str, request: Request,
         "etag": etag,
         "content": str_map,
     }
-    return JSONResponse(content=ok(payload), headers={"ETag": etag})
+    with phase("ser"):
+        return JSONResponse(content=ok(payload), headers={"ETag": etag, "Vary": "Accept"})
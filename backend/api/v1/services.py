@@ -1,13 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from database import get_db
-from models.v1.services import Service, ServiceCredential, ServiceToken, ServiceIpAllow
+from database import get_db, get_read_db, SessionLocal
+from models.v1.services import Service, ServiceCredential, ServiceToken, ServiceIpAllow, RevokedToken
 from schemas.v1.services import ServiceCreate, ServiceOut, CredentialOut, CredentialRotateOut, TokenResponse, \
-    ServiceTokenOut, AllowIPCreate, AllowIPOut, TokenMonitorOut, TokenMonitorItemOut
+    ServiceTokenOut, AllowIPCreate, AllowIPOut, TokenMonitorOut, TokenMonitorItemOut, TokenBulkReq, TokenBulkOut
 from settings import settings
-from utils.crypto import gen_ak_sk, encrypt_sk, decrypt_sk
+from utils.crypto import gen_ak_sk, encrypt_sk
+from utils.ip_allow import ip_rules
+from utils.revocation import revocations
+from services.credential_service import credentials, reencrypt_credentials, rotate_credential
+from services.token_service import token_summary, invalidate_token_summary, sign_pull_token, issue_tokens_bulk
 
-import jwt
 from datetime import datetime, timedelta, timezone
 import ipaddress
 
@@ -15,7 +18,7 @@ router = APIRouter(prefix="/api/v1/services", tags=["services"])
 
 
 @router.get("", response_model=list[ServiceOut])
-def list_services(db: Session = Depends(get_db)):
+def list_services(db: Session = Depends(get_read_db)):
     services = db.query(Service).all()
     return services
 
@@ -34,6 +37,7 @@ def create_service(payload: ServiceCreate, db: Session = Depends(get_db)):
     cred = ServiceCredential(service_id=s.id, ak=ak, sk_ciphertext=encrypt_sk(sk), status="active")
     db.add(cred)
     db.commit()
+    credentials.reload()
     return {"ak": ak, "sk": sk}
 
 
@@ -44,30 +48,51 @@ def delete_service(service_code: str, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404)
     db.delete(s)
     db.commit()
+    ip_rules.invalidate()
+    credentials.reload()
     return {"ok": True}
 
+@router.post("/credentials/reencrypt")
+def reencrypt_all_credentials(background_tasks: BackgroundTasks):
+    background_tasks.add_task(_run_reencrypt_credentials)
+    return {"scheduled": True}
+
+
+def _run_reencrypt_credentials():
+    db = SessionLocal()
+    try:
+        reencrypt_credentials(db)
+    finally:
+        db.close()
+
+
 @router.get("/tokens/monitor", response_model=TokenMonitorOut)
-def tokens_monitor(days: int = 7, env: str | None = None, db: Session = Depends(get_db)):
-    q = db.query(ServiceToken, Service.code).join(Service, ServiceToken.service_id == Service.id)
+def tokens_monitor(days: int = 7, env: str | None = None, page: int = Query(default=1, ge=1),
+                   page_size: int = Query(default=100, ge=1, le=500), db: Session = Depends(get_read_db)):
+    summary = token_summary(db, days, env)
+    # 明细按 expires_at 索引顺序分页，最先到期的排在最前
+    q = db.query(ServiceToken.id, Service.code, ServiceToken.env, ServiceToken.created_at,
+                 ServiceToken.expires_at).join(Service, ServiceToken.service_id == Service.id)
     if env:
         q = q.filter(ServiceToken.env == env)
-    rows = q.order_by(ServiceToken.expires_at.asc()).all()
-    items: list[TokenMonitorItemOut] = []
-    now = datetime.now(timezone.utc)
-    soon = 0
-    for t, code in rows:
-        exp = t.expires_at
-        if exp.tzinfo is None:
-            exp = exp.replace(tzinfo=timezone.utc)
-        left_days = (exp - now).days
-        if left_days <= days:
-            soon += 1
-        items.append(TokenMonitorItemOut(id=t.id, service_code=code, env=t.env, created_at=t.created_at, expires_at=t.expires_at))
-    return TokenMonitorOut(total=len(items), soon=soon, items=items)
+    rows = q.order_by(ServiceToken.expires_at.asc(), ServiceToken.id.asc()).offset(
+        (page - 1) * page_size).limit(page_size).all()
+    items = [TokenMonitorItemOut(id=i, service_code=code, env=e, created_at=c, expires_at=x)
+             for i, code, e, c, x in rows]
+    return TokenMonitorOut(**summary, page=page, page_size=page_size, items=items)
+
+
+@router.post("/tokens/bulk", response_model=TokenBulkOut)
+def bulk_issue_tokens(payload: TokenBulkReq, db: Session = Depends(get_db)):
+    # services 为空表示全部启用的服务
+    envs = list(dict.fromkeys(e.strip() for e in payload.envs if e.strip()))
+    if not envs:
+        raise HTTPException(status_code=400, detail="envs required")
+    return issue_tokens_bulk(db, payload.services, envs, days=payload.days, revoke_previous=payload.revoke_previous)
 
 
 @router.get("/{service_code}/credentials", response_model=list[CredentialOut])
-def list_credentials(service_code: str, db: Session = Depends(get_db)):
+def list_credentials(service_code: str, db: Session = Depends(get_read_db)):
     s = db.query(Service).filter(Service.code == service_code).first()
     if not s:
         raise HTTPException(status_code=404)
@@ -75,6 +100,22 @@ def list_credentials(service_code: str, db: Session = Depends(get_db)):
     return creds
 
 
+@router.post("/{service_code}/credentials/rotate", response_model=CredentialRotateOut)
+def rotate_service_credential(service_code: str, grace_seconds: int | None = Query(default=None, ge=0),
+                              db: Session = Depends(get_db)):
+    s = db.query(Service).filter(Service.code == service_code).first()
+    if not s:
+        raise HTTPException(status_code=404)
+    if not settings.CRED_MASTER_KEY:
+        raise HTTPException(status_code=500, detail="CRED_MASTER_KEY not configured")
+    if grace_seconds is None:
+        grace_seconds = int(settings.CREDENTIAL_ROTATION_GRACE or 86400)
+    cred, sk, grace_until = rotate_credential(db, s, grace_seconds)
+    db.commit()
+    credentials.reload()
+    return {"ak": cred.ak, "sk": sk, "grace_until": grace_until}
+
+
 @router.post("/{service_code}/credentials/{ak}/disable")
 def disable_credential(service_code: str, ak: str, db: Session = Depends(get_db)):
     s = db.query(Service).filter(Service.code == service_code).first()
@@ -86,6 +127,7 @@ def disable_credential(service_code: str, ak: str, db: Session = Depends(get_db)
     cred.status = "disabled"
     db.add(cred)
     db.commit()
+    credentials.reload()
     return {"ok": True}
 
 
@@ -95,43 +137,32 @@ def generate_token(service_code: str, env: str, db: Session = Depends(get_db)):
     if not s:
         raise HTTPException(status_code=404, detail="Service not found")
 
-    cred = db.query(ServiceCredential).filter(
-        ServiceCredential.service_id == s.id,
-        ServiceCredential.status == "active"
-    ).order_by(ServiceCredential.created_at.desc()).first()
+    cred = credentials.latest_active(s.id)
 
     if not cred:
         raise HTTPException(status_code=400, detail="No active credential found")
 
-    sk = decrypt_sk(cred.sk_ciphertext)
-
     now = datetime.now(timezone.utc)
     expires_at = now + timedelta(days=30)
-    token_payload = {
-        "sub": service_code,
-        "env": env,
-        "aud": "fast_config_pull",
-        "iat": now,
-        "exp": expires_at,
-    }
-
-    token = jwt.encode(token_payload, sk, algorithm="HS256", headers={"kid": cred.ak})
+    token, jti = sign_pull_token(cred, service_code, env, now, expires_at)
 
     # Save token to DB
     st = ServiceToken(
         service_id=s.id,
         token=token,
+        jti=jti,
         env=env,
         expires_at=expires_at
     )
     db.add(st)
     db.commit()
+    invalidate_token_summary()
 
     return {"token": token}
 
 
 @router.get("/{service_code}/tokens", response_model=list[ServiceTokenOut])
-def list_tokens(service_code: str, db: Session = Depends(get_db)):
+def list_tokens(service_code: str, db: Session = Depends(get_read_db)):
     s = db.query(Service).filter(Service.code == service_code).first()
     if not s:
         raise HTTPException(status_code=404)
@@ -148,13 +179,21 @@ def delete_token(service_code: str, token_id: int, db: Session = Depends(get_db)
     t = db.query(ServiceToken).filter(ServiceToken.id == token_id, ServiceToken.service_id == s.id).first()
     if not t:
         raise HTTPException(status_code=404)
+    if t.jti:
+        # 无状态校验不再查 service_tokens，删除时同步写吊销记录
+        db.add(RevokedToken(jti=t.jti, service_id=s.id, expires_at=t.expires_at,
+                            revoked_at=datetime.now(timezone.utc).replace(tzinfo=None)))
+    jti, expires_at = t.jti, t.expires_at
     db.delete(t)
     db.commit()
+    if jti:
+        revocations.add(jti, expires_at)
+    invalidate_token_summary()
     return {"ok": True}
 
 
 @router.get("/{service_code}/allow-ips", response_model=list[AllowIPOut])
-def list_allow_ips(service_code: str, env: str | None = Query(default=None), db: Session = Depends(get_db)):
+def list_allow_ips(service_code: str, env: str | None = Query(default=None), db: Session = Depends(get_read_db)):
     s = db.query(Service).filter(Service.code == service_code).first()
     if not s:
         raise HTTPException(status_code=404)
@@ -191,6 +230,7 @@ def add_allow_ip(service_code: str, payload: AllowIPCreate, db: Session = Depend
     db.add(rule)
     db.commit()
     db.refresh(rule)
+    ip_rules.invalidate()
     return rule
 
 
@@ -204,4 +244,5 @@ def delete_allow_ip(service_code: str, rule_id: int, db: Session = Depends(get_d
         raise HTTPException(status_code=404)
     db.delete(r)
     db.commit()
+    ip_rules.invalidate()
     return {"ok": True}
@@ -0,0 +1,26 @@
+from fastapi import APIRouter, BackgroundTasks, HTTPException
+
+from services.task_scheduler import scheduler
+from tasks.task_registry import load_tasks
+
+router = APIRouter(prefix="/api/v1/tasks", tags=["tasks"])
+
+
+@router.get("")
+def list_tasks():
+    tasks = load_tasks()
+    status = scheduler.status()
+    status["registered"] = [{"name": t.name, "interval": t.interval, "leader_only": t.leader_only}
+                            for t in tasks.values()]
+    return status
+
+
+@router.post("/{name}/run", status_code=202)
+def run_task(name: str, background_tasks: BackgroundTasks):
+    spec = load_tasks().get(name)
+    if spec is None:
+        raise HTTPException(status_code=404, detail=f"task '{name}' not found")
+    if spec.leader_only and not scheduler.lock.is_leader:
+        raise HTTPException(status_code=409, detail=f"task '{name}' runs on the leader only and this process is not the leader")
+    background_tasks.add_task(scheduler.run_now, name)
+    return {"accepted": True, "name": name, "leader": scheduler.lock.is_leader}
@@ -0,0 +1,110 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from database import get_db, get_read_db
+from models.v1.services import Service
+from models.v1.webhooks import Webhook, WebhookOutbox
+from schemas.v1.webhooks import WebhookCreate, WebhookOut, WebhookCreateOut, WebhookDeliveryOut
+from services.webhook_service import add_delivery
+from settings import settings
+from tasks.app_data_push_task import dispatcher
+from utils.crypto import encrypt_sk
+
+from datetime import datetime, timezone
+import secrets
+
+router = APIRouter(prefix="/api/v1/webhooks", tags=["webhooks"])
+
+
+@router.get("", response_model=list[WebhookOut])
+def list_webhooks(service: str = Query(None), db: Session = Depends(get_read_db)):
+    q = db.query(Webhook)
+    if service:
+        q = q.join(Service, Webhook.service_id == Service.id).filter(Service.code == service)
+    return q.order_by(Webhook.id.asc()).all()
+
+
+@router.post("", response_model=WebhookCreateOut)
+def create_webhook(payload: WebhookCreate, db: Session = Depends(get_db)):
+    s = db.query(Service).filter(Service.code == payload.service_code).first()
+    if not s:
+        raise HTTPException(status_code=404, detail="service not found")
+    if not payload.url.startswith(("http://", "https://")):
+        raise HTTPException(status_code=400, detail="url must be http(s)")
+    if not settings.CRED_MASTER_KEY:
+        raise HTTPException(status_code=500, detail="CRED_MASTER_KEY not configured")
+    secret = payload.secret or secrets.token_urlsafe(32)
+    hook = Webhook(service_id=s.id, env=payload.env, url=payload.url, secret_ciphertext=encrypt_sk(secret),
+                   active=True, max_concurrency=payload.max_concurrency)
+    db.add(hook)
+    db.commit()
+    db.refresh(hook)
+    # 签名密钥只在创建时返回一次
+    return WebhookCreateOut(**WebhookOut.model_validate(hook).model_dump(), secret=secret)
+
+
+@router.delete("/{webhook_id}")
+def delete_webhook(webhook_id: int, db: Session = Depends(get_db)):
+    hook = db.query(Webhook).filter(Webhook.id == webhook_id).first()
+    if not hook:
+        raise HTTPException(status_code=404)
+    # 先停用：不再领取新的投递，已被领取且租约未过期的投递继续完成，其余未完成的投递作废
+    hook.active = False
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    in_flight = db.query(WebhookOutbox.id).filter(WebhookOutbox.webhook_id == hook.id,
+                                                  WebhookOutbox.status == "delivering",
+                                                  WebhookOutbox.locked_until >= now).count()
+    if in_flight:
+        db.query(WebhookOutbox).filter(WebhookOutbox.webhook_id == hook.id,
+                                       WebhookOutbox.status.in_(("pending", "failed"))).delete(synchronize_session=False)
+        db.commit()
+        return {"ok": True, "deleted": False, "in_flight": in_flight}
+    db.query(WebhookOutbox).filter(WebhookOutbox.webhook_id == hook.id).delete(synchronize_session=False)
+    db.delete(hook)
+    db.commit()
+    return {"ok": True, "deleted": True}
+
+
+@router.post("/{webhook_id}/test")
+def test_webhook(webhook_id: int, db: Session = Depends(get_db)):
+    hook = db.query(Webhook).filter(Webhook.id == webhook_id).first()
+    if not hook:
+        raise HTTPException(status_code=404)
+    code = db.query(Service.code).filter(Service.id == hook.service_id).scalar()
+    row = add_delivery(db, hook, "ping", {"event": "ping", "service_code": code, "env": hook.env,
+                                          "webhook_id": hook.id})
+    db.commit()
+    return {"delivery_id": row.id, "dispatcher": dispatcher.running}
+
+
+@router.get("/deliveries", response_model=list[WebhookDeliveryOut])
+def list_deliveries(webhook_id: int = Query(None), status: str = Query(None),
+                    page: int = Query(default=1, ge=1), page_size: int = Query(default=50, ge=1, le=500),
+                    db: Session = Depends(get_db)):
+    q = db.query(WebhookOutbox)
+    if webhook_id:
+        q = q.filter(WebhookOutbox.webhook_id == webhook_id)
+    if status:
+        q = q.filter(WebhookOutbox.status == status)
+    return q.order_by(WebhookOutbox.id.desc()).offset((page - 1) * page_size).limit(page_size).all()
+
+
+@router.post("/deliveries/{delivery_id}/retry", response_model=WebhookDeliveryOut)
+def retry_delivery(delivery_id: int, db: Session = Depends(get_db)):
+    row = db.query(WebhookOutbox).filter(WebhookOutbox.id == delivery_id).first()
+    if not row:
+        raise HTTPException(status_code=404)
+    if row.status == "delivering":
+        raise HTTPException(status_code=409, detail="delivery in progress")
+    # 重新计数，按完整的重试策略再投递一轮
+    row.status = "pending"
+    row.attempts = 0
+    row.next_attempt_at = datetime.now(timezone.utc).replace(tzinfo=None)
+    db.commit()
+    db.refresh(row)
+    dispatcher.notify()
+    return row
+
+
+@router.get("/dispatcher")
+def dispatcher_status():
+    return dispatcher.status()
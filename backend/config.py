@@ -20,6 +20,7 @@ from settings import settings
 # LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
 # TRUSTED_PROXIES = [o.strip() for o in os.getenv("TRUSTED_PROXIES", "").split(",") if o.strip()]
 # REAL_IP_HEADER = os.getenv("REAL_IP_HEADER", "")
+# RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "0")  # 默认关闭；部署在反向代理后开启时须同时配置 TRUSTED_PROXIES
 # ADMIN_USERNAME = os.getenv("ADMIN_USERNAME", "")
 # ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD", "")
 # SERVICE_VERSION= os.getenv("SERVICE_VERSION", "")
@@ -1,20 +1,203 @@
 # 数据库连接
-from sqlalchemy import create_engine
+import contextvars
+import os
+import threading
+import time
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import StaticPool
 
 from settings import settings
+from utils.logging import add_timing
+from utils.metrics import REPLICA_LAG, REPLICA_READS, instrument_pool
 
 DB_URL = settings.build_db_url()
 if not DB_URL:
     raise RuntimeError(
-        "DATABASE_URL not configured. Set DATABASE_URL or DB_HOST/DB_PORT/DB_USER/DB_PASSWORD/DB_NAME in .env")
-engine = create_engine(DB_URL, pool_pre_ping=True)
+        "DATABASE_URL not configured. Set DATABASE_URL, DB_BACKEND=sqlite or DB_HOST/DB_PORT/DB_USER/DB_PASSWORD/DB_NAME"
+        " in .env")
+
+
+def _sqlite_pragmas(engine) -> None:
+    # WAL 下读不阻塞写，适合读多写少的拉取路径；busy_timeout 让并发写排队而不是立即报 database is locked
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_conn, record):
+        cur = dbapi_conn.cursor()
+        cur.execute("PRAGMA journal_mode=WAL")
+        cur.execute("PRAGMA synchronous=NORMAL")
+        cur.execute("PRAGMA foreign_keys=ON")
+        cur.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS or 5000)}")
+        cur.close()
+
+
+def create_db_engine(url: str, **kw):
+    """按方言创建引擎：MySQL 保持原有连接池参数，SQLite 打开 WAL 并允许跨线程使用连接。"""
+    u = make_url(url)
+    if u.get_backend_name() == "sqlite":
+        if u.database and u.database != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(u.database)), exist_ok=True)
+        kw.setdefault("connect_args", {"check_same_thread": False})
+        if not u.database or u.database == ":memory:":
+            # 内存库只存在于单个连接中，所有线程共用这一个连接
+            kw.setdefault("poolclass", StaticPool)
+        eng = create_engine(url, **kw)
+        _sqlite_pragmas(eng)
+        return eng
+    return create_engine(url, pool_pre_ping=True, **kw)
+
+
+engine = create_db_engine(DB_URL)
+instrument_pool(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
 
+# 请求内的 SQL 耗时累计到 Server-Timing 的 db 阶段
+def _instrument_timing(eng) -> None:
+    @event.listens_for(eng, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(eng, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        add_timing("db", (time.perf_counter() - conn.info["query_start"].pop()) * 1000)
+
+
+_instrument_timing(engine)
+
+
+# 请求级读写水位：min 为客户端带来的 revision（X-Config-Revision 头或 fc_rev cookie），
+# wrote 为本请求提交写入后主库的 revision，由 middleware.read_revision 回写给客户端
+_revision_var: contextvars.ContextVar[dict | None] = contextvars.ContextVar("read_revision", default=None)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _on_commit(session):
+    # 只记录请求内的写入；日志批量写等后台会话不影响读路由
+    state = _revision_var.get()
+    if state is None or not session.info.get("request") or not read_router.replicas:
+        return
+    # revision 按提交顺序分配，提交后主库的最大 revision 一定覆盖本次写入
+    state["wrote"] = max(state["wrote"] or 0, read_router.primary_revision())
+
+
+class _Replica:
+    def __init__(self, name: str, url: str):
+        self.name = name
+        self.engine = create_db_engine(url)
+        _instrument_timing(self.engine)
+        self.session = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.fresh = False
+        self.watermark = 0
+        self.lag: int | None = None
+        self.error: str | None = None
+
+
+class ReadRouter:
+    """只读请求的副本路由。
+
+    定期比较主库与各副本的数据水位（变更流水 changes 的最大 revision，每次写入都会新增），
+    副本落后超过 REPLICA_MAX_LAG 或不可达时不参与路由，全部不可用时回落主库。
+    读自己的写入按客户端判断：写请求的响应带回提交后的 revision，客户端之后的读请求带上它，
+    只路由到水位不低于该 revision 的副本，否则走主库；与哪个进程处理了写请求无关。
+    """
+
+    WATERMARK_SQL = "SELECT MAX(id) FROM changes"
+
+    def __init__(self, urls: list[str], interval: float = 2.0, max_lag: int = 0, sticky: float = 300.0):
+        self.replicas = [_Replica(f"replica{i}", url) for i, url in enumerate(urls)]
+        self.interval = interval
+        self.max_lag = max_lag
+        # 客户端 revision 标记（cookie）的有效期
+        self.sticky = sticky
+        self._checked_at = 0.0
+        self._rr = 0
+        self._lock = threading.Lock()
+
+    def _watermark(self, eng) -> int:
+        with eng.connect() as conn:
+            return int(conn.execute(text(self.WATERMARK_SQL)).scalar() or 0)
+
+    def primary_revision(self) -> int:
+        return self._watermark(engine)
+
+    def check(self) -> None:
+        try:
+            primary = self._watermark(engine)
+        except Exception:
+            # 主库不可达时不改变副本状态，由主库上的请求自行报错
+            return
+        for rep in self.replicas:
+            try:
+                rep.watermark = self._watermark(rep.engine)
+                rep.lag = max(primary - rep.watermark, 0)
+                rep.fresh = rep.lag <= self.max_lag
+                rep.error = None
+            except Exception as e:
+                rep.watermark, rep.lag, rep.fresh, rep.error = 0, None, False, str(e) or type(e).__name__
+            REPLICA_LAG.labels(rep.name).set(-1 if rep.lag is None else rep.lag)
+
+    def _ensure_checked(self) -> None:
+        if time.monotonic() - self._checked_at < self.interval:
+            return
+        # 首次检查前阻塞等待结果，之后过期时由一个请求刷新，其余请求沿用上次结果
+        if not self._lock.acquire(blocking=self._checked_at == 0.0):
+            return
+        try:
+            if time.monotonic() - self._checked_at >= self.interval:
+                self.check()
+                self._checked_at = time.monotonic()
+        finally:
+            self._lock.release()
+
+    def pick(self, min_revision: int = 0) -> _Replica | None:
+        """min_revision 为客户端已写入（见到）的 revision，水位低于它的副本不可用。"""
+        if not self.replicas:
+            return None
+        self._ensure_checked()
+        n = len(self.replicas)
+        self._rr = (self._rr + 1) % n
+        behind = False
+        for i in range(n):
+            rep = self.replicas[(self._rr + i) % n]
+            if not rep.fresh:
+                continue
+            if rep.watermark < min_revision:
+                behind = True
+                continue
+            REPLICA_READS.labels(rep.name, "fresh").inc()
+            return rep
+        REPLICA_READS.labels("primary", "sticky" if behind else "fallback").inc()
+        return None
+
+    def status(self) -> list[dict]:
+        return [{"name": r.name, "fresh": r.fresh, "lag": r.lag, "revision": r.watermark, "error": r.error}
+                for r in self.replicas]
+
+
+read_router = ReadRouter(
+    [u.strip() for u in str(settings.DB_READ_REPLICAS or "").split(",") if u.strip()],
+    interval=float(settings.REPLICA_CHECK_INTERVAL or 2),
+    max_lag=int(settings.REPLICA_MAX_LAG or 0),
+    sticky=float(settings.REPLICA_STICKY_SECONDS or 300),
+)
+
+
 def get_db():
-    db = SessionLocal()
+    db = SessionLocal(info={"request": True})
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def get_read_db():
+    """只读接口的会话：优先路由到追上主库、且不低于客户端 revision 的副本。"""
+    state = _revision_var.get()
+    rep = read_router.pick(max(state["min"], state["wrote"] or 0) if state else 0)
+    db = rep.session() if rep is not None else SessionLocal()
     try:
         yield db
     finally:
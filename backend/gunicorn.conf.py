@@ -0,0 +1,18 @@
+# gunicorn 配置：多 worker 下 Prometheus 指标通过 PROMETHEUS_MULTIPROC_DIR 汇总
+import os
+import shutil
+
+
+def on_starting(server):
+    # 上一次运行留下的 mmap 文件会污染计数，master 启动时清空目录
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path, exist_ok=True)
+
+
+def child_exit(server, worker):
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
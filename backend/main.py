@@ -1,6 +1,8 @@
 # FastAPI应用入口
-from datetime import datetime
+import asyncio
+from contextlib import asynccontextmanager
 
+import anyio
 import uvicorn
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.responses import JSONResponse
@@ -10,22 +12,77 @@ from settings import settings
 from schemas.response import fail
 from middleware.cors import register_cors
 from middleware.admin_auth import register_admin_auth
+from middleware.rate_limit import register_rate_limit
+from middleware.allow_ips import register_allow_ips
+from middleware.access_log import register_access_log
+from middleware.logging import register_request_context
+from middleware.metrics import register_metrics
+from middleware.read_only import register_read_only
+from middleware.read_revision import register_read_revision
+from services.log_writer import log_writer
+from services.warmup import run_warmup, stop_warmup
+from services.task_scheduler import scheduler, start_scheduler
+from tasks.app_data_push_task import dispatcher, start_dispatcher
+from tasks.mirror_sync_task import mirror, mirror_enabled, start_mirror
 from api.v1.services import router as services_router
 from api.v1.configs import router as configs_router
 from api.v1.pull import router as pull_router
 from api.v1.auth import router as auth_router
 from api.v1.meta import router as meta_router
-
-app = FastAPI()
+from api.v1.tasks import router as tasks_router
+from api.v1.webhooks import router as webhooks_router
+from api.v1.mirror import router as mirror_router
+from api.v1.changes import router as changes_router
+from api.metrics import router as metrics_router
+from api.health import router as health_router
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    log_writer.start()
+    if mirror_enabled():
+        # 只读镜像：本地库只由同步写入，不运行调度任务与 webhook 投递
+        await start_mirror()
+    # 预热在后台线程执行，期间存活探测正常、就绪探测返回 503
+    app.state.warmup_task = asyncio.create_task(anyio.to_thread.run_sync(run_warmup))
+    if not mirror_enabled():
+        start_scheduler()
+        await start_dispatcher()
+    try:
+        yield
+    finally:
+        stop_warmup()
+        app.state.warmup_task.cancel()
+        await asyncio.gather(app.state.warmup_task, return_exceptions=True)
+        await mirror.stop()
+        await dispatcher.stop()
+        scheduler.shutdown()
+        log_writer.stop()
+
+
+app = FastAPI(lifespan=lifespan)
 
 register_cors(app)
 register_admin_auth(app)
+register_read_only(app)
+register_read_revision(app)
+register_rate_limit(app)
+register_access_log(app)
+register_allow_ips(app)
+register_metrics(app)
+register_request_context(app)
 
 app.include_router(services_router)
 app.include_router(configs_router)
 app.include_router(pull_router)
 app.include_router(auth_router)
 app.include_router(meta_router)
+app.include_router(tasks_router)
+app.include_router(webhooks_router)
+app.include_router(mirror_router)
+app.include_router(changes_router)
+app.include_router(metrics_router)
+app.include_router(health_router)
 
 
 @app.exception_handler(HTTPException)
@@ -46,20 +103,5 @@ async def unhandled_exception_handler(request: Request, exc: Exception):
     return JSONResponse(status_code=500, content=fail(message="internal server error", code=500))
 
 
-@app.get("/api/health")
-async def health_check():
-    """健康检查接口"""
-
-    return JSONResponse(
-        content={
-            "status": "healthy",
-            "timestamp": datetime.utcnow().isoformat(),
-            "service": "agenterra-local-app-backend-v1",
-            "version": settings.SERVICE_VERSION
-        },
-        status_code=200
-    )
-
-
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=9530, reload=True)
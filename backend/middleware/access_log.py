@@ -0,0 +1,91 @@
+# 访问日志中间件
+# 拉取请求写 api_logs，管理端写操作写 audit_logs；只在响应发出后入队，落库由 services.log_writer 异步完成。
+import json
+import re
+import time
+
+from fastapi import FastAPI
+from starlette.requests import Request
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from middleware.rate_limit import PULL_PATH_RE
+from models.api_log import ApiLog, AuditLog
+from services.log_writer import log_writer
+from settings import settings
+from utils.ip_allow import extract_client_ip
+
+MUTATING_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+EXEMPT_PATHS = {"/api/v1/auth/login"}
+ADMIN_PATH_RE = re.compile(r"^/api/v1/([^/]+)(?:/(.*))?$")
+_ID_RE = re.compile(r"^\d+$")
+
+
+def _audit_target(path: str) -> tuple[str, int | None]:
+    m = ADMIN_PATH_RE.match(path)
+    if not m:
+        return "other", None
+    target_id = None
+    for seg in (m.group(2) or "").split("/"):
+        if _ID_RE.match(seg):
+            target_id = int(seg)
+            break
+    return m.group(1)[:64], target_id
+
+
+class AccessLogMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        method = scope["method"]
+        path = scope["path"]
+        pull = PULL_PATH_RE.match(path) if method == "GET" else None
+        if pull is None and (method not in MUTATING_METHODS or path in EXEMPT_PATHS):
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = [500]
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            latency_ms = int((time.perf_counter() - start) * 1000)
+            state = scope.get("state") or {}
+            client_ip = state.get("client_ip") or extract_client_ip(Request(scope))
+            # created_at 不由应用填写，落库时取数据库时间（列默认 func.now()），与其它表一致；批量写入最多晚 flush 间隔
+            if pull is not None:
+                info = state.get("pull") or {}
+                log_writer.submit(ApiLog, {
+                    "service_code": pull.group(1)[:64],
+                    "env": path.rsplit("/", 1)[1][:32],
+                    "instance": info.get("instance"),
+                    "version": info.get("version"),
+                    "status": status[0],
+                    "latency_ms": latency_ms,
+                    "client_ip": client_ip,
+                })
+            else:
+                admin = state.get("admin") or {}
+                target_type, target_id = _audit_target(path)
+                log_writer.submit(AuditLog, {
+                    "actor": admin.get("sub"),
+                    "action": f"{method} {path}"[:64],
+                    "target_type": target_type,
+                    "target_id": target_id,
+                    "detail": json.dumps({"path": path, "status": status[0], "latency_ms": latency_ms,
+                                          "client_ip": client_ip}, ensure_ascii=False),
+                })
+
+
+def register_access_log(app: FastAPI) -> None:
+    if str(settings.ACCESS_LOG_ENABLED or "1").strip().lower() in {"0", "false", "no", "off"}:
+        return
+    app.add_middleware(AccessLogMiddleware)
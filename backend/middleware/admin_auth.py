@@ -1,22 +1,43 @@
 from starlette.middleware.base import BaseHTTPMiddleware
 from fastapi import FastAPI, Request
+import hmac
 import jwt
 import re
 
 from schemas.response import unauthorized
 from settings import settings
-from utils.logging import get_logger
+from utils.logging import get_logger, phase, set_request_context
 
 logger = get_logger(__name__)
 
 EXEMPT_EXACT_PATHS = {
     "/api/health",
+    "/api/health/live",
+    "/api/health/ready",
     "/api/v1/auth/login",
     "/docs",
     "/openapi.json",
+    # 镜像同步接口使用 MIRROR_SYNC_TOKEN 单独鉴权
+    "/api/v1/mirror/manifest",
+    "/api/v1/mirror/rows",
+    "/api/v1/mirror/changes",
 }
 PULL_PATH_RE = re.compile(r"^/api/v1/pull/[^/]+/[^/]+$")
 META_BASE_PATH = "/api/v1/meta/backend-base"
+METRICS_PATH = "/metrics"
+
+
+def _metrics_open(request: Request) -> bool:
+    # 指标标签含全部服务编码与环境：仅在 IP 闸门启用且配置了 ADMIN_ALLOW_IPS 白名单，或携带 METRICS_TOKEN 时免管理员 Token
+    gate = str(settings.IP_GATE_ENABLED or "1").strip().lower() not in {"0", "false", "no", "off"}
+    if gate and str(settings.ADMIN_ALLOW_IPS or "").strip():
+        return True
+    expected = str(settings.METRICS_TOKEN or "")
+    auth = request.headers.get("Authorization") or ""
+    if not expected or not auth.lower().startswith("bearer "):
+        return False
+    return hmac.compare_digest(auth.split(" ", 1)[1].encode(), expected.encode())
+
 
 class AdminAuthMiddleware(BaseHTTPMiddleware):
     async def dispatch(self, request: Request, call_next):
@@ -25,25 +46,28 @@ class AdminAuthMiddleware(BaseHTTPMiddleware):
         path = request.url.path
         if (path in EXEMPT_EXACT_PATHS) or \
            (request.method.upper() == "GET" and PULL_PATH_RE.match(path)) or \
-           (request.method.upper() == "GET" and path == META_BASE_PATH):
+           (request.method.upper() == "GET" and path == META_BASE_PATH) or \
+           (path == METRICS_PATH and _metrics_open(request)):
             return await call_next(request)
         auth = request.headers.get("Authorization")
         if not auth or not auth.lower().startswith("bearer "):
             return unauthorized("authorization header missing or not bearer")
         token = auth.split(" ", 1)[1]
         try:
-            payload = jwt.decode(
-                token,
-                settings.ADMIN_JWT_SECRET,
-                algorithms=["HS256"],
-                options={"require": ["exp", "iat", "aud", "sub"]},
-                audience="fast_config_admin",
-                leeway=int(settings.JWT_CLOCK_SKEW),
-            )
+            with phase("auth"):
+                payload = jwt.decode(
+                    token,
+                    settings.ADMIN_JWT_SECRET,
+                    algorithms=["HS256"],
+                    options={"require": ["exp", "iat", "aud", "sub"]},
+                    audience="fast_config_admin",
+                    leeway=int(settings.JWT_CLOCK_SKEW),
+                )
         except Exception as e:
             logger.error(e)
             return unauthorized(f"invalid admin token: {str(e)}")
         request.state.admin = payload
+        set_request_context(user_id=str(payload.get("sub")))
         return await call_next(request)
 
 def register_admin_auth(app: FastAPI):
@@ -1 +1,87 @@
-# 允许IP中间件
\ No newline at end of file
+# 允许IP中间件
+# 纯 ASGI 的前置 IP 闸门，在路由、JWT 校验与任何数据库查询之前执行：
+# - GLOBAL_DENY_IPS：所有接口一律拒绝的网段
+# - 拉取接口：按 service_ip_allow 规则（进程内编译缓存，见 utils.ip_allow.ip_rules）放行
+# - 管理接口：ADMIN_DENY_IPS 拒绝、ADMIN_ALLOW_IPS（非空时）白名单
+import ipaddress
+
+import anyio
+from fastapi import FastAPI
+from starlette.requests import Request
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from schemas.response import error_json
+from settings import settings
+from utils.ip_allow import extract_client_ip, ip_rules, parse_cidr_list
+from utils.logging import get_logger
+from utils.metrics import IP_DENIED
+
+from middleware.rate_limit import PULL_PATH_RE
+
+logger = get_logger(__name__)
+
+EXEMPT_PATHS = {"/api/health", "/api/health/live", "/api/health/ready"}
+
+_DENIED_GLOBAL = IP_DENIED.labels("global")
+_DENIED_PULL = IP_DENIED.labels("pull")
+_DENIED_ADMIN = IP_DENIED.labels("admin")
+
+
+def _in_any(ip_obj, nets) -> bool:
+    return any(net.version == ip_obj.version and ip_obj in net for net in nets)
+
+
+class AllowIpsMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.global_deny = parse_cidr_list(settings.GLOBAL_DENY_IPS)
+        self.admin_deny = parse_cidr_list(settings.ADMIN_DENY_IPS)
+        self.admin_allow = parse_cidr_list(settings.ADMIN_ALLOW_IPS)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+        client_ip = extract_client_ip(Request(scope))
+        scope.setdefault("state", {})["client_ip"] = client_ip
+        detail = await self._check(scope, client_ip)
+        if detail:
+            await error_json(403, detail)(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
+
+    async def _check(self, scope: Scope, client_ip: str) -> str | None:
+        try:
+            ip_obj = ipaddress.ip_address(client_ip)
+        except ValueError:
+            _DENIED_GLOBAL.inc()
+            return "client ip invalid"
+        if self.global_deny and _in_any(ip_obj, self.global_deny):
+            _DENIED_GLOBAL.inc()
+            return "ip denied"
+        path = scope["path"]
+        if path in EXEMPT_PATHS:
+            return None
+        m = PULL_PATH_RE.match(path)
+        if m and scope["method"] == "GET":
+            if ip_rules.needs_refresh():
+                # 规则重载会查库，放到线程池里执行，避免阻塞事件循环
+                await anyio.to_thread.run_sync(ip_rules.ensure_fresh)
+            service_code, env = m.group(1), path.rsplit("/", 1)[1]
+            if not ip_rules.is_allowed(service_code, env, ip_obj):
+                _DENIED_PULL.inc()
+                return "ip not allowed"
+            return None
+        if self.admin_deny and _in_any(ip_obj, self.admin_deny):
+            _DENIED_ADMIN.inc()
+            return "ip denied"
+        if self.admin_allow and not _in_any(ip_obj, self.admin_allow):
+            _DENIED_ADMIN.inc()
+            return "ip not allowed"
+        return None
+
+
+def register_allow_ips(app: FastAPI) -> None:
+    if str(settings.IP_GATE_ENABLED or "1").strip().lower() in {"0", "false", "no", "off"}:
+        return
+    app.add_middleware(AllowIpsMiddleware)
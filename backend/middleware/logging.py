@@ -1,147 +1,92 @@
 # 日志中间件
-import logging
-import os
-import sys
-import threading
-from pathlib import Path
-from logging.handlers import TimedRotatingFileHandler, RotatingFileHandler
-import json
-from datetime import datetime, timezone
-import contextvars
-
-_request_id_var = contextvars.ContextVar("request_id", default=None)
-_user_id_var = contextvars.ContextVar("user_id", default=None)
-
-_initialized = False
-_lock = threading.Lock()
-
-
-class JSONFormatter(logging.Formatter):
-    def format(self, record: logging.LogRecord) -> str:
-        data = {
-            "time": datetime.now(timezone.utc).astimezone().isoformat(),
-            "level": record.levelname,
-            "logger": record.name,
-            "message": record.getMessage(),
-            "module": record.module,
-            "func": record.funcName,
-            "file": record.filename,
-            "line": record.lineno,
-            "process": record.process,
-            "thread": record.thread,
-            "request_id": getattr(record, "request_id", None),
-            "user_id": getattr(record, "user_id", None),
-        }
-        if record.exc_info:
-            data["exc"] = self.formatException(record.exc_info)
-        return json.dumps(data, ensure_ascii=False)
-
-
-class ContextFilter(logging.Filter):
-    def filter(self, record: logging.LogRecord) -> bool:
-        record.request_id = _request_id_var.get() or "-"
-        record.user_id = _user_id_var.get() or "-"
-        return True
-
-
-def _str2bool(v: str) -> bool:
-    return str(v).strip().lower() in {"1", "true", "yes", "y", "on"}
-
-
-def _ensure_dir(p: Path) -> None:
-    p.mkdir(parents=True, exist_ok=True)
-
-
-def add_trace_level() -> None:
-    name = "TRACE"
-    level = 5
-    if not hasattr(logging, name):
-        logging.addLevelName(level, name)
-
-        def trace(self, msg, *args, **kwargs):
-            if self.isEnabledFor(level):
-                self._log(level, msg, args, **kwargs)
-
-        logging.Logger.trace = trace
-
-
-def init_logger() -> None:
-    global _initialized
-    if _initialized:
-        return
-    with _lock:
-        if _initialized:
+# 日志实现统一在 utils.logging，这里保留旧的导入路径，并提供请求上下文中间件：
+# 透传或生成 X-Request-ID、设置日志上下文变量，按阶段（auth / db / ser）统计耗时，
+# 通过 Server-Timing 响应头和一行结构化日志输出。
+import re
+import time
+import uuid
+
+from fastapi import FastAPI
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from settings import settings
+from utils.logging import (  # noqa: F401
+    JSONFormatter,
+    ContextFilter,
+    SamplingFilter,
+    init_logger,
+    get_logger,
+    sample_logger,
+    set_request_context,
+    clear_request_context,
+    get_request_id,
+    add_timing,
+    phase,
+    set_level,
+    _request_id_var,
+    _user_id_var,
+    _timings_var,
+)
+
+REQUEST_ID_HEADER = "x-request-id"
+_REQUEST_ID_RE = re.compile(r"[A-Za-z0-9._:-]{1,128}")
+PULL_PATH_RE = re.compile(r"^/api/v1/pull/[^/]+/[^/]+$")
+
+logger = get_logger("request")
+pull_logger = sample_logger(get_logger("request.pull"), float(settings.LOG_PULL_SAMPLE_RATE or 0.01))
+
+
+def _server_timing(timings: dict, total: float) -> str:
+    parts = [f"{k};dur={v:.1f}" for k, v in timings.items()]
+    parts.append(f"total;dur={total:.1f}")
+    return ", ".join(parts)
+
+
+class RequestContextMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
             return
-        add_trace_level()
-        base_logger = logging.getLogger("beifei")
-        base_logger.setLevel(getattr(logging, os.getenv("LOG_LEVEL", "INFO").upper(), logging.INFO))
-        base_logger.propagate = False
-        if not base_logger.handlers:
-            log_dir = Path(os.getenv("LOG_DIR", "logs"))
-            log_file = log_dir / os.getenv("LOG_FILE_NAME", "app.log")
-            use_json = _str2bool(os.getenv("LOG_JSON", "0"))
-            to_console = _str2bool(os.getenv("LOG_TO_CONSOLE", "1"))
-            to_file = _str2bool(os.getenv("LOG_TO_FILE", "1"))
-            rotation = os.getenv("LOG_ROTATION", "time").lower()
-            backup_count = int(os.getenv("LOG_BACKUP_COUNT", "7"))
-            fmt = JSONFormatter() if use_json else logging.Formatter(
-                fmt="%(asctime)s %(levelname)s %(name)s %(filename)s:%(lineno)d %(funcName)s - %(message)s [request_id=%(request_id)s user_id=%(user_id)s]",
-                datefmt="%Y-%m-%d %H:%M:%S%z",
-            )
-            context_filter = ContextFilter()
-            if to_console:
-                ch = logging.StreamHandler(stream=sys.stdout)
-                ch.setLevel(base_logger.level)
-                ch.setFormatter(fmt)
-                ch.addFilter(context_filter)
-                base_logger.addHandler(ch)
-            if to_file:
-                try:
-                    _ensure_dir(log_dir)
-                    if rotation == "size":
-                        max_bytes = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
-                        fh = RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count,
-                                                 encoding="utf-8")
-                    else:
-                        when = os.getenv("LOG_ROTATION_WHEN", "midnight")
-                        interval = int(os.getenv("LOG_ROTATION_INTERVAL", "1"))
-                        fh = TimedRotatingFileHandler(log_file, when=when, interval=interval, backupCount=backup_count,
-                                                      encoding="utf-8", utc=False)
-                    fh.setLevel(base_logger.level)
-                    fh.setFormatter(fmt)
-                    fh.addFilter(context_filter)
-                    base_logger.addHandler(fh)
-                except Exception as e:
-                    try:
-                        base_logger.warning(f"文件日志初始化失败: {e}. 已退回到控制台日志。")
-                    except Exception:
-                        pass
-        _initialized = True
-
-
-def get_logger(name: str | None = None) -> logging.Logger:
-    init_logger()
-    if name:
-        return logging.getLogger(f"beifei.{name}")
-    return logging.getLogger("beifei")
-
-
-def set_request_context(request_id: str | None = None, user_id: str | None = None) -> None:
-    if request_id is not None:
-        _request_id_var.set(request_id)
-    if user_id is not None:
-        _user_id_var.set(user_id)
-
-
-def clear_request_context() -> None:
-    _request_id_var.set(None)
-    _user_id_var.set(None)
-
-
-def set_level(level: str | int) -> None:
-    init_logger()
-    logger = logging.getLogger("beifei")
-    lvl = level if isinstance(level, int) else getattr(logging, str(level).upper(), logging.INFO)
-    logger.setLevel(lvl)
-    for h in logger.handlers:
-        h.setLevel(lvl)
+        request_id = None
+        for name, value in scope.get("headers") or ():
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")
+                break
+        if not request_id or not _REQUEST_ID_RE.fullmatch(request_id):
+            request_id = uuid.uuid4().hex
+        rid_token = _request_id_var.set(request_id)
+        uid_token = _user_id_var.set(None)
+        timings_token = _timings_var.set({})
+        timings = _timings_var.get()
+        start = time.perf_counter()
+        status = [500]
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers["X-Request-ID"] = request_id
+                headers["Server-Timing"] = _server_timing(timings, (time.perf_counter() - start) * 1000)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            total = (time.perf_counter() - start) * 1000
+            path = scope["path"]
+            log = pull_logger if PULL_PATH_RE.match(path) else logger
+            log.info(" ".join([scope["method"], path, str(status[0]), f"{total:.1f}ms",
+                               *(f"{k}={v:.1f}ms" for k, v in timings.items())]),
+                     extra={"timings": {**{k: round(v, 2) for k, v in timings.items()}, "total": round(total, 2),
+                                        "status": status[0]}})
+            _timings_var.reset(timings_token)
+            _user_id_var.reset(uid_token)
+            _request_id_var.reset(rid_token)
+
+
+def register_request_context(app: FastAPI) -> None:
+    app.add_middleware(RequestContextMiddleware)
@@ -0,0 +1,64 @@
+# 指标中间件
+# 每个请求一次直方图观测（按路由模板），拉取请求再加一次计数；标签子指标按 (method, route) 缓存。
+# 标签只取有限集合：method 限于标准动词，路由取模板，拉取的 env 只在鉴权通过（状态码 < 400）后才取自路径。
+import time
+
+from fastapi import FastAPI
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from middleware.rate_limit import PULL_PATH_RE
+from utils.ip_allow import ip_rules
+from utils.metrics import PULL_REQUESTS, REQUEST_LATENCY
+
+PULL_ROUTE = "/api/v1/pull/{service_code}/{env}"
+UNKNOWN = "_unknown"
+METHODS = frozenset({"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"})
+
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self._latency: dict = {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = [500]
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            m = PULL_PATH_RE.match(scope["path"])
+            if m:
+                route = PULL_ROUTE
+                # 未知服务（扫描器等）归入同一个标签；路径中的 env 在鉴权前可以任意构造，
+                # 只有通过 token 校验（其 env 与路径一致）的请求才按 env 打标签，其余归入 UNKNOWN
+                service = m.group(1)
+                if not ip_rules.has_service(service):
+                    service = env = UNKNOWN
+                elif status[0] < 400:
+                    env = scope["path"].rsplit("/", 1)[1]
+                else:
+                    env = UNKNOWN
+                PULL_REQUESTS.labels(service, env, str(status[0])).inc()
+            else:
+                r = scope.get("route")
+                route = getattr(r, "path", None) or "unmatched"
+            method = scope["method"]
+            key = (method if method in METHODS else "OTHER", route)
+            child = self._latency.get(key)
+            if child is None:
+                child = self._latency[key] = REQUEST_LATENCY.labels(*key)
+            child.observe(elapsed)
+
+
+def register_metrics(app: FastAPI) -> None:
+    app.add_middleware(MetricsMiddleware)
@@ -1 +1,165 @@
-# 限流中间件
\ No newline at end of file
+# 限流中间件
+# 纯 ASGI 实现的令牌桶：拉取接口按 (service, token 摘要) 限流，所有接口按客户端 IP 限流。
+# 默认使用进程内桶（每次请求 O(1)，空闲键按 LRU 顺序淘汰）；配置 RATE_LIMIT_REDIS_URL 后
+# 改为 Redis 共享状态，使多个 gunicorn worker / 容器共用同一组桶。
+import hashlib
+import math
+import re
+import time
+from collections import OrderedDict
+
+from fastapi import FastAPI
+from starlette.requests import Request
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from schemas.response import error_json
+from settings import settings
+from utils.ip_allow import extract_client_ip
+from utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+PULL_PATH_RE = re.compile(r"^/api/v1/pull/([^/]+)/[^/]+$")
+EXEMPT_PATHS = {"/api/health", "/api/health/live", "/api/health/ready", "/metrics"}
+
+
+class MemoryBuckets:
+    def __init__(self, max_keys: int = 100_000, idle_ttl: float = 600.0):
+        self.max_keys = max_keys
+        self.idle_ttl = idle_ttl
+        self._buckets: OrderedDict[str, list[float]] = OrderedDict()
+
+    async def acquire(self, key: str, rate: float, burst: float) -> float:
+        """取一个令牌；成功返回 0，否则返回需要等待的秒数。"""
+        now = time.monotonic()
+        buckets = self._buckets
+        b = buckets.get(key)
+        if b is None:
+            b = [burst, now]
+            buckets[key] = b
+        else:
+            buckets.move_to_end(key)
+            b[0] = min(burst, b[0] + (now - b[1]) * rate)
+            b[1] = now
+        wait = 0.0
+        if b[0] >= 1:
+            b[0] -= 1
+        else:
+            wait = (1 - b[0]) / rate
+        self._evict(now)
+        return wait
+
+    def _evict(self, now: float) -> None:
+        # 最久未访问的键在最前面，每次最多淘汰少量键，保持单次请求 O(1) 均摊
+        buckets = self._buckets
+        for _ in range(4):
+            if not buckets:
+                return
+            key, b = next(iter(buckets.items()))
+            if len(buckets) > self.max_keys or now - b[1] > self.idle_ttl:
+                buckets.popitem(last=False)
+            else:
+                return
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+_REDIS_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local b = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(b[1]) or burst
+local ts = tonumber(b[2]) or now
+tokens = math.min(burst, tokens + (now - ts) * rate)
+local wait = 0
+if tokens >= 1 then
+  tokens = tokens - 1
+else
+  wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(wait)
+"""
+
+
+class RedisBuckets:
+    def __init__(self, url: str, prefix: str = "fast_config:rl:"):
+        from redis import asyncio as aioredis
+
+        self._client = aioredis.from_url(url)
+        self._script = self._client.register_script(_REDIS_SCRIPT)
+        self._prefix = prefix
+
+    async def acquire(self, key: str, rate: float, burst: float) -> float:
+        return float(await self._script(keys=[self._prefix + key], args=[rate, burst]))
+
+
+def _build_backend():
+    url = settings.RATE_LIMIT_REDIS_URL
+    if url:
+        try:
+            return RedisBuckets(url)
+        except ImportError:
+            logger.warning("RATE_LIMIT_REDIS_URL 已配置但未安装 redis，退回进程内限流")
+    return MemoryBuckets(max_keys=int(settings.RATE_LIMIT_MAX_KEYS or 100_000),
+                         idle_ttl=float(settings.RATE_LIMIT_IDLE_TTL or 600))
+
+
+def _token_digest(scope: Scope) -> str | None:
+    for name, value in scope.get("headers") or ():
+        if name == b"authorization":
+            if value[:7].lower() != b"bearer ":
+                return None
+            return hashlib.blake2b(value[7:], digest_size=12).hexdigest()
+    return None
+
+
+class RateLimitMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.backend = _build_backend()
+        self.token_rate = float(settings.RATE_LIMIT_TOKEN_RATE or 20)
+        self.token_burst = float(settings.RATE_LIMIT_TOKEN_BURST or 40)
+        self.ip_rate = float(settings.RATE_LIMIT_IP_RATE or 50)
+        self.ip_burst = float(settings.RATE_LIMIT_IP_BURST or 100)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] in EXEMPT_PATHS or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+        try:
+            wait = await self._check(scope)
+        except Exception as e:
+            # 共享状态不可用时放行，限流不能成为可用性单点
+            logger.warning(f"rate limit backend error: {e}")
+            wait = 0.0
+        if wait > 0:
+            resp = error_json(429, "too many requests", headers={"Retry-After": str(max(1, math.ceil(wait)))})
+            await resp(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
+
+    async def _check(self, scope: Scope) -> float:
+        m = PULL_PATH_RE.match(scope["path"])
+        if m and scope["method"] == "GET":
+            digest = _token_digest(scope)
+            if digest:
+                wait = await self.backend.acquire(f"t:{m.group(1)}:{digest}", self.token_rate, self.token_burst)
+                if wait > 0:
+                    return wait
+        client_ip = extract_client_ip(Request(scope))
+        return await self.backend.acquire(f"ip:{client_ip}", self.ip_rate, self.ip_burst)
+
+
+def register_rate_limit(app: FastAPI) -> None:
+    # 默认关闭：按 IP 的桶依赖真实客户端地址，反向代理后未配置 TRUSTED_PROXIES 时所有请求共用代理地址一个桶
+    if str(settings.RATE_LIMIT_ENABLED or "0").strip().lower() not in {"1", "true", "yes", "on"}:
+        return
+    if not settings.TRUSTED_PROXIES:
+        logger.warning("RATE_LIMIT_ENABLED without TRUSTED_PROXIES: X-Forwarded-For is ignored, "
+                       "clients behind a reverse proxy share one per-IP bucket")
+    app.add_middleware(RateLimitMiddleware)
@@ -0,0 +1,28 @@
+# 只读镜像中间件
+# 边缘镜像模式（MIRROR_PRIMARY_URL）下本地库只由同步任务写入，除登录外的写请求一律拒绝，应发往主库。
+from fastapi import FastAPI
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from schemas.response import error_json
+from tasks.mirror_sync_task import mirror_enabled
+
+READ_METHODS = {"GET", "HEAD", "OPTIONS"}
+WRITE_EXEMPT_PATHS = {"/api/v1/auth/login"}
+
+
+class ReadOnlyMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and scope["method"] not in READ_METHODS \
+                and scope["path"] not in WRITE_EXEMPT_PATHS:
+            await error_json(403, "read-only mirror: send writes to the primary")(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
+
+
+def register_read_only(app: FastAPI) -> None:
+    if not mirror_enabled():
+        return
+    app.add_middleware(ReadOnlyMiddleware)
@@ -0,0 +1,60 @@
+# 读自己的写入中间件
+# 配置只读副本时生效：写请求提交后把主库 revision 通过 X-Config-Revision 响应头和 fc_rev cookie 交给客户端；
+# 之后的请求带上该头（API 客户端）或 cookie（管理后台），只读接口只路由到水位不低于它的副本（database.get_read_db）。
+from fastapi import FastAPI
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from database import _revision_var, read_router
+
+REVISION_HEADER = "X-Config-Revision"
+REVISION_COOKIE = "fc_rev"
+
+
+def _parse(value: str | None) -> int:
+    return int(value) if value and value.isdigit() and len(value) <= 19 else 0
+
+
+def _client_revision(scope: Scope) -> int:
+    header = cookie = None
+    for name, value in scope.get("headers") or ():
+        if name == b"x-config-revision":
+            header = value.decode("latin-1")
+        elif name == b"cookie":
+            for part in value.decode("latin-1").split(";"):
+                k, _, v = part.strip().partition("=")
+                if k == REVISION_COOKIE:
+                    cookie = v
+    return max(_parse(header), _parse(cookie))
+
+
+class ReadRevisionMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        state = {"min": _client_revision(scope), "wrote": None}
+        token = _revision_var.set(state)
+
+        async def send_wrapper(message: Message) -> None:
+            # 同步接口在线程池中提交，state 与线程共享同一个 dict，响应开始时已写入
+            if message["type"] == "http.response.start" and state["wrote"]:
+                headers = MutableHeaders(scope=message)
+                headers[REVISION_HEADER] = str(state["wrote"])
+                headers.append("Set-Cookie", f"{REVISION_COOKIE}={state['wrote']}; Max-Age={int(read_router.sticky)}; "
+                                             f"Path=/; HttpOnly; SameSite=Lax")
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _revision_var.reset(token)
+
+
+def register_read_revision(app: FastAPI) -> None:
+    if not read_router.replicas:
+        return
+    app.add_middleware(ReadRevisionMiddleware)
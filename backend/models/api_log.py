@@ -1 +1,39 @@
-# API请求日志模型
\ No newline at end of file
+# API请求日志模型
+from sqlalchemy import Column, String, Integer, TIMESTAMP, Index
+from sqlalchemy.sql import func
+from database import Base
+from models.types import BigInt, LongText
+
+
+# 拉取接口访问日志，由 services.log_writer 后台批量写入
+class ApiLog(Base):
+    __tablename__ = "api_logs"
+    id = Column(BigInt, primary_key=True, autoincrement=True)
+    service_code = Column(String(64), nullable=False)
+    env = Column(String(32), nullable=False)
+    instance = Column(String(128))
+    version = Column(String(64))
+    status = Column(Integer, nullable=False)
+    latency_ms = Column(Integer, nullable=False)
+    client_ip = Column(String(64))
+    created_at = Column(TIMESTAMP, nullable=False, default=func.now())
+    __table_args__ = (
+        Index("idx_apilog_svc_env", "service_code", "env", "created_at"),
+        Index("idx_apilog_created", "created_at"),
+    )
+
+
+# 管理端变更审计
+class AuditLog(Base):
+    __tablename__ = "audit_logs"
+    id = Column(BigInt, primary_key=True, autoincrement=True)
+    actor = Column(String(128))
+    action = Column(String(64), nullable=False)
+    target_type = Column(String(64), nullable=False)
+    target_id = Column(BigInt)
+    detail = Column(LongText)
+    created_at = Column(TIMESTAMP, nullable=False, default=func.now())
+    __table_args__ = (
+        Index("idx_audit_target", "target_type", "target_id"),
+        Index("idx_audit_created", "created_at"),
+    )
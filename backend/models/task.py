@@ -1 +1,13 @@
-# 异步任务模型
\ No newline at end of file
+# 异步任务模型
+from sqlalchemy import Column, String, TIMESTAMP
+from sqlalchemy.sql import func
+from database import Base
+
+
+# 调度器选主用的锁行：owner 在 expires_at 之前持续续约即为 leader，过期后其它实例可抢占
+class SchedulerLock(Base):
+    __tablename__ = "scheduler_locks"
+    name = Column(String(64), primary_key=True)
+    owner = Column(String(128), nullable=False)
+    expires_at = Column(TIMESTAMP, nullable=False)
+    updated_at = Column(TIMESTAMP, nullable=False, default=func.now(), onupdate=func.now())
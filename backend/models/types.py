@@ -0,0 +1,13 @@
+# 跨方言列类型
+# MySQL 上保持与 scripts/fast_config.sql 一致的 LONGTEXT / VARBINARY / BIGINT，其它方言（SQLite）退回通用类型。
+from sqlalchemy import BigInteger, Integer, LargeBinary, Text
+from sqlalchemy.dialects import mysql
+
+# SQLite 只有 INTEGER PRIMARY KEY 才是 rowid 别名并自增
+BigInt = BigInteger().with_variant(Integer(), "sqlite")
+
+LongText = Text().with_variant(mysql.LONGTEXT(), "mysql")
+
+
+def VarBinary(length: int):
+    return LargeBinary(length).with_variant(mysql.VARBINARY(length), "mysql")
@@ -0,0 +1,30 @@
+from sqlalchemy import Column, String, Enum, TIMESTAMP, Index
+from sqlalchemy.sql import func
+from database import Base
+from models.types import BigInt
+
+
+# 全局变更流水：id 即 revision，由 ChangeSeq 按提交顺序分配；服务、凭证、token、吊销、IP 规则、配置及其派生数据的每次增删改各一行
+class Change(Base):
+    __tablename__ = "changes"
+    id = Column(BigInt, primary_key=True, autoincrement=True)
+    entity = Column(String(64), nullable=False)
+    entity_id = Column(BigInt, nullable=False)
+    op = Column(Enum("create", "update", "delete"), nullable=False)
+    service_id = Column(BigInt)
+    env = Column(String(32))
+    detail = Column(String(256))
+    actor = Column(String(128))
+    created_at = Column(TIMESTAMP, nullable=False, default=func.now())
+    __table_args__ = (
+        Index("idx_changes_service", "service_id", "id"),
+        Index("idx_changes_created", "created_at"),
+    )
+
+
+# revision 计数器（单行）：写流水的事务先给计数加 n，行锁持有到提交，revision 因此按提交顺序分配；
+# 事务回滚时计数一并回滚，流水中不会出现空洞
+class ChangeSeq(Base):
+    __tablename__ = "change_seq"
+    name = Column(String(64), primary_key=True)
+    value = Column(BigInt, nullable=False, default=0)
@@ -1,33 +1,82 @@
-from sqlalchemy import Column, BigInteger, String, Enum, TIMESTAMP, ForeignKey, Boolean
-from sqlalchemy.dialects.mysql import LONGTEXT
+from sqlalchemy import Column, String, Enum, TIMESTAMP, ForeignKey, Boolean, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
+from models.types import BigInt, LongText, VarBinary
 
 
 class Config(Base):
     __tablename__ = "configs"
-    id = Column(BigInteger, primary_key=True, autoincrement=True)
-    service_id = Column(BigInteger, ForeignKey("services.id"), nullable=False)
+    id = Column(BigInt, primary_key=True, autoincrement=True)
+    service_id = Column(BigInt, ForeignKey("services.id", ondelete="CASCADE"), nullable=False)
     env = Column(String(32), nullable=False)
     format = Column(Enum("json", "yaml", "toml", "ini"), nullable=False)
-    content = Column(LONGTEXT, nullable=False)
-    schema_def = Column(LONGTEXT)
+    content = Column(LongText, nullable=False)
+    schema_def = Column(LongText)
     version = Column(String(32), nullable=False, default="0.0.1")
     is_published = Column(Boolean, nullable=False, default=False)
     updated_by = Column(String(128))
     updated_at = Column(TIMESTAMP, nullable=False, default=func.now(), onupdate=func.now())
     service = relationship("Service", back_populates="configs")
     versions = relationship("ConfigVersion", back_populates="config", cascade="all, delete-orphan")
+    views = relationship("ConfigMergedView", back_populates="config", cascade="all, delete-orphan")
+    data_key = relationship("ConfigDataKey", back_populates="config", cascade="all, delete-orphan", uselist=False)
 
 
 class ConfigVersion(Base):
     __tablename__ = "config_versions"
-    id = Column(BigInteger, primary_key=True, autoincrement=True)
-    config_id = Column(BigInteger, ForeignKey("configs.id"), nullable=False)
+    id = Column(BigInt, primary_key=True, autoincrement=True)
+    config_id = Column(BigInt, ForeignKey("configs.id", ondelete="CASCADE"), nullable=False)
     version = Column(String(32), nullable=False)
-    content = Column(LONGTEXT, nullable=False)
+    content = Column(LongText, nullable=False)
     summary = Column(String(256))
     created_by = Column(String(128))
     created_at = Column(TIMESTAMP, nullable=False, default=func.now())
     config = relationship("Config", back_populates="versions")
+
+
+# 继承层：global（全部服务）→ service（服务全部环境）→ env（即 configs 行）→ instance（单实例覆盖）
+class ConfigLayer(Base):
+    __tablename__ = "config_layers"
+    __table_args__ = (UniqueConstraint("scope_key", name="uk_layer_scope"),)
+    id = Column(BigInt, primary_key=True, autoincrement=True)
+    scope = Column(Enum("global", "service", "instance"), nullable=False)
+    service_id = Column(BigInt, ForeignKey("services.id", ondelete="CASCADE"))
+    env = Column(String(32))
+    instance = Column(String(128))
+    # 唯一键：service_id/env/instance 可为空，多列唯一索引对 NULL 不生效，改用非空的拼接键
+    scope_key = Column(String(200), nullable=False)
+    content = Column(LongText, nullable=False)
+    version = Column(BigInt, nullable=False, default=1)
+    updated_by = Column(String(128))
+    updated_at = Column(TIMESTAMP, nullable=False, default=func.now(), onupdate=func.now())
+    service = relationship("Service", back_populates="layers")
+
+    @staticmethod
+    def make_scope_key(scope: str, service_id, env, instance) -> str:
+        return f"{scope}:{service_id or 0}:{env or ''}:{instance or ''}"
+
+
+# 按层合并后的物化视图，instance 为空串表示该 (service, env) 的基础视图
+class ConfigMergedView(Base):
+    __tablename__ = "config_merged_views"
+    __table_args__ = (UniqueConstraint("config_id", "instance", name="uk_view_cfg_instance"),)
+    id = Column(BigInt, primary_key=True, autoincrement=True)
+    config_id = Column(BigInt, ForeignKey("configs.id", ondelete="CASCADE"), nullable=False)
+    instance = Column(String(128), nullable=False, default="")
+    content = Column(LongText, nullable=False)
+    etag = Column(String(64), nullable=False)
+    deps = Column(String(256), nullable=False)
+    updated_at = Column(TIMESTAMP, nullable=False, default=func.now(), onupdate=func.now())
+    config = relationship("Config", back_populates="views")
+
+
+# 每个配置一把数据密钥（DEK），由 CRED_MASTER_KEY 包裹后落库，secret 值用 DEK 加密
+class ConfigDataKey(Base):
+    __tablename__ = "config_data_keys"
+    id = Column(BigInt, primary_key=True, autoincrement=True)
+    config_id = Column(BigInt, ForeignKey("configs.id", ondelete="CASCADE"), unique=True, nullable=False)
+    wrapped_key = Column(VarBinary(512), nullable=False)
+    created_at = Column(TIMESTAMP, nullable=False, default=func.now())
+    rotated_at = Column(TIMESTAMP)
+    config = relationship("Config", back_populates="data_key")
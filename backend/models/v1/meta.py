@@ -1,11 +1,12 @@
-from sqlalchemy import Column, BigInteger, String, TIMESTAMP
+from sqlalchemy import Column, String, TIMESTAMP
 from sqlalchemy.sql import func
 from database import Base
+from models.types import BigInt
 
 
 class AppBackendBase(Base):
     __tablename__ = "app_backend_bases"
-    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    id = Column(BigInt, primary_key=True, autoincrement=True)
     appid = Column(String(64), unique=True, nullable=False)
     base_url = Column(String(256), nullable=False)
     note = Column(String(256))
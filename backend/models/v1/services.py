@@ -1,14 +1,14 @@
-from sqlalchemy import Column, BigInteger, String, Text, Enum, TIMESTAMP, ForeignKey, Boolean
-from sqlalchemy.dialects.mysql import VARBINARY
+from sqlalchemy import Column, String, Text, Enum, TIMESTAMP, ForeignKey, Boolean, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
+from models.types import BigInt, VarBinary
 from typing import Optional
 
 
 class Service(Base):
     __tablename__ = "services"
-    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    id = Column(BigInt, primary_key=True, autoincrement=True)
     code = Column(String(64), unique=True, nullable=False)
     name = Column(String(128), nullable=False)
     owner = Column(String(128))
@@ -19,35 +19,56 @@ class Service(Base):
     tokens = relationship("ServiceToken", back_populates="service", cascade="all, delete-orphan")
     configs = relationship("Config", back_populates="service", cascade="all, delete-orphan")
     allow_ips = relationship("ServiceIpAllow", back_populates="service", cascade="all, delete-orphan")
+    layers = relationship("ConfigLayer", back_populates="service", cascade="all, delete-orphan")
 
 
 class ServiceCredential(Base):
     __tablename__ = "service_credentials"
-    id = Column(BigInteger, primary_key=True, autoincrement=True)
-    service_id = Column(BigInteger, ForeignKey("services.id"), nullable=False)
+    id = Column(BigInt, primary_key=True, autoincrement=True)
+    service_id = Column(BigInt, ForeignKey("services.id", ondelete="CASCADE"), nullable=False)
     ak = Column(String(64), unique=True, nullable=False)
-    sk_ciphertext = Column(VARBINARY(512), nullable=False)
+    sk_ciphertext = Column(VarBinary(512), nullable=False)
     status = Column(Enum("active", "disabled"), nullable=False, default="active")
     created_at = Column(TIMESTAMP, nullable=False, default=func.now())
     last_rotated_at = Column(TIMESTAMP)
+    # 轮换后旧凭证继续有效到 grace_until，之后由 credential_expiry 任务禁用
+    grace_until = Column(TIMESTAMP)
     service = relationship("Service", back_populates="credentials")
 
 
 class ServiceToken(Base):
     __tablename__ = "service_tokens"
-    id = Column(BigInteger, primary_key=True, autoincrement=True)
-    service_id = Column(BigInteger, ForeignKey("services.id"), nullable=False)
+    id = Column(BigInt, primary_key=True, autoincrement=True)
+    service_id = Column(BigInt, ForeignKey("services.id", ondelete="CASCADE"), nullable=False)
     token = Column(Text, nullable=False)
+    jti = Column(String(64), unique=True)
     env = Column(String(32), nullable=False)
     expires_at = Column(TIMESTAMP, nullable=False)
     created_at = Column(TIMESTAMP, nullable=False, default=func.now())
     service = relationship("Service", back_populates="tokens")
+    __table_args__ = (
+        Index("idx_token_expires", "expires_at"),
+    )
+
+
+# 已吊销 token 的 jti，无状态校验模式下各进程据此增量构建内存吊销集合；token 自然过期后可清理
+class RevokedToken(Base):
+    __tablename__ = "revoked_tokens"
+    id = Column(BigInt, primary_key=True, autoincrement=True)
+    jti = Column(String(64), unique=True, nullable=False)
+    service_id = Column(BigInt, nullable=False)
+    expires_at = Column(TIMESTAMP, nullable=False)
+    revoked_at = Column(TIMESTAMP, nullable=False, default=func.now())
+    __table_args__ = (
+        Index("idx_revoked_at", "revoked_at"),
+        Index("idx_revoked_expires", "expires_at"),
+    )
 
 
 class ServiceIpAllow(Base):
     __tablename__ = "service_ip_allow"
-    id = Column(BigInteger, primary_key=True, autoincrement=True)
-    service_id = Column(BigInteger, ForeignKey("services.id"), nullable=False)
+    id = Column(BigInt, primary_key=True, autoincrement=True)
+    service_id = Column(BigInt, ForeignKey("services.id", ondelete="CASCADE"), nullable=False)
     env = Column(String(32))
     cidr = Column(String(64), nullable=False)
     note = Column(String(256))
@@ -0,0 +1,43 @@
+from sqlalchemy import Column, String, Integer, Enum, TIMESTAMP, ForeignKey, Boolean, Index
+from sqlalchemy.sql import func
+from database import Base
+from models.types import BigInt, LongText, VarBinary
+
+
+# 配置变更推送目标；env 为空表示该服务全部环境
+class Webhook(Base):
+    __tablename__ = "webhooks"
+    id = Column(BigInt, primary_key=True, autoincrement=True)
+    service_id = Column(BigInt, ForeignKey("services.id", ondelete="CASCADE"), nullable=False)
+    env = Column(String(32))
+    url = Column(String(512), nullable=False)
+    secret_ciphertext = Column(VarBinary(512), nullable=False)
+    active = Column(Boolean, nullable=False, default=True)
+    max_concurrency = Column(Integer, nullable=False, default=4)
+    created_at = Column(TIMESTAMP, nullable=False, default=func.now())
+    updated_at = Column(TIMESTAMP, nullable=False, default=func.now(), onupdate=func.now())
+    __table_args__ = (
+        Index("idx_webhook_service", "service_id", "env"),
+    )
+
+
+# 推送发件箱：与配置变更同事务写入，由 tasks.app_data_push_task 异步投递
+class WebhookOutbox(Base):
+    __tablename__ = "webhook_outbox"
+    id = Column(BigInt, primary_key=True, autoincrement=True)
+    webhook_id = Column(BigInt, ForeignKey("webhooks.id", ondelete="CASCADE"), nullable=False)
+    event = Column(String(64), nullable=False)
+    payload = Column(LongText, nullable=False)
+    status = Column(Enum("pending", "delivering", "delivered", "failed"), nullable=False, default="pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(TIMESTAMP, nullable=False, default=func.now())
+    locked_by = Column(String(128))
+    locked_until = Column(TIMESTAMP)
+    last_status = Column(Integer)
+    last_error = Column(String(512))
+    created_at = Column(TIMESTAMP, nullable=False, default=func.now())
+    delivered_at = Column(TIMESTAMP)
+    __table_args__ = (
+        Index("idx_outbox_status_next", "status", "next_attempt_at"),
+        Index("idx_outbox_webhook", "webhook_id", "id"),
+    )
@@ -0,0 +1,26 @@
+from datetime import datetime
+from pydantic import BaseModel
+from typing import Optional
+
+
+class ChangeOut(BaseModel):
+    id: int
+    entity: str
+    entity_id: int
+    op: str
+    service_id: Optional[int] = None
+    env: Optional[str] = None
+    detail: Optional[str] = None
+    actor: Optional[str] = None
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class ChangePage(BaseModel):
+    changes: list[ChangeOut]
+    # 下一页的 since；has_more 为假时表示已读到当前稳定 revision，稍后用 next 继续轮询
+    next: int
+    has_more: bool
+    revision: int
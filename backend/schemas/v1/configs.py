@@ -6,7 +6,7 @@ from typing import Optional, Literal
 class ConfigCreate(BaseModel):
     service_code: str
     env: str
-    format: Literal["json"]
+    format: Literal["json", "yaml", "toml", "ini"]
     content: str
     schema_def: Optional[str] = None
     version: str
@@ -24,7 +24,7 @@ class ConfigOut(BaseModel):
     id: int
     service_id: int
     env: str
-    format: Literal["json"]
+    format: Literal["json", "yaml", "toml", "ini"]
     content: str
     schema_def: Optional[str]
     version: str
@@ -56,3 +56,53 @@ class ImportTextReq(BaseModel):
     base_version: Optional[str] = None
     new_version: str
     updated_by: Optional[str] = None
+
+
+class ValidateReq(BaseModel):
+    service_code: str
+    schema_def: Optional[str] = None
+
+
+class ValidateErrorOut(BaseModel):
+    key: str
+    error: str
+
+
+class ValidateResultOut(BaseModel):
+    config_id: int
+    env: str
+    version: str
+    valid: bool
+    errors: list[ValidateErrorOut]
+
+
+class LayerUpsert(BaseModel):
+    scope: Literal["global", "service", "instance"]
+    service_code: Optional[str] = None
+    env: Optional[str] = None
+    instance: Optional[str] = None
+    content: str
+    updated_by: Optional[str] = None
+
+
+class LayerOut(BaseModel):
+    id: int
+    scope: str
+    service_id: Optional[int] = None
+    env: Optional[str] = None
+    instance: Optional[str] = None
+    content: str
+    version: int
+    updated_by: Optional[str] = None
+    updated_at: datetime | None = None
+
+    class Config:
+        from_attributes = True
+
+
+class MergedViewOut(BaseModel):
+    config_id: int
+    instance: str
+    etag: str
+    deps: str
+    content: dict[str, str]
@@ -0,0 +1,6 @@
+from pydantic import BaseModel, Field
+
+
+class MirrorRowsReq(BaseModel):
+    # 表名 -> 需要的行 id
+    tables: dict[str, list[int]] = Field(default_factory=dict)
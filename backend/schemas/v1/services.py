@@ -1,5 +1,5 @@
 from datetime import datetime
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional
 from typing import Literal
 
@@ -35,6 +35,32 @@ class ServiceTokenOut(BaseModel):
 class TokenResponse(BaseModel):
     token: str
 
+
+class TokenBulkReq(BaseModel):
+    services: Optional[list[str]] = None
+    envs: list[str]
+    days: int = Field(default=30, ge=1, le=365)
+    revoke_previous: bool = False
+
+
+class TokenBulkItemOut(BaseModel):
+    service_code: str
+    env: str
+    token: str
+    expires_at: datetime
+
+
+class TokenBulkErrorOut(BaseModel):
+    service_code: str
+    error: str
+
+
+class TokenBulkOut(BaseModel):
+    issued: int
+    revoked: int
+    items: list[TokenBulkItemOut]
+    errors: list[TokenBulkErrorOut] = []
+
 class TokenMonitorItemOut(BaseModel):
     id: int
     service_code: str
@@ -42,9 +68,29 @@ class TokenMonitorItemOut(BaseModel):
     created_at: datetime
     expires_at: datetime
 
+class TokenBucketsOut(BaseModel):
+    expired: int = 0
+    lt_1d: int = 0
+    lt_7d: int = 0
+    lt_30d: int = 0
+    later: int = 0
+
+
+class TokenGroupOut(BaseModel):
+    key: str
+    total: int
+    soon: int
+    buckets: TokenBucketsOut
+
+
 class TokenMonitorOut(BaseModel):
     total: int
     soon: int
+    buckets: TokenBucketsOut
+    by_env: list[TokenGroupOut] = []
+    by_service: list[TokenGroupOut] = []
+    page: int = 1
+    page_size: int = 100
     items: list[TokenMonitorItemOut]
 
 
@@ -53,11 +99,13 @@ class CredentialOut(BaseModel):
     status: str
     created_at: datetime
     last_rotated_at: Optional[datetime] = None
+    grace_until: Optional[datetime] = None
 
 
 class CredentialRotateOut(BaseModel):
     ak: str
     sk: str
+    grace_until: Optional[datetime] = None
 
 
 class AllowIPCreate(BaseModel):
@@ -0,0 +1,44 @@
+from datetime import datetime
+from pydantic import BaseModel, Field
+from typing import Optional
+
+
+class WebhookCreate(BaseModel):
+    service_code: str
+    url: str
+    env: Optional[str] = None
+    secret: Optional[str] = None
+    max_concurrency: int = Field(default=4, ge=1, le=64)
+
+
+class WebhookOut(BaseModel):
+    id: int
+    service_id: int
+    env: Optional[str] = None
+    url: str
+    active: bool
+    max_concurrency: int
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class WebhookCreateOut(WebhookOut):
+    secret: str
+
+
+class WebhookDeliveryOut(BaseModel):
+    id: int
+    webhook_id: int
+    event: str
+    status: str
+    attempts: int
+    next_attempt_at: Optional[datetime] = None
+    last_status: Optional[int] = None
+    last_error: Optional[str] = None
+    created_at: datetime
+    delivered_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
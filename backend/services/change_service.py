@@ -0,0 +1,155 @@
+# 变更流水
+# 写入：会话 flush 后按 ORM 新增/修改/删除的对象自动写 changes（同一事务，随业务一起提交或回滚）；
+# 绕过 ORM 的批量语句（批量签发、过期清理、凭证宽限期等）由调用方用 record_changes 补记。
+# revision 不用自增 id：写流水前先给 change_seq 计数行加 n，行锁持有到提交，后来的事务要等前一个提交或回滚后
+# 才能分配，revision 因此按提交顺序递增且回滚不留空洞，读到 N 时不会再有更小的 revision 提交。
+# 代价是写流水的事务在计数行上串行化，适用于管理端写入量。created_at 取数据库时间，只用于按保留天数清理。
+from datetime import datetime, timedelta, timezone
+
+from fastapi import HTTPException
+from sqlalchemy import event, func, insert, inspect, select, update
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import ObjectDeletedError
+
+from database import SessionLocal
+from models.v1.changes import Change, ChangeSeq
+from models.v1.configs import Config
+from utils.logging import get_user_id
+
+# 记入流水的表 -> (service_id, env, detail) 取值
+TRACKED = {
+    "services": lambda o: (o.id, None, o.code),
+    "service_credentials": lambda o: (o.service_id, None, o.status),
+    "service_tokens": lambda o: (o.service_id, o.env, o.jti),
+    "revoked_tokens": lambda o: (o.service_id, None, o.jti),
+    "service_ip_allow": lambda o: (o.service_id, o.env, o.cidr),
+    "configs": lambda o: (o.service_id, o.env, o.version),
+    "config_layers": lambda o: (o.service_id, o.env, o.scope),
+    "config_merged_views": lambda o: (None, None, o.instance or None),
+    "config_data_keys": lambda o: (None, None, None),
+}
+# 挂在配置下的派生数据，service_id / env 取自所属配置
+_BY_CONFIG = {"config_merged_views", "config_data_keys"}
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _entry(entity: str, entity_id: int, op: str, service_id, env, detail, actor) -> dict:
+    return {"entity": entity, "entity_id": entity_id, "op": op, "service_id": service_id, "env": env,
+            "detail": None if detail is None else str(detail)[:256], "actor": actor}
+
+
+def _allocate(conn, rows: list[dict]) -> None:
+    """给本事务的流水分配连续 revision。UPDATE 先拿计数行的行锁，持有到事务结束。"""
+    n = len(rows)
+    seq = ChangeSeq.__table__
+    if not conn.execute(update(seq).where(seq.c.name == "changes").values(value=seq.c.value + n)).rowcount:
+        # 未初始化计数行的库（create_all 建表）从现有最大 id 接着分配
+        start = conn.execute(select(func.max(Change.id))).scalar() or 0
+        conn.execute(insert(seq).values(name="changes", value=start + n))
+    first = conn.execute(select(seq.c.value).where(seq.c.name == "changes")).scalar() - n + 1
+    for i, row in enumerate(rows):
+        row["id"] = first + i
+
+
+def _describe(entity: str, obj) -> tuple:
+    try:
+        return TRACKED[entity](obj) + ((obj.config_id,) if entity in _BY_CONFIG else (None,))
+    except ObjectDeletedError:
+        # 提交后过期又被删除的对象无法再加载属性，只记 id
+        return None, None, None, None
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _capture(session: Session, flush_context) -> None:
+    items = []
+    for op, objs in (("create", session.new), ("update", session.dirty), ("delete", session.deleted)):
+        for obj in objs:
+            entity = getattr(obj, "__tablename__", None)
+            if entity not in TRACKED:
+                continue
+            if op == "update" and not session.is_modified(obj, include_collections=False):
+                continue
+            # 新对象在 after_flush 时还没有 identity，主键已由 INSERT 回填
+            state = inspect(obj)
+            entity_id = state.identity[0] if state.identity else obj.id
+            items.append((entity, entity_id, op, *_describe(entity, obj)))
+    if not items:
+        return
+    # 派生数据所属配置优先取本次 flush 中的配置（可能已随服务一起删除），其余回表查询
+    configs = {i[1]: (i[3], i[4]) for i in items if i[0] == "configs"}
+    missing = {i[6] for i in items if i[6] is not None and i[6] not in configs}
+    conn = session.connection()
+    if missing:
+        configs.update({r.id: (r.service_id, r.env) for r in conn.execute(
+            select(Config.id, Config.service_id, Config.env).where(Config.id.in_(missing)))})
+    actor = get_user_id()
+    rows = []
+    for entity, entity_id, op, service_id, env, detail, config_id in items:
+        if config_id is not None:
+            service_id, env = configs.get(config_id, (None, None))
+        rows.append(_entry(entity, entity_id, op, service_id, env, detail, actor))
+    _allocate(conn, rows)
+    conn.execute(insert(Change), rows)
+
+
+def record_changes(db: Session, entity: str, op: str, items, chunk_size: int = 500) -> int:
+    """补记批量语句的变更；items 为 (entity_id, service_id, env, detail)。调用方负责 commit。"""
+    actor = get_user_id()
+    rows = [_entry(entity, i, op, sid, env, detail, actor) for i, sid, env, detail in items]
+    if not rows:
+        return 0
+    _allocate(db.connection(), rows)
+    for i in range(0, len(rows), chunk_size):
+        db.execute(insert(Change).values(rows[i:i + chunk_size]))
+    return len(rows)
+
+
+def stable_revision(db: Session) -> int:
+    """不会再有更小 revision 提交的最大 revision：revision 按提交顺序分配，已提交的最大值即是。"""
+    return db.query(func.max(Change.id)).scalar() or 0
+
+
+def oldest_revision(db: Session) -> int:
+    return db.query(func.min(Change.id)).scalar() or 0
+
+
+def list_changes(db: Session, since: int, limit: int, entity: str | None = None,
+                 service_id: int | None = None) -> dict:
+    stable = stable_revision(db)
+    q = db.query(Change).filter(Change.id > since, Change.id <= stable)
+    if entity:
+        q = q.filter(Change.entity == entity)
+    if service_id is not None:
+        q = q.filter(Change.service_id == service_id)
+    rows = q.order_by(Change.id.asc()).limit(limit).all()
+    has_more = len(rows) == limit
+    # 过滤后不足一页说明 stable 之前已全部扫过，游标直接推进到 stable
+    cursor = rows[-1].id if has_more else max(since, stable)
+    return {"changes": rows, "next": cursor, "has_more": has_more, "revision": stable}
+
+
+def read_page(db: Session, since: int, limit: int, entity: str | None = None, service_id: int | None = None) -> dict:
+    """带清理检查的分页读取：游标之后的流水已被清理时增量无法衔接，返回 410。"""
+    oldest = oldest_revision(db)
+    if since and oldest and since < oldest - 1:
+        raise HTTPException(status_code=410, detail=f"revision {since} has been purged (oldest {oldest}), resync required")
+    return list_changes(db, since, limit, entity, service_id)
+
+
+def purge_changes(db: Session, retention_days: int, batch_size: int = 1000) -> int:
+    cutoff = _utcnow() - timedelta(days=retention_days)
+    deleted = 0
+    while True:
+        ids = [i for (i,) in db.query(Change.id).filter(Change.created_at < cutoff).order_by(
+            Change.id.asc()).limit(batch_size).all()]
+        if not ids:
+            break
+        db.query(Change).filter(Change.id.in_(ids)).delete(synchronize_session=False)
+        db.commit()
+        deleted += len(ids)
+        if len(ids) < batch_size:
+            break
+    return deleted
@@ -1 +1,267 @@
-# 应用配置服务
\ No newline at end of file
+# 应用配置服务
+import hashlib
+import json
+from collections import defaultdict
+from typing import Iterable, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+from models.v1.configs import Config, ConfigLayer, ConfigMergedView
+from services import secret_service
+from utils.cache import TTLCache
+from utils.config_formats import FormatError, parse, render
+from utils.config_schema import SchemaError, compile_schema
+
+# (view_id, etag) -> 合并后的扁平配置，etag 变化即自然失效
+_view_cache = TTLCache(maxsize=4096, name="view")
+# (view_id, etag, format) -> 渲染后的文本
+_render_cache = TTLCache(maxsize=1024, name="render")
+
+
+def _plain(v):
+    # YAML / TOML 的日期时间等非 JSON 类型与顶层值一样按 str() 转为字符串，非字符串键同样转换
+    if isinstance(v, dict):
+        return {str(k): _plain(i) for k, i in v.items()}
+    if isinstance(v, list):
+        return [_plain(i) for i in v]
+    if v is None or isinstance(v, (str, int, float, bool)):
+        return v
+    return str(v)
+
+
+def to_str_map(obj) -> dict[str, str]:
+    if not isinstance(obj, dict):
+        raise HTTPException(status_code=400, detail="content must be object")
+    str_map = {}
+    for k, v in obj.items():
+        if isinstance(v, (dict, list)):
+            try:
+                str_map[str(k)] = json.dumps(_plain(v), ensure_ascii=False)
+            except (TypeError, ValueError) as e:
+                raise FormatError(str(e))
+        else:
+            str_map[str(k)] = str(v)
+    return str_map
+
+
+def parse_content(fmt: str, text: str) -> dict[str, str]:
+    try:
+        return to_str_map(parse(fmt, text))
+    except FormatError:
+        raise HTTPException(status_code=400, detail=f"content must be valid {fmt}")
+
+
+def normalize_content(fmt: str, text: str) -> tuple[str, dict[str, str]]:
+    """解析写入内容，返回 (落库文本, 规范映射)。json 落库为规范化后的 JSON，其余格式保留原文。"""
+    str_map = parse_content(fmt, text)
+    if fmt == "json":
+        return json.dumps(str_map, ensure_ascii=False, indent=2), str_map
+    return text, str_map
+
+
+def validate_schema(schema_def: str | None, str_map: dict[str, str]) -> list[dict]:
+    if not schema_def:
+        return []
+    try:
+        schema = compile_schema(schema_def)
+    except SchemaError as e:
+        raise HTTPException(status_code=400, detail=f"invalid schema_def: {e}")
+    return schema.validate(str_map)
+
+
+def ensure_schema_valid(schema_def: str | None, str_map: dict[str, str]) -> None:
+    errors = validate_schema(schema_def, str_map)
+    if errors:
+        detail = "; ".join(f"{e['key']}: {e['error']}" for e in errors[:20])
+        raise HTTPException(status_code=400, detail=f"schema validation failed: {detail}")
+
+
+def prepare_content(db: Session, c: Config, fmt: str, content_str: str, str_map: dict[str, str],
+                    schema_def: str | None) -> str:
+    """校验并封装写入内容，返回落库文本。c 需已 flush（有 id），c.content 仍为上一版本。"""
+    str_map = secret_service.open_submitted(db, c, str_map)
+    ensure_schema_valid(schema_def, str_map)
+    if not schema_def:
+        return content_str
+    schema_secrets = compile_schema(schema_def).secret_keys
+    in_layers = schema_secrets.intersection(_inherited_keys(db, c))
+    if in_layers:
+        raise HTTPException(status_code=400,
+                            detail=f"secret keys are set in inherited layers: {', '.join(sorted(in_layers))}")
+    secret_keys = schema_secrets.intersection(str_map)
+    if not secret_keys:
+        return content_str
+    previous = env_layer_map(c) if c.content else {}
+    sealed = secret_service.seal(db, c, str_map, frozenset(secret_keys), previous)
+    if fmt == "json":
+        return json.dumps(sealed, ensure_ascii=False, indent=2)
+    # 含 secret 的非 json 文档按规范映射重新渲染，原文中的明文不落库
+    return render(fmt, sealed)
+
+
+def _inherited_keys(db: Session, c: Config) -> set[str]:
+    keys: set[str] = set()
+    rows = db.query(ConfigLayer.content).filter(or_(
+        ConfigLayer.scope == "global",
+        and_(ConfigLayer.scope == "service", ConfigLayer.service_id == c.service_id),
+        and_(ConfigLayer.scope == "instance", ConfigLayer.service_id == c.service_id, ConfigLayer.env == c.env)))
+    for (content,) in rows:
+        keys.update(json.loads(content))
+    return keys
+
+
+def ensure_layer_plain(db: Session, layer_map: dict[str, str], scope: str, service_id: Optional[int],
+                       env: Optional[str]) -> None:
+    """继承层不做信封加密（DEK 按配置划分），受影响配置的 schema 标记为 secret 的键及密文只能写在 env 配置中。"""
+    for k, v in layer_map.items():
+        if secret_service.is_encrypted(v):
+            raise HTTPException(status_code=400, detail=f"{k}: encrypted values are not allowed in layers")
+    q = db.query(Config.schema_def).filter(Config.schema_def.isnot(None))
+    if scope != "global":
+        q = q.filter(Config.service_id == service_id)
+    if scope == "instance":
+        q = q.filter(Config.env == env)
+    secrets: set[str] = set()
+    for (schema_def,) in q.distinct():
+        try:
+            secrets.update(compile_schema(schema_def).secret_keys.intersection(layer_map))
+        except SchemaError:
+            continue
+    if secrets:
+        raise HTTPException(status_code=400,
+                            detail=f"secret keys must be set on the env config, not in a layer: {', '.join(sorted(secrets))}")
+
+
+def env_layer_map(c: Config) -> dict[str, str]:
+    if c.format == "json":
+        return json.loads(c.content)
+    return to_str_map(parse(c.format, c.content))
+
+
+def _view_etag(version: str, deps: list[str], content: str) -> str:
+    if len(deps) == 1:
+        # 没有继承层时与旧版保持一致，直接使用配置版本号
+        return version
+    return f"{version}-{hashlib.sha1(content.encode()).hexdigest()[:10]}"
+
+
+def refresh_views(db: Session, configs: Optional[Iterable[Config]] = None, service_ids: Optional[Iterable[int]] = None,
+                  all_configs: bool = False) -> int:
+    """重新物化受影响配置的合并视图；依赖指纹未变化的视图会被跳过。调用方负责 commit。"""
+    db.flush()
+    if configs is not None:
+        targets = list(configs)
+    elif service_ids is not None:
+        targets = db.query(Config).filter(Config.service_id.in_(list(service_ids))).all()
+    elif all_configs:
+        targets = db.query(Config).all()
+    else:
+        return 0
+    if not targets:
+        return 0
+    svc_ids = {c.service_id for c in targets}
+    glob = db.query(ConfigLayer).filter(ConfigLayer.scope == "global").first()
+    svc_layers = {l.service_id: l for l in db.query(ConfigLayer).filter(ConfigLayer.scope == "service",
+                                                                       ConfigLayer.service_id.in_(svc_ids))}
+    inst_layers = defaultdict(list)
+    for l in db.query(ConfigLayer).filter(ConfigLayer.scope == "instance", ConfigLayer.service_id.in_(svc_ids)):
+        inst_layers[(l.service_id, l.env)].append(l)
+    existing = {(v.config_id, v.instance): v for v in
+                db.query(ConfigMergedView).filter(ConfigMergedView.config_id.in_([c.id for c in targets]))}
+    layer_maps: dict[int, dict] = {}
+
+    def layer_map(layer: ConfigLayer) -> dict:
+        if layer.id not in layer_maps:
+            layer_maps[layer.id] = json.loads(layer.content)
+        return layer_maps[layer.id]
+
+    changed = 0
+    for c in targets:
+        base: dict[str, str] = {}
+        deps: list[str] = []
+        if glob:
+            base.update(layer_map(glob))
+            deps.append(f"g{glob.id}.{glob.version}")
+        sl = svc_layers.get(c.service_id)
+        if sl:
+            base.update(layer_map(sl))
+            deps.append(f"s{sl.id}.{sl.version}")
+        base.update(env_layer_map(c))
+        deps.append(f"e{c.id}.{c.version}")
+        wanted = {"": (base, deps)}
+        for il in inst_layers.get((c.service_id, c.env), []):
+            merged = dict(base)
+            merged.update(layer_map(il))
+            wanted[il.instance] = (merged, deps + [f"i{il.id}.{il.version}"])
+        for instance, (merged, d) in wanted.items():
+            fp = "|".join(d)
+            v = existing.pop((c.id, instance), None)
+            if v is not None and v.deps == fp:
+                continue
+            content = json.dumps(merged, ensure_ascii=False)
+            etag = _view_etag(c.version, d, content)
+            if v is None:
+                db.add(ConfigMergedView(config_id=c.id, instance=instance, content=content, etag=etag, deps=fp))
+            else:
+                v.content = content
+                v.etag = etag
+                v.deps = fp
+                db.add(v)
+            changed += 1
+    # 已删除的 instance 层对应的视图
+    for v in existing.values():
+        db.delete(v)
+        changed += 1
+    return changed
+
+
+def _load_view(db: Session, view_id: int, etag: str) -> tuple[dict[str, str], tuple[str, ...]]:
+    key = (view_id, etag)
+    cached = _view_cache.get(key)
+    if cached is not None:
+        return cached
+    content = db.query(ConfigMergedView.content).filter(ConfigMergedView.id == view_id).scalar()
+    str_map = json.loads(content)
+    cached = (str_map, tuple(k for k, v in str_map.items() if secret_service.is_encrypted(v)))
+    _view_cache.set(key, cached)
+    return cached
+
+
+def warm_views(db: Session, limit: Optional[int] = None) -> int:
+    """启动预热：一次查询把活跃服务最近更新的合并视图载入 _view_cache。"""
+    from models.v1.services import Service
+
+    limit = limit or _view_cache.maxsize
+    rows = db.query(ConfigMergedView.id, ConfigMergedView.etag, ConfigMergedView.content).join(
+        Config, Config.id == ConfigMergedView.config_id).join(Service, Service.id == Config.service_id).filter(
+        Service.active.is_(True)).order_by(ConfigMergedView.updated_at.desc()).limit(limit).all()
+    for view_id, etag, content in rows:
+        str_map = json.loads(content)
+        _view_cache.set((view_id, etag), (str_map, tuple(k for k, v in str_map.items()
+                                                          if secret_service.is_encrypted(v))))
+    return len(rows)
+
+
+def get_view_content(db: Session, config_id: int, view_id: int, etag: str) -> dict[str, str]:
+    str_map, secret_keys = _load_view(db, view_id, etag)
+    return secret_service.get_plain(db, config_id, view_id, etag, str_map, secret_keys)
+
+
+def get_view_rendered(db: Session, config_id: int, view_id: int, etag: str, deps: str, fmt: str, own_fmt: str) -> str:
+    key = (view_id, etag, fmt)
+    cached = _render_cache.get(key)
+    if cached is not None:
+        return cached
+    str_map, secret_keys = _load_view(db, view_id, etag)
+    if secret_keys:
+        # 含 secret 的明文不进入无过期的渲染缓存
+        return render(fmt, secret_service.get_plain(db, config_id, view_id, etag, str_map, secret_keys))
+    if fmt == own_fmt and "|" not in deps:
+        # 没有继承层时原样返回作者写入的文档（保留注释与结构）
+        text = db.query(Config.content).filter(Config.id == config_id).scalar()
+    else:
+        text = render(fmt, str_map)
+    _render_cache.set(key, text)
+    return text
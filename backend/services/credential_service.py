@@ -0,0 +1,289 @@
+# 服务凭证相关服务
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from cryptography.fernet import InvalidToken
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from models.v1.changes import Change
+from models.v1.services import Service, ServiceCredential
+from services.change_service import record_changes
+from settings import settings
+from utils.cache import TTLCache
+from utils.crypto import decrypt_sk, encrypt_sk, gen_ak_sk, rotate_cipher
+from utils.logging import get_logger
+from utils.metrics import cache_counters
+
+logger = get_logger(__name__)
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class CachedCredential:
+    """凭证快照。sk 明文只能通过属性读取，repr/str 中不出现，避免被日志或异常信息带出。"""
+    __slots__ = ("ak", "service_id", "service_code", "status", "created_at", "grace_until", "_cipher", "_sk")
+
+    def __init__(self, ak: str, service_id: int, service_code: str, status: str, created_at: datetime | None,
+                 grace_until: datetime | None, cipher: bytes):
+        self.ak = ak
+        self.service_id = service_id
+        self.service_code = service_code
+        self.status = status
+        self.created_at = created_at
+        self.grace_until = grace_until
+        self._cipher = cipher
+        self._sk: str | None = None
+
+    @property
+    def sk(self) -> str:
+        if self._sk is None:
+            self._sk = decrypt_sk(self._cipher)
+        return self._sk
+
+    @property
+    def active(self) -> bool:
+        # 宽限期结束即视为失效，不依赖禁用任务是否已经执行
+        return self.status == "active" and (self.grace_until is None or self.grace_until > _utcnow())
+
+    @property
+    def in_grace(self) -> bool:
+        return self.grace_until is not None
+
+    def __repr__(self) -> str:
+        return f"CachedCredential(ak={self.ak!r}, service={self.service_code!r}, status={self.status!r})"
+
+    __str__ = __repr__
+
+
+def _signing_order(cred: CachedCredential):
+    # 签发优先用不在宽限期内的凭证，其次按创建时间取最新
+    return not cred.in_grace, cred.created_at or datetime.min
+
+
+# 变更流水中出现这些表的变更即整表重载（删除服务时凭证随外键级联删除，只记 services）
+_FEED_ENTITIES = ("service_credentials", "services")
+
+
+class CredentialRegistry:
+    """ak -> 凭证快照（含解密后的 sk），整表加载。
+
+    本进程内的凭证变更在提交后调用 reload() 立即生效；其它 worker / 实例的禁用、轮换、删除通过变更流水感知：
+    每 poll 秒查一次加载时的 revision 之后是否有凭证或服务的变更，有则整表重载。TTL 整表重载只作兜底。
+    未知 ak 回源单查一次，查不到的结果短时间负缓存。
+    """
+
+    def __init__(self, ttl: float = 60.0, poll: float = 1.0):
+        self.ttl = ttl
+        self.poll = poll
+        self._by_ak: dict[str, CachedCredential] | None = None
+        self._by_service: dict[int, list[CachedCredential]] = {}
+        self._loaded_at = 0.0
+        self._checked_at = 0.0
+        self._revision = 0
+        self._lock = threading.Lock()
+        self._missing = TTLCache(maxsize=4096, ttl=5.0)
+        self._hits, self._misses = cache_counters("credentials")
+
+    @staticmethod
+    def _query(db: Session):
+        return db.query(ServiceCredential.ak, ServiceCredential.service_id, Service.code, ServiceCredential.status,
+                        ServiceCredential.created_at, ServiceCredential.grace_until,
+                        ServiceCredential.sk_ciphertext).join(
+            Service, ServiceCredential.service_id == Service.id)
+
+    def _load(self) -> None:
+        from database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            # 先取 revision 再读凭证：之后提交的变更一定会在下次轮询时被看到
+            revision = db.query(func.max(Change.id)).scalar() or 0
+            rows = self._query(db).all()
+        finally:
+            db.close()
+        old = self._by_ak or {}
+        by_ak: dict[str, CachedCredential] = {}
+        for ak, service_id, code, status, created_at, grace_until, cipher in rows:
+            cred = CachedCredential(ak, service_id, code, status, created_at, grace_until, bytes(cipher))
+            prev = old.get(ak)
+            # 密文未变时沿用已解密的 sk，整表重载不重复解密
+            if prev is not None and prev._cipher == cred._cipher:
+                cred._sk = prev._sk
+            by_ak[ak] = cred
+        by_service: dict[int, list[CachedCredential]] = {}
+        for cred in by_ak.values():
+            by_service.setdefault(cred.service_id, []).append(cred)
+        for creds in by_service.values():
+            creds.sort(key=_signing_order, reverse=True)
+        self._by_ak, self._by_service = by_ak, by_service
+        self._revision = revision
+        self._loaded_at = self._checked_at = time.monotonic()
+        self._missing.clear()
+
+    def _changed(self) -> bool:
+        """加载之后变更流水里是否出现了凭证或服务的变更。revision 按提交顺序分配，只需比较最大值。"""
+        from database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            revision = db.query(func.max(Change.id)).scalar() or 0
+            if revision <= self._revision:
+                return False
+            hit = db.query(Change.id).filter(Change.id > self._revision, Change.id <= revision,
+                                             Change.entity.in_(_FEED_ENTITIES)).first()
+        finally:
+            db.close()
+        if hit is None:
+            self._revision = revision
+        return hit is not None
+
+    def ensure_fresh(self) -> None:
+        now = time.monotonic()
+        if self._by_ak is not None and now - self._loaded_at < self.ttl and now - self._checked_at < self.poll:
+            return
+        if not self._lock.acquire(blocking=self._by_ak is None):
+            return
+        try:
+            now = time.monotonic()
+            if self._by_ak is None or now - self._loaded_at >= self.ttl:
+                self._load()
+            elif now - self._checked_at >= self.poll:
+                self._checked_at = now
+                if self._changed():
+                    self._load()
+        finally:
+            self._lock.release()
+
+    def reload(self) -> None:
+        with self._lock:
+            self._load()
+
+    def decrypt_all(self) -> int:
+        self.ensure_fresh()
+        count = 0
+        for cred in list((self._by_ak or {}).values()):
+            if cred.active:
+                try:
+                    cred.sk
+                    count += 1
+                except InvalidToken:
+                    logger.warning(f"credential {cred.ak} cannot be decrypted with current master key")
+        return count
+
+    @property
+    def loaded(self) -> bool:
+        return self._by_ak is not None
+
+    def __len__(self) -> int:
+        return len(self._by_ak or {})
+
+    def get(self, ak: str) -> CachedCredential | None:
+        self.ensure_fresh()
+        cred = (self._by_ak or {}).get(ak)
+        if cred is not None:
+            self._hits.inc()
+            return cred
+        self._misses.inc()
+        if self._missing.get(ak):
+            return None
+        return self._fetch(ak)
+
+    def _fetch(self, ak: str) -> CachedCredential | None:
+        # 其它实例刚创建的凭证在下次整表重载前按 ak 单查回源
+        from database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            row = self._query(db).filter(ServiceCredential.ak == ak).first()
+        finally:
+            db.close()
+        if row is None:
+            self._missing.set(ak, True)
+            return None
+        cred = CachedCredential(*row[:6], bytes(row[6]))
+        with self._lock:
+            if self._by_ak is not None:
+                by_ak = dict(self._by_ak)
+                by_ak[ak] = cred
+                by_service = dict(self._by_service)
+                by_service[cred.service_id] = sorted(
+                    [c for c in by_service.get(cred.service_id, []) if c.ak != ak] + [cred],
+                    key=_signing_order, reverse=True)
+                self._by_ak, self._by_service = by_ak, by_service
+        return cred
+
+    def latest_active(self, service_id: int) -> CachedCredential | None:
+        """签发 token 使用的凭证：宽限期内的旧凭证只用于校验，仅在没有其它凭证时才用来签发。"""
+        self.ensure_fresh()
+        for cred in self._by_service.get(service_id, ()):
+            if cred.active:
+                return cred
+        return None
+
+
+credentials = CredentialRegistry(ttl=float(settings.CREDENTIAL_CACHE_TTL or 60),
+                                 poll=float(settings.CREDENTIAL_CHANGES_POLL or 1))
+
+
+def rotate_credential(db: Session, service: Service, grace_seconds: int) -> tuple[ServiceCredential, str, datetime]:
+    """新建一对 AK/SK，当前启用且未处于宽限期的凭证进入宽限期；宽限期内新旧凭证签发的 token 都能通过校验。调用方负责 commit。"""
+    now = _utcnow()
+    grace_until = now + timedelta(seconds=grace_seconds)
+    ids = [i for (i,) in db.query(ServiceCredential.id).filter(
+        ServiceCredential.service_id == service.id, ServiceCredential.status == "active",
+        ServiceCredential.grace_until.is_(None))]
+    db.query(ServiceCredential).filter(ServiceCredential.id.in_(ids)).update(
+        {"grace_until": grace_until, "last_rotated_at": now}, synchronize_session=False)
+    record_changes(db, "service_credentials", "update", [(i, service.id, None, "grace") for i in ids])
+    ak, sk = gen_ak_sk()
+    cred = ServiceCredential(service_id=service.id, ak=ak, sk_ciphertext=encrypt_sk(sk), status="active",
+                             created_at=now)
+    db.add(cred)
+    return cred, sk, grace_until
+
+
+def expire_grace_credentials(db: Session) -> int:
+    """禁用宽限期已结束的旧凭证。"""
+    rows = db.query(ServiceCredential.id, ServiceCredential.service_id).filter(
+        ServiceCredential.status == "active", ServiceCredential.grace_until.isnot(None),
+        ServiceCredential.grace_until <= _utcnow(),
+    ).all()
+    n = db.query(ServiceCredential).filter(ServiceCredential.id.in_([r.id for r in rows])).update(
+        {"status": "disabled"}, synchronize_session=False) if rows else 0
+    record_changes(db, "service_credentials", "update", [(r.id, r.service_id, None, "disabled") for r in rows])
+    db.commit()
+    if n:
+        credentials.reload()
+    return n
+
+
+def reencrypt_credentials(db: Session, batch_size: int = 200) -> dict:
+    """主密钥轮换后，把仍由旧主密钥加密的 sk_ciphertext 改用当前主密钥加密。按主键分批提交。"""
+    last_id = 0
+    reencrypted = 0
+    failed = 0
+    while True:
+        rows = db.query(ServiceCredential).filter(ServiceCredential.id > last_id).order_by(
+            ServiceCredential.id.asc()).limit(batch_size).all()
+        if not rows:
+            break
+        for row in rows:
+            last_id = row.id
+            try:
+                new = rotate_cipher(bytes(row.sk_ciphertext))
+            except InvalidToken:
+                failed += 1
+                continue
+            if new is None:
+                continue
+            row.sk_ciphertext = new
+            db.add(row)
+            reencrypted += 1
+        db.commit()
+    credentials.reload()
+    logger.info(f"reencrypt credentials done: reencrypted={reencrypted} failed={failed}")
+    return {"reencrypted": reencrypted, "failed": failed}
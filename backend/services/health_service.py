@@ -0,0 +1,126 @@
+# 就绪探测
+# 依赖检查（数据库、连接池、主密钥、启动预热是否完成）的结果整体缓存 HEALTH_PROBE_TTL 秒，
+# Docker / nginx / 部署脚本频繁探测时每个 worker 每个周期最多真正探测一次。
+import threading
+import time
+
+from sqlalchemy import text
+
+from database import SessionLocal, engine, read_router
+from models.v1.services import ServiceCredential
+from settings import settings
+from utils.crypto import decrypt_sk, unwrap_key, wrap_key
+from utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+_lock = threading.Lock()
+_cached: tuple[float, bool, dict] | None = None
+
+
+def _timed(fn) -> dict:
+    start = time.perf_counter()
+    try:
+        result = fn() or {}
+        result.setdefault("ok", True)
+    except Exception as e:
+        result = {"ok": False, "error": str(e) or type(e).__name__}
+    result["ms"] = round((time.perf_counter() - start) * 1000, 2)
+    return result
+
+
+def _check_db() -> dict:
+    db = SessionLocal()
+    try:
+        db.execute(text("SELECT 1"))
+    finally:
+        db.close()
+    return {}
+
+
+def _check_pool() -> dict:
+    pool = engine.pool
+    size = pool.size() if hasattr(pool, "size") else 0
+    if not size:
+        return {"ok": True}
+    capacity = size + max(getattr(pool, "_max_overflow", 0), 0)
+    checked_out = pool.checkedout()
+    saturation = checked_out / capacity
+    limit = float(settings.HEALTH_POOL_MAX_SATURATION or 0.9)
+    return {"ok": saturation < limit, "checked_out": checked_out, "capacity": capacity,
+            "saturation": round(saturation, 3)}
+
+
+def _check_crypto() -> dict:
+    if not settings.CRED_MASTER_KEY:
+        return {"ok": False, "error": "CRED_MASTER_KEY not configured"}
+    db = SessionLocal()
+    try:
+        cipher = db.query(ServiceCredential.sk_ciphertext).filter(
+            ServiceCredential.status == "active").limit(1).scalar()
+    finally:
+        db.close()
+    if cipher is not None:
+        # 能解开一条真实凭证，说明主密钥与库中数据匹配
+        decrypt_sk(bytes(cipher))
+        return {"sample": "credential"}
+    if unwrap_key(wrap_key(b"probe")) != b"probe":
+        return {"ok": False, "error": "master key roundtrip failed"}
+    return {"sample": "roundtrip"}
+
+
+def _check_warmup() -> dict:
+    from services import warmup
+
+    return {"ok": warmup.is_warm(), "status": warmup.state["status"]}
+
+
+def _check_replicas() -> dict:
+    # 副本落后或不可达时读请求回落主库，只展示状态，不影响就绪
+    if not read_router.replicas:
+        return {}
+    read_router.check()
+    return {"replicas": read_router.status()}
+
+
+def _check_mirror() -> dict:
+    from tasks.mirror_sync_task import mirror, mirror_enabled
+
+    if not mirror_enabled():
+        return {}
+    # 首次同步完成前本地库为空；之后主库不可达时继续用本地数据服务
+    st = mirror.status()
+    return {"ok": st["synced"], "age_seconds": st["age_seconds"], "last_error": st["last_error"]}
+
+
+PROBES = {
+    "db": _check_db,
+    "pool": _check_pool,
+    "crypto": _check_crypto,
+    "warmup": _check_warmup,
+    "replicas": _check_replicas,
+    "mirror": _check_mirror,
+}
+
+
+def readiness() -> tuple[bool, dict]:
+    global _cached
+    ttl = float(settings.HEALTH_PROBE_TTL or 5)
+    cached = _cached
+    if cached and time.monotonic() - cached[0] < ttl:
+        return cached[1], cached[2]
+    with _lock:
+        cached = _cached
+        if cached and time.monotonic() - cached[0] < ttl:
+            return cached[1], cached[2]
+        checks = {}
+        for name, probe in PROBES.items():
+            checks[name] = _timed(probe)
+            # 数据库不可达时后续依赖库的检查没有意义
+            if name == "db" and not checks[name]["ok"]:
+                break
+        ready = len(checks) == len(PROBES) and all(c["ok"] for c in checks.values())
+        if not ready:
+            logger.warning(f"readiness check failed: {checks}")
+        _cached = (time.monotonic(), ready, checks)
+        return ready, checks
@@ -0,0 +1,119 @@
+# 访问日志 / 审计日志的异步批量写入
+# 请求路径只做一次非阻塞入队（队列满即丢弃并计数），后台线程攒批后按表做多行 INSERT，
+# 日志库抖动或变慢只会导致丢弃计数上升，不会拖慢拉取与管理接口。
+import queue
+import threading
+import time
+
+from sqlalchemy import insert
+
+from database import SessionLocal
+from settings import settings
+from utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class BatchLogWriter:
+    def __init__(self, maxsize: int = 10000, batch_size: int = 500, flush_interval: float = 1.0):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: queue.Queue = queue.Queue(maxsize=maxsize)
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+        self.enqueued = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        # 入队时队列已超过 80% 的次数，用来观察写库跟不上的趋势
+        self.backpressure = 0
+        self._high_water = int(maxsize * 0.8)
+
+    def submit(self, model, row: dict) -> bool:
+        if self._thread is None:
+            return False
+        try:
+            self._queue.put_nowait((model, row))
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.enqueued += 1
+        if self._queue.qsize() > self._high_water:
+            self.backpressure += 1
+        return True
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "backpressure": self.backpressure,
+        }
+
+    def _drain(self) -> list:
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            batch = self._drain()
+            if batch:
+                self._flush(batch)
+        # 退出前把剩余的日志写完
+        while True:
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return
+            self._flush(batch)
+
+    def _flush(self, batch: list) -> None:
+        grouped: dict = {}
+        for model, row in batch:
+            grouped.setdefault(model, []).append(row)
+        db = SessionLocal()
+        try:
+            for model, rows in grouped.items():
+                db.execute(insert(model).values(rows))
+            db.commit()
+            self.written += len(batch)
+        except Exception as e:
+            db.rollback()
+            self.failed += len(batch)
+            logger.warning(f"log writer flush failed, dropped {len(batch)} rows: {e}")
+        finally:
+            db.close()
+
+
+log_writer = BatchLogWriter(maxsize=int(settings.ACCESS_LOG_QUEUE_SIZE or 10000),
+                            batch_size=int(settings.ACCESS_LOG_BATCH_SIZE or 500),
+                            flush_interval=float(settings.ACCESS_LOG_FLUSH_INTERVAL or 1.0))
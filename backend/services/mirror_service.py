@@ -0,0 +1,118 @@
+# 边缘镜像同步
+# 首次同步（或变更流水已被清理）时，主库按 (id, 指纹) 生成拉取接口依赖表的清单，镜像与本地比对后只拉取新增或
+# 变化的行并删除本地多出的行；指纹只取轻量列，生成清单不读取配置正文。之后按 changes 流水增量同步，见 changed_ids。
+# sk_ciphertext / wrapped_key 以主密钥密文形态传输，镜像节点需配置与主库相同的 CRED_MASTER_KEY。
+import base64
+from datetime import datetime
+
+from sqlalchemy import DateTime, LargeBinary, delete, insert, update
+from sqlalchemy.orm import Session
+
+from models.v1.configs import Config, ConfigDataKey, ConfigMergedView
+from models.v1.services import RevokedToken, Service, ServiceCredential, ServiceIpAllow, ServiceToken
+
+# 按外键依赖排序：写入按此顺序，删除按逆序。指纹带上标识列（code、ak、jti、created_at 等），
+# 同一 id 被删除后复用（SQLite 无 AUTOINCREMENT 时会发生）也能识别为变化
+MIRRORED = [
+    (Service, (Service.code, Service.updated_at, Service.active)),
+    (ServiceCredential, (ServiceCredential.ak, ServiceCredential.status, ServiceCredential.last_rotated_at,
+                         ServiceCredential.grace_until)),
+    (ServiceToken, (ServiceToken.service_id, ServiceToken.jti, ServiceToken.created_at, ServiceToken.expires_at)),
+    (RevokedToken, (RevokedToken.jti,)),
+    (ServiceIpAllow, (ServiceIpAllow.service_id, ServiceIpAllow.env, ServiceIpAllow.cidr, ServiceIpAllow.created_at)),
+    (Config, (Config.service_id, Config.env, Config.version, Config.updated_at, Config.is_published)),
+    (ConfigDataKey, (ConfigDataKey.config_id, ConfigDataKey.created_at, ConfigDataKey.rotated_at)),
+    (ConfigMergedView, (ConfigMergedView.config_id, ConfigMergedView.etag)),
+]
+MODELS = {model.__tablename__: model for model, _ in MIRRORED}
+
+
+def _fingerprint(values) -> str:
+    return "|".join("" if v is None else str(v) for v in values)
+
+
+def build_manifest(db: Session) -> dict[str, dict[int, str]]:
+    manifest = {}
+    for model, cols in MIRRORED:
+        manifest[model.__tablename__] = {row[0]: _fingerprint(row[1:]) for row in db.query(model.id, *cols)}
+    return manifest
+
+
+def _dump(col, v):
+    if v is None:
+        return None
+    if isinstance(col.type, LargeBinary):
+        return base64.b64encode(bytes(v)).decode()
+    if isinstance(col.type, DateTime):
+        return v.isoformat()
+    return v
+
+
+def _load(col, v):
+    if v is None:
+        return None
+    if isinstance(col.type, LargeBinary):
+        return base64.b64decode(v)
+    if isinstance(col.type, DateTime):
+        return datetime.fromisoformat(v)
+    return v
+
+
+def dump_rows(db: Session, ids: dict[str, list[int]]) -> dict[str, list[dict]]:
+    out = {}
+    for name, wanted in ids.items():
+        model = MODELS[name]
+        cols = list(model.__table__.columns)
+        rows = db.query(*cols).filter(model.id.in_(wanted)).all() if wanted else []
+        out[name] = [{c.name: _dump(c, v) for c, v in zip(cols, row)} for row in rows]
+    return out
+
+
+def plan(remote: dict[str, dict], local: dict[str, dict[int, str]]) -> tuple[dict[str, list[int]], dict[str, list[int]]]:
+    """比对清单，返回 (需要从主库拉取的 id, 需要本地删除的 id)。远端清单经 JSON 传输，id 为字符串。"""
+    fetch, drop = {}, {}
+    for name in MODELS:
+        theirs = {int(k): v for k, v in (remote.get(name) or {}).items()}
+        mine = local.get(name, {})
+        fetch[name] = sorted(i for i, fp in theirs.items() if mine.get(i) != fp)
+        drop[name] = sorted(i for i in mine if i not in theirs)
+    return fetch, drop
+
+
+def changed_ids(changes: list[dict]) -> dict[str, list[int]]:
+    """变更流水中涉及的镜像表行 id；增删改一律按主库当前状态拉取，主库已不存在的行即为删除。"""
+    ids: dict[str, set[int]] = {}
+    for c in changes:
+        if c["entity"] in MODELS:
+            ids.setdefault(c["entity"], set()).add(int(c["entity_id"]))
+    return {name: sorted(v) for name, v in ids.items()}
+
+
+def apply_changes(db: Session, drop: dict[str, list[int]], rows: dict[str, list[dict]], batch_size: int = 500) -> dict:
+    """在一个事务内删除、更新、插入；返回各表变更行数及新增的吊销记录。"""
+    counts: dict[str, int] = {}
+    for model, _ in reversed(MIRRORED):
+        ids = drop.get(model.__tablename__) or []
+        for i in range(0, len(ids), batch_size):
+            db.execute(delete(model).where(model.id.in_(ids[i:i + batch_size])))
+        counts[model.__tablename__] = len(ids)
+    revoked = []
+    for model, _ in MIRRORED:
+        name = model.__tablename__
+        cols = {c.name: c for c in model.__table__.columns}
+        items = [{k: _load(cols[k], v) for k, v in r.items() if k in cols} for r in rows.get(name) or []]
+        if not items:
+            continue
+        existing = {i for (i,) in db.query(model.id).filter(model.id.in_([r["id"] for r in items]))}
+        # 已有的行逐行 UPDATE：先删后插会级联删除子表
+        for r in items:
+            if r["id"] in existing:
+                db.execute(update(model).where(model.id == r["id"]).values(**r))
+        new = [r for r in items if r["id"] not in existing]
+        if new:
+            db.execute(insert(model), new)
+        counts[name] = counts.get(name, 0) + len(items)
+        if model is RevokedToken:
+            revoked = [(r["jti"], r["expires_at"]) for r in new]
+    db.commit()
+    return {"counts": {k: v for k, v in counts.items() if v}, "revoked": revoked}
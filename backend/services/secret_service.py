@@ -0,0 +1,164 @@
+# 配置 secret 值的信封加密
+# 每个配置一把 DEK（Fernet key），DEK 由 CRED_MASTER_KEY 包裹后存入 config_data_keys；
+# secret 值以 "enc:v1:<token>" 形式存放在 configs.content 中。拉取时解包后的 DEK 与解密结果
+# 都放在有界、带 TTL 的进程内缓存里，避免每次拉取对每个 secret 键都做一次主密钥解密。
+from datetime import datetime, timezone
+
+from cryptography.fernet import Fernet, InvalidToken
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from models.v1.configs import Config, ConfigDataKey
+from settings import settings
+from utils.cache import TTLCache
+from utils.crypto import wrap_key, unwrap_key, rotate_cipher
+from utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+ENC_PREFIX = "enc:v1:"
+
+# config_id -> 解包后的 DEK；DEK 本身不会变化，轮换主密钥只改变其包裹
+_dek_cache = TTLCache(maxsize=int(settings.SECRET_DEK_CACHE_SIZE or 1024),
+                      ttl=int(settings.SECRET_DEK_CACHE_TTL or 300), name="dek")
+# (view_id, etag) -> 解密后的扁平配置
+_plain_cache = TTLCache(maxsize=int(settings.SECRET_VALUE_CACHE_SIZE or 1024),
+                        ttl=int(settings.SECRET_VALUE_CACHE_TTL or 60), name="secret_plain")
+
+
+def is_encrypted(v: str) -> bool:
+    return v.startswith(ENC_PREFIX)
+
+
+def _load_dek(db: Session, config_id: int) -> Fernet | None:
+    f = _dek_cache.get(config_id)
+    if f is not None:
+        return f
+    wrapped = db.query(ConfigDataKey.wrapped_key).filter(ConfigDataKey.config_id == config_id).scalar()
+    if wrapped is None:
+        return None
+    f = Fernet(unwrap_key(bytes(wrapped)))
+    _dek_cache.set(config_id, f)
+    return f
+
+
+def _get_or_create_dek(db: Session, c: Config) -> Fernet:
+    f = _load_dek(db, c.id)
+    if f is not None:
+        return f
+    if not settings.CRED_MASTER_KEY:
+        raise HTTPException(status_code=500, detail="CRED_MASTER_KEY not configured")
+    key = Fernet.generate_key()
+    db.add(ConfigDataKey(config_id=c.id, wrapped_key=wrap_key(key)))
+    f = Fernet(key)
+    _dek_cache.set(c.id, f)
+    return f
+
+
+def warm_data_keys(db: Session, limit: int | None = None) -> int:
+    """启动预热：一次查询解包最近创建的 DEK。"""
+    limit = limit or _dek_cache.maxsize
+    rows = db.query(ConfigDataKey.config_id, ConfigDataKey.wrapped_key).order_by(
+        ConfigDataKey.id.desc()).limit(limit).all()
+    for config_id, wrapped in rows:
+        try:
+            _dek_cache.set(config_id, Fernet(unwrap_key(bytes(wrapped))))
+        except InvalidToken:
+            logger.warning(f"config {config_id} data key cannot be unwrapped")
+    return len(rows)
+
+
+def open_submitted(db: Session, c: Config, str_map: dict[str, str]) -> dict[str, str]:
+    """把提交内容中回传的密文（例如控制台原样回写）还原为明文，便于统一校验与重新封装。"""
+    if not any(is_encrypted(v) for v in str_map.values()):
+        return str_map
+    f = _load_dek(db, c.id) if c.id else None
+    if f is None:
+        raise HTTPException(status_code=400, detail="encrypted value without data key")
+    out = {}
+    for k, v in str_map.items():
+        if is_encrypted(v):
+            try:
+                v = f.decrypt(v[len(ENC_PREFIX):].encode()).decode()
+            except InvalidToken:
+                raise HTTPException(status_code=400, detail=f"{k}: encrypted value cannot be decrypted")
+        out[k] = v
+    return out
+
+
+def seal(db: Session, c: Config, str_map: dict[str, str], secret_keys: frozenset[str],
+         previous: dict[str, str]) -> dict[str, str]:
+    """加密 secret 键；明文未变化的键沿用上一版本的密文，避免版本 diff 产生无意义的变动。"""
+    keys = secret_keys.intersection(str_map)
+    if not keys:
+        return str_map
+    f = _get_or_create_dek(db, c)
+    out = dict(str_map)
+    for k in keys:
+        prev = previous.get(k)
+        if prev and is_encrypted(prev):
+            try:
+                if f.decrypt(prev[len(ENC_PREFIX):].encode()).decode() == str_map[k]:
+                    out[k] = prev
+                    continue
+            except InvalidToken:
+                pass
+        out[k] = ENC_PREFIX + f.encrypt(str_map[k].encode()).decode()
+    return out
+
+
+def decrypt_map(db: Session, config_id: int, str_map: dict[str, str], secret_keys=None) -> dict[str, str]:
+    keys = secret_keys if secret_keys is not None else [k for k, v in str_map.items() if is_encrypted(v)]
+    if not keys:
+        return str_map
+    f = _load_dek(db, config_id)
+    out = dict(str_map)
+    for k in keys:
+        if f is None:
+            logger.warning(f"config {config_id} has encrypted values but no data key")
+            break
+        try:
+            out[k] = f.decrypt(str_map[k][len(ENC_PREFIX):].encode()).decode()
+        except InvalidToken:
+            logger.warning(f"config {config_id} key {k} cannot be decrypted")
+    return out
+
+
+def get_plain(db: Session, config_id: int, view_id: int, etag: str, str_map: dict[str, str],
+              secret_keys: tuple[str, ...]) -> dict[str, str]:
+    if not secret_keys:
+        return str_map
+    key = (view_id, etag)
+    plain = _plain_cache.get(key)
+    if plain is None:
+        plain = decrypt_map(db, config_id, str_map, secret_keys)
+        _plain_cache.set(key, plain)
+    return plain
+
+
+def rewrap_data_keys(db: Session, batch_size: int = 200) -> dict:
+    """主密钥轮换后，把仍由旧主密钥包裹的 DEK 改用当前主密钥包裹。按主键分批提交。"""
+    last_id = 0
+    rewrapped = 0
+    failed = 0
+    while True:
+        rows = db.query(ConfigDataKey).filter(ConfigDataKey.id > last_id).order_by(ConfigDataKey.id.asc()).limit(
+            batch_size).all()
+        if not rows:
+            break
+        for row in rows:
+            last_id = row.id
+            try:
+                new = rotate_cipher(bytes(row.wrapped_key))
+            except InvalidToken:
+                failed += 1
+                continue
+            if new is None:
+                continue
+            row.wrapped_key = new
+            row.rotated_at = datetime.now(timezone.utc)
+            db.add(row)
+            rewrapped += 1
+        db.commit()
+    logger.info(f"rewrap data keys done: rewrapped={rewrapped} failed={failed}")
+    return {"rewrapped": rewrapped, "failed": failed}
@@ -1 +1,176 @@
-# 任务调度服务
\ No newline at end of file
+# 任务调度服务
+# 每个进程一个 APScheduler BackgroundScheduler。集群内选主依赖 scheduler_locks 的一行：
+# 持有者每 SCHEDULER_LEASE_SECONDS/3 续约一次，未续约的租约过期后其它实例（其它 gunicorn worker 或容器）接管。
+# leader_only 任务只在 leader 上执行，每次执行的结果、耗时计入 Prometheus 指标。
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from apscheduler.schedulers.background import BackgroundScheduler
+from sqlalchemy import or_, update
+from sqlalchemy.exc import IntegrityError
+
+from database import SessionLocal
+from models.task import SchedulerLock
+from settings import settings
+from tasks.task_registry import TaskSpec, load_tasks
+from utils.logging import get_logger
+from utils.metrics import JOB_DURATION, JOB_LAST_SUCCESS, JOB_RUNS, SCHEDULER_LEADER
+
+logger = get_logger(__name__)
+
+LEADER_LOCK = "scheduler-leader"
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class LeaderLock:
+    def __init__(self, name: str, owner: str, lease: float):
+        self.name = name
+        self.owner = owner
+        self.lease = lease
+        self.is_leader = False
+
+    def renew(self) -> bool:
+        """抢占或续约：只有锁行属于自己或已过期时 UPDATE 才会命中。"""
+        now = _utcnow()
+        expires = now + timedelta(seconds=self.lease)
+        db = SessionLocal()
+        try:
+            res = db.execute(update(SchedulerLock).where(
+                SchedulerLock.name == self.name,
+                or_(SchedulerLock.owner == self.owner, SchedulerLock.expires_at < now),
+            ).values(owner=self.owner, expires_at=expires))
+            acquired = res.rowcount == 1
+            if not acquired and db.get(SchedulerLock, self.name) is None:
+                db.add(SchedulerLock(name=self.name, owner=self.owner, expires_at=expires))
+                try:
+                    db.flush()
+                    acquired = True
+                except IntegrityError:
+                    db.rollback()
+                    acquired = False
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"scheduler lock renew failed: {e}")
+            # 无法确认租约时按失去 leader 处理，宁可少跑一次也不重复执行
+            acquired = False
+        finally:
+            db.close()
+        if acquired != self.is_leader:
+            logger.info(f"scheduler leadership {'acquired' if acquired else 'lost'}: {self.owner}")
+        self.is_leader = acquired
+        SCHEDULER_LEADER.set(1 if acquired else 0)
+        return acquired
+
+    def release(self) -> None:
+        if not self.is_leader:
+            return
+        db = SessionLocal()
+        try:
+            db.execute(update(SchedulerLock).where(
+                SchedulerLock.name == self.name, SchedulerLock.owner == self.owner,
+            ).values(expires_at=_utcnow()))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"scheduler lock release failed: {e}")
+        finally:
+            db.close()
+        self.is_leader = False
+        SCHEDULER_LEADER.set(0)
+
+
+class TaskScheduler:
+    def __init__(self):
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        lease = float(settings.SCHEDULER_LEASE_SECONDS or 30)
+        self.lock = LeaderLock(LEADER_LOCK, self.owner, lease)
+        self._renew_interval = max(lease / 3, 1.0)
+        self._scheduler: BackgroundScheduler | None = None
+        self._lock = threading.Lock()
+        self.last_results: dict[str, dict] = {}
+
+    @property
+    def running(self) -> bool:
+        return self._scheduler is not None
+
+    def start(self) -> None:
+        with self._lock:
+            if self._scheduler is not None:
+                return
+            sched = BackgroundScheduler(job_defaults={"coalesce": True, "max_instances": 1,
+                                                      "misfire_grace_time": 30})
+            sched.add_job(self.lock.renew, "interval", seconds=self._renew_interval, id="_leader_renew",
+                          next_run_time=datetime.now())
+            for spec in load_tasks().values():
+                sched.add_job(self._run, "interval", seconds=spec.interval, args=[spec], id=spec.name,
+                              jitter=min(spec.interval * 0.1, 30))
+            sched.start()
+            self._scheduler = sched
+            logger.info(f"task scheduler started: owner={self.owner}")
+
+    def shutdown(self) -> None:
+        with self._lock:
+            sched, self._scheduler = self._scheduler, None
+        if sched is None:
+            return
+        sched.shutdown(wait=False)
+        self.lock.release()
+
+    def run_now(self, name: str) -> bool:
+        """手动触发一次；leader_only 任务在非 leader 进程上跳过并返回 False。"""
+        spec = load_tasks()[name]
+        if spec.leader_only and not self.lock.is_leader:
+            JOB_RUNS.labels(spec.name, "skipped").inc()
+            return False
+        self._run(spec)
+        return True
+
+    def _run(self, spec: TaskSpec) -> None:
+        if spec.leader_only and not self.lock.is_leader:
+            JOB_RUNS.labels(spec.name, "skipped").inc()
+            return
+        start = time.perf_counter()
+        try:
+            result = spec.func() or {}
+        except Exception as e:
+            JOB_RUNS.labels(spec.name, "error").inc()
+            self.last_results[spec.name] = {"ok": False, "error": str(e), "at": time.time()}
+            logger.exception(f"task {spec.name} failed: {e}")
+            return
+        finally:
+            JOB_DURATION.labels(spec.name).observe(time.perf_counter() - start)
+        JOB_RUNS.labels(spec.name, "success").inc()
+        JOB_LAST_SUCCESS.labels(spec.name).set(time.time())
+        self.last_results[spec.name] = {"ok": True, "result": result, "at": time.time()}
+        if result:
+            logger.info(f"task {spec.name} done: {result}")
+
+    def status(self) -> dict:
+        jobs = []
+        if self._scheduler is not None:
+            for job in self._scheduler.get_jobs():
+                if job.id.startswith("_"):
+                    continue
+                jobs.append({
+                    "name": job.id,
+                    "next_run_time": job.next_run_time.isoformat() if job.next_run_time else None,
+                    "last": self.last_results.get(job.id),
+                })
+        return {"owner": self.owner, "leader": self.lock.is_leader, "running": self.running, "jobs": jobs}
+
+
+scheduler = TaskScheduler()
+
+
+def start_scheduler() -> None:
+    if str(settings.SCHEDULER_ENABLED or "1").strip().lower() in {"0", "false", "no", "off"}:
+        return
+    scheduler.start()
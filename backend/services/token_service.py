@@ -0,0 +1,232 @@
+# 拉取 token 相关服务
+import gzip
+import hashlib
+import json
+import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import jwt
+from sqlalchemy import case, func, insert
+from sqlalchemy.orm import Session
+
+from models.v1.services import RevokedToken, Service, ServiceToken
+from services.change_service import record_changes
+from services.credential_service import CachedCredential, credentials
+from settings import settings
+from utils.cache import TTLCache
+from utils.logging import get_logger
+from utils.metrics import TOKENS_PURGED
+from utils.revocation import revocations
+
+logger = get_logger(__name__)
+
+# (days, env) -> 汇总结果；统计面板允许秒级延迟
+_summary_cache = TTLCache(maxsize=64, ttl=float(settings.TOKEN_MONITOR_CACHE_TTL or 15), name="token_monitor")
+
+BUCKETS = ("expired", "lt_1d", "lt_7d", "lt_30d", "later")
+
+
+def _empty() -> dict:
+    return {"total": 0, "soon": 0, "buckets": dict.fromkeys(BUCKETS, 0)}
+
+
+def token_summary(db: Session, days: int = 7, env: str | None = None) -> dict:
+    """按 (service, env) 一次分组聚合 token 到期分布，再在内存中汇总出全局、按环境、按服务三个维度。"""
+    key = (days, env)
+    cached = _summary_cache.get(key)
+    if cached is not None:
+        return cached
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    exp = ServiceToken.expires_at
+
+    def count_if(cond):
+        return func.sum(case((cond, 1), else_=0))
+
+    # 与旧实现一致：剩余整天数 <= days 视为即将过期（含已过期）
+    q = db.query(
+        Service.code, ServiceToken.env, func.count(ServiceToken.id),
+        count_if(exp < now + timedelta(days=days + 1)),
+        count_if(exp <= now),
+        count_if((exp > now) & (exp <= now + timedelta(days=1))),
+        count_if((exp > now + timedelta(days=1)) & (exp <= now + timedelta(days=7))),
+        count_if((exp > now + timedelta(days=7)) & (exp <= now + timedelta(days=30))),
+    ).join(Service, ServiceToken.service_id == Service.id)
+    if env:
+        q = q.filter(ServiceToken.env == env)
+    total = _empty()
+    by_env: dict[str, dict] = {}
+    by_service: dict[str, dict] = {}
+    for code, token_env, n, soon, expired, lt_1d, lt_7d, lt_30d in q.group_by(Service.code, ServiceToken.env):
+        counts = (int(expired or 0), int(lt_1d or 0), int(lt_7d or 0), int(lt_30d or 0))
+        later = n - sum(counts)
+        for agg in (total, by_env.setdefault(token_env, _empty()), by_service.setdefault(code, _empty())):
+            agg["total"] += n
+            agg["soon"] += int(soon or 0)
+            for name, v in zip(BUCKETS, (*counts, later)):
+                agg["buckets"][name] += v
+    total["by_env"] = [{"key": k, **v} for k, v in sorted(by_env.items())]
+    total["by_service"] = [{"key": k, **v} for k, v in sorted(by_service.items())]
+    _summary_cache.set(key, total)
+    return total
+
+
+def invalidate_token_summary() -> None:
+    _summary_cache.clear()
+
+
+def sign_pull_token(cred: CachedCredential, service_code: str, env: str, now: datetime,
+                    expires_at: datetime) -> tuple[str, str]:
+    jti = uuid.uuid4().hex
+    payload = {
+        "sub": service_code,
+        "env": env,
+        "aud": "fast_config_pull",
+        "iat": now,
+        "exp": expires_at,
+        "jti": jti,
+    }
+    return jwt.encode(payload, cred.sk, algorithm="HS256", headers={"kid": cred.ak}), jti
+
+
+def issue_tokens_bulk(db: Session, service_codes: list[str] | None, envs: list[str], days: int = 30,
+                      revoke_previous: bool = False, chunk_size: int = 500) -> dict:
+    """为 服务 × 环境 批量签发 token：一次查询解析服务，凭证取自进程内凭证表，多行 INSERT 写入。
+
+    revoke_previous 为真时在同一事务内吊销并删除这些 (服务, 环境) 之前签发的 token，提交失败则新旧都不生效。
+    """
+    q = db.query(Service.id, Service.code).filter(Service.active.is_(True))
+    if service_codes:
+        q = q.filter(Service.code.in_(service_codes))
+    services = q.order_by(Service.code.asc()).all()
+    errors = [{"service_code": code, "error": "service not found"}
+              for code in sorted(set(service_codes or ()) - {code for _, code in services})]
+    now = datetime.now(timezone.utc)
+    expires_at = now + timedelta(days=days)
+    expires_naive = expires_at.replace(tzinfo=None)
+    rows, items = [], []
+    for service_id, code in services:
+        cred = credentials.latest_active(service_id)
+        if cred is None:
+            errors.append({"service_code": code, "error": "no active credential"})
+            continue
+        for env in envs:
+            token, jti = sign_pull_token(cred, code, env, now, expires_at)
+            rows.append({"service_id": service_id, "token": token, "jti": jti, "env": env,
+                         "expires_at": expires_naive})
+            items.append({"service_code": code, "env": env, "token": token, "expires_at": expires_at})
+    revoked: list[tuple[str, datetime]] = []
+    revoked_count = 0
+    if rows:
+        service_ids = list({r["service_id"] for r in rows})
+        if revoke_previous:
+            prev = db.query(ServiceToken.id, ServiceToken.service_id, ServiceToken.jti, ServiceToken.expires_at,
+                            ServiceToken.env).filter(
+                ServiceToken.service_id.in_(service_ids), ServiceToken.env.in_(envs)).all()
+            revoked_at = now.replace(tzinfo=None)
+            marks = [{"jti": jti, "service_id": sid, "expires_at": exp, "revoked_at": revoked_at}
+                     for _, sid, jti, exp, _ in prev if jti]
+            for i in range(0, len(marks), chunk_size):
+                chunk = marks[i:i + chunk_size]
+                db.execute(insert(RevokedToken).values(chunk))
+                record_changes(db, "revoked_tokens", "create", [(r.id, r.service_id, None, r.jti) for r in db.query(
+                    RevokedToken.id, RevokedToken.service_id, RevokedToken.jti).filter(
+                    RevokedToken.jti.in_([m["jti"] for m in chunk]))])
+            ids = [r[0] for r in prev]
+            for i in range(0, len(ids), chunk_size):
+                db.query(ServiceToken).filter(ServiceToken.id.in_(ids[i:i + chunk_size])).delete(
+                    synchronize_session=False)
+            record_changes(db, "service_tokens", "delete", [(i, sid, env, jti) for i, sid, jti, _, env in prev])
+            revoked = [(m["jti"], m["expires_at"]) for m in marks]
+            revoked_count = len(ids)
+        for i in range(0, len(rows), chunk_size):
+            chunk = rows[i:i + chunk_size]
+            db.execute(insert(ServiceToken).values(chunk))
+            # 多行 INSERT 拿不到各行 id，按 jti 回查后记入变更流水
+            record_changes(db, "service_tokens", "create", db.query(
+                ServiceToken.id, ServiceToken.service_id, ServiceToken.env, ServiceToken.jti).filter(
+                ServiceToken.jti.in_([r["jti"] for r in chunk])).all())
+        db.commit()
+        invalidate_token_summary()
+    if revoked:
+        revocations.add_many(revoked)
+    logger.info(f"bulk issue tokens: issued={len(rows)} revoked={revoked_count} errors={len(errors)}")
+    return {"issued": len(rows), "revoked": revoked_count, "items": items, "errors": errors}
+
+
+def _archive_row(row) -> str:
+    # 归档只保留 token 指纹，过期 token 原文没有保存价值
+    return json.dumps({
+        "id": row.id,
+        "service_id": row.service_id,
+        "env": row.env,
+        "token_sha256": hashlib.sha256(row.token.encode()).hexdigest(),
+        "expires_at": row.expires_at.isoformat() if row.expires_at else None,
+        "created_at": row.created_at.isoformat() if row.created_at else None,
+    }, ensure_ascii=False)
+
+
+def purge_expired_tokens(db: Session, batch_size: int = 500, pause: float = 0.2, grace_seconds: int = 0,
+                         archive_dir: str | None = None, max_batches: int | None = None) -> dict:
+    """按 expires_at 索引分批删除已过期 token，每批单独提交并停顿 pause 秒，避免长事务与长时间锁表。
+
+    archive_dir 非空时先把每批写入 gzip 压缩的 JSON Lines 文件再删除。
+    """
+    cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=grace_seconds)
+    deleted = 0
+    batches = 0
+    archive = None
+    archive_path = None
+    try:
+        while max_batches is None or batches < max_batches:
+            rows = db.query(ServiceToken.id, ServiceToken.service_id, ServiceToken.env, ServiceToken.token,
+                            ServiceToken.expires_at, ServiceToken.created_at).filter(
+                ServiceToken.expires_at < cutoff).order_by(ServiceToken.expires_at.asc()).limit(batch_size).all()
+            if not rows:
+                break
+            if archive_dir:
+                if archive is None:
+                    os.makedirs(archive_dir, exist_ok=True)
+                    archive_path = os.path.join(
+                        archive_dir, f"service_tokens-{datetime.now().strftime('%Y%m%d-%H%M%S')}.jsonl.gz")
+                    archive = gzip.open(archive_path, "at", encoding="utf-8")
+                archive.write("".join(_archive_row(r) + "\n" for r in rows))
+                archive.flush()
+            ids = [r.id for r in rows]
+            db.query(ServiceToken).filter(ServiceToken.id.in_(ids)).delete(synchronize_session=False)
+            record_changes(db, "service_tokens", "delete", [(r.id, r.service_id, r.env, None) for r in rows])
+            db.commit()
+            deleted += len(ids)
+            batches += 1
+            TOKENS_PURGED.inc(len(ids))
+            if len(rows) < batch_size:
+                break
+            if pause:
+                time.sleep(pause)
+    finally:
+        if archive is not None:
+            archive.close()
+    if deleted:
+        invalidate_token_summary()
+        logger.info(f"purge expired tokens done: deleted={deleted} batches={batches} archive={archive_path}")
+    return {"deleted": deleted, "batches": batches, "archive": archive_path}
+
+
+def purge_revocations(db: Session, batch_size: int = 500, grace_seconds: int = 0) -> int:
+    """吊销记录在对应 token 过期后即失去作用，同样按批删除。"""
+    cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=grace_seconds)
+    deleted = 0
+    while True:
+        rows = db.query(RevokedToken.id, RevokedToken.service_id, RevokedToken.jti).filter(
+            RevokedToken.expires_at < cutoff).order_by(RevokedToken.expires_at.asc()).limit(batch_size).all()
+        if not rows:
+            break
+        ids = [r.id for r in rows]
+        db.query(RevokedToken).filter(RevokedToken.id.in_(ids)).delete(synchronize_session=False)
+        record_changes(db, "revoked_tokens", "delete", [(r.id, r.service_id, None, r.jti) for r in rows])
+        db.commit()
+        deleted += len(ids)
+        if len(ids) < batch_size:
+            break
+    return deleted
@@ -0,0 +1,128 @@
+# 启动预热
+# lifespan 启动时在后台线程依次执行已注册的预热钩子，用少量集合查询把拉取路径依赖的数据
+# （IP 规则、合并视图、DEK、连接池等）提前载入进程内缓存；全部完成前就绪探测返回未就绪，
+# 蓝绿切换因此不会把冷启动的查询洪峰打到 MySQL 上。
+import threading
+import time
+from typing import Callable
+
+from sqlalchemy import text
+
+from database import SessionLocal, engine
+from services import secret_service
+from services.credential_service import credentials
+from services.config_service import warm_views
+from utils.crypto import _get_provider
+from utils.ip_allow import ip_rules
+from utils.jwt_utils import stateless_enabled
+from utils.revocation import revocations
+from settings import settings
+from utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+_hooks: list[tuple[str, Callable[[], int | None]]] = []
+
+state: dict = {"status": "pending", "hooks": {}}
+# 关闭时置位，剩余钩子不再执行（正在执行的钩子无法中断）
+_stop = threading.Event()
+
+
+def register_warmup(name: str):
+    def deco(fn: Callable[[], int | None]):
+        _hooks.append((name, fn))
+        return fn
+
+    return deco
+
+
+def is_warm() -> bool:
+    return state["status"] in ("done", "failed")
+
+
+def run_warmup() -> dict:
+    if str(settings.WARMUP_ENABLED or "1").strip().lower() in {"0", "false", "no", "off"}:
+        state["status"] = "done"
+        return state
+    state["status"] = "running"
+    failed = False
+    for name, fn in _hooks:
+        if _stop.is_set():
+            state["status"] = "cancelled"
+            return state
+        start = time.perf_counter()
+        try:
+            count = fn()
+            result = {"ok": True}
+            if count is not None:
+                result["count"] = count
+        except Exception as e:
+            failed = True
+            result = {"ok": False, "error": str(e) or type(e).__name__}
+            logger.warning(f"warmup hook {name} failed: {e}")
+        result["ms"] = round((time.perf_counter() - start) * 1000, 2)
+        state["hooks"][name] = result
+    # 单个钩子失败不阻止上线，对应数据会在首次请求时按原路径回源
+    state["status"] = "failed" if failed else "done"
+    logger.info(f"warmup {state['status']}: {state['hooks']}")
+    return state
+
+
+def stop_warmup() -> None:
+    _stop.set()
+
+
+def _with_session(fn: Callable) -> int | None:
+    db = SessionLocal()
+    try:
+        return fn(db)
+    finally:
+        db.close()
+
+
+@register_warmup("pool")
+def _warm_pool() -> int:
+    # 预先建立连接，避免切流瞬间每个请求都在建连
+    size = engine.pool.size() if hasattr(engine.pool, "size") else 1
+    conns = []
+    try:
+        for _ in range(size):
+            conn = engine.connect()
+            conns.append(conn)
+            conn.execute(text("SELECT 1"))
+    finally:
+        for conn in conns:
+            conn.close()
+    return len(conns)
+
+
+@register_warmup("crypto")
+def _warm_crypto() -> int:
+    _get_provider()
+    return _with_session(secret_service.warm_data_keys)
+
+
+@register_warmup("credentials")
+def _warm_credentials() -> int:
+    # 整表载入并预先解密启用中的 sk，首个拉取与签发不再付 Fernet 解密的代价
+    credentials.reload()
+    return credentials.decrypt_all()
+
+
+@register_warmup("ip_rules")
+def _warm_ip_rules() -> None:
+    ip_rules.invalidate()
+    ip_rules.ensure_fresh()
+
+
+@register_warmup("views")
+def _warm_views() -> int:
+    return _with_session(warm_views)
+
+
+@register_warmup("revocations")
+def _warm_revocations() -> int | None:
+    if not stateless_enabled():
+        return None
+    revocations.ensure_fresh()
+    return len(revocations)
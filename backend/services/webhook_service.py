@@ -0,0 +1,85 @@
+# 配置变更推送：发件箱写入
+# 变更接口在同一事务内为每个匹配的 webhook 写一行 webhook_outbox，提交成功才会被投递，回滚则一并消失；
+# 提交后唤醒本进程的投递协程，其它实例靠轮询（WEBHOOK_POLL_INTERVAL）兜底。
+import json
+from datetime import datetime, timezone
+
+from sqlalchemy import event, or_
+from sqlalchemy.orm import Session
+
+from models.v1.configs import Config
+from models.v1.services import Service
+from models.v1.webhooks import Webhook, WebhookOutbox
+
+EVENTS = ("config.created", "config.updated", "config.rolled_back", "config.imported", "ping")
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _notify_after_commit(db: Session) -> None:
+    if db.info.get("webhook_notify"):
+        return
+    db.info["webhook_notify"] = True
+
+    def _after_commit(session):
+        session.info.pop("webhook_notify", None)
+        from tasks.app_data_push_task import dispatcher
+        dispatcher.notify()
+
+    event.listen(db, "after_commit", _after_commit, once=True)
+
+
+def add_delivery(db: Session, hook: Webhook, event_name: str, payload: dict) -> WebhookOutbox:
+    row = WebhookOutbox(webhook_id=hook.id, event=event_name, payload=json.dumps(payload, ensure_ascii=False),
+                        status="pending", attempts=0, next_attempt_at=_utcnow())
+    db.add(row)
+    _notify_after_commit(db)
+    return row
+
+
+def enqueue_config_change(db: Session, c: Config, event_name: str) -> int:
+    """为配置所属服务/环境的全部启用 webhook 写入发件箱，调用方负责 commit。负载只含元数据，不含配置内容。"""
+    hooks = db.query(Webhook).filter(Webhook.service_id == c.service_id, Webhook.active.is_(True),
+                                     or_(Webhook.env.is_(None), Webhook.env == c.env)).all()
+    if not hooks:
+        return 0
+    code = db.query(Service.code).filter(Service.id == c.service_id).scalar()
+    payload = {
+        "event": event_name,
+        "service_code": code,
+        "env": c.env,
+        "config_id": c.id,
+        "version": c.version,
+        "format": c.format,
+        "updated_by": c.updated_by,
+        "changed_at": _utcnow().isoformat() + "Z",
+    }
+    for hook in hooks:
+        add_delivery(db, hook, event_name, payload)
+    return len(hooks)
+
+
+def purge_deleted_webhooks(db: Session, webhook_ids: list[int] | None = None) -> int:
+    """硬删除已删除（停用）且没有在途投递的 webhook 及其发件箱。
+
+    DELETE 时仍有租约未过期的投递会先只停用，等这些投递结束（或租约过期）后由这里清理；停用后的 webhook
+    不再被领取，剩余的 pending 行也随之删除。
+    """
+    q = db.query(Webhook.id).filter(Webhook.active.is_(False))
+    if webhook_ids is not None:
+        q = q.filter(Webhook.id.in_(webhook_ids))
+    ids = [i for (i,) in q.all()]
+    if not ids:
+        return 0
+    busy = {i for (i,) in db.query(WebhookOutbox.webhook_id).filter(
+        WebhookOutbox.webhook_id.in_(ids), WebhookOutbox.status == "delivering",
+        WebhookOutbox.locked_until >= _utcnow()).distinct()}
+    ids = [i for i in ids if i not in busy]
+    if not ids:
+        return 0
+    db.query(WebhookOutbox).filter(WebhookOutbox.webhook_id.in_(ids)).delete(synchronize_session=False)
+    db.query(Webhook).filter(Webhook.id.in_(ids), Webhook.active.is_(False)).delete(synchronize_session=False)
+    db.commit()
+    return len(ids)
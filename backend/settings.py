@@ -125,6 +125,14 @@ class Settings(BaseSettings):
         return None
 
     def build_db_url(self):
+        # 优先使用完整的 DATABASE_URL；DB_BACKEND=sqlite 时使用本地文件（DB_PATH），否则按 DB_* 拼 MySQL 连接串
+        if self.DATABASE_URL:
+            return self.DATABASE_URL
+        if str(self.DB_BACKEND or "mysql").strip().lower() == "sqlite":
+            path = Path(self.DB_PATH or "data/fast_config.db")
+            if not path.is_absolute():
+                path = Path(__file__).parent / path
+            return f"sqlite:///{path.as_posix()}"
         if self.DB_HOST and self.DB_PORT and self.DB_USER and self.DB_PASSWORD and self.DB_NAME:
             return f"mysql+pymysql://{self.DB_USER}:{self.DB_PASSWORD}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}?charset={self.DB_CHARSET}"
         return None
@@ -1 +1,277 @@
-# 应用数据推送任务
\ No newline at end of file
+# 应用数据推送任务
+# 配置变更经 webhook_outbox 发件箱异步推送到注册的 webhook：
+# - 每个进程一个投递协程，多实例通过条件 UPDATE 抢占行（status + locked_until 租约），无需选主；
+#   进程崩溃后未完成的行在租约过期后被其它实例重新领取，因此投递语义为至少一次，接收方按 X-FastConfig-Delivery 去重
+# - 共享一个带连接池的 httpx.AsyncClient，全局并发 WEBHOOK_CONCURRENCY，单个 webhook 并发不超过其 max_concurrency
+# - 失败按指数退避加随机抖动重试，超过 WEBHOOK_MAX_ATTEMPTS 次标记为 failed，可在管理端手动重试
+# - 请求体签名：HMAC-SHA256(secret, f"{timestamp}.{body}")，放在 X-FastConfig-Signature: sha256=<hex>
+import asyncio
+import hashlib
+import hmac
+import os
+import random
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import anyio
+import httpx
+from sqlalchemy import and_, or_, update
+
+from database import SessionLocal
+from models.v1.webhooks import Webhook, WebhookOutbox
+from services.webhook_service import purge_deleted_webhooks
+from settings import settings
+from utils.crypto import decrypt_sk
+from utils.logging import get_logger
+from utils.metrics import WEBHOOK_DELIVERIES, WEBHOOK_LATENCY
+
+logger = get_logger(__name__)
+
+USER_AGENT = "fast-config-webhook/1"
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def sign(secret: str, timestamp: str, body: str) -> str:
+    return hmac.new(secret.encode(), f"{timestamp}.{body}".encode(), hashlib.sha256).hexdigest()
+
+
+def backoff(attempts: int, base: float, cap: float) -> float:
+    # 第 n 次失败后等待 base*2^(n-1)（封顶 cap），在 [d/2, d] 内随机，避免同一时刻大量重试
+    delay = min(cap, base * 2 ** max(attempts - 1, 0))
+    return random.uniform(delay / 2, delay)
+
+
+class WebhookDispatcher:
+    def __init__(self):
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.max_attempts = int(settings.WEBHOOK_MAX_ATTEMPTS or 8)
+        self.poll_interval = float(settings.WEBHOOK_POLL_INTERVAL or 5)
+        self.concurrency = int(settings.WEBHOOK_CONCURRENCY or 32)
+        self.timeout = float(settings.WEBHOOK_TIMEOUT or 10)
+        self.lease = float(settings.WEBHOOK_LEASE_SECONDS or 60)
+        self.backoff_base = float(settings.WEBHOOK_BACKOFF_BASE or 2)
+        self.backoff_cap = float(settings.WEBHOOK_BACKOFF_CAP or 600)
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._wake: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self._client: httpx.AsyncClient | None = None
+        self._inflight: set[asyncio.Task] = set()
+        self._sems: dict[int, tuple[int, asyncio.Semaphore]] = {}
+        self._secrets: dict[int, tuple[bytes, str]] = {}
+        self.stats = {"claimed": 0, "delivered": 0, "retried": 0, "failed": 0}
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._client = httpx.AsyncClient(
+            timeout=self.timeout,
+            limits=httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency),
+            headers={"User-Agent": USER_AGENT},
+        )
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"webhook dispatcher started: owner={self.owner}")
+
+    async def stop(self, timeout: float = 5.0) -> None:
+        task, self._task = self._task, None
+        if task is None:
+            return
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        if self._inflight:
+            # 等待在途投递收尾；超时未完成的行由租约过期后重新投递
+            done, pending = await asyncio.wait(self._inflight, timeout=timeout)
+            for t in pending:
+                t.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        await self._client.aclose()
+        self._client = None
+        self._loop = None
+
+    def notify(self) -> None:
+        """线程安全：唤醒投递协程立即领取新行。"""
+        loop, wake = self._loop, self._wake
+        if loop is None or wake is None:
+            return
+        try:
+            loop.call_soon_threadsafe(wake.set)
+        except RuntimeError:
+            pass
+
+    async def _run(self) -> None:
+        while True:
+            free = self.concurrency - len(self._inflight)
+            jobs = []
+            if free > 0:
+                try:
+                    jobs = await anyio.to_thread.run_sync(self._claim, free)
+                except Exception as e:
+                    logger.warning(f"webhook claim failed: {e}")
+            for job in jobs:
+                t = asyncio.create_task(self._deliver(job))
+                self._inflight.add(t)
+                t.add_done_callback(self._on_done)
+            if jobs and len(jobs) == free:
+                # 还有积压但并发已满，等任一投递结束
+                await asyncio.wait(self._inflight, return_when=asyncio.FIRST_COMPLETED)
+                continue
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    def _on_done(self, t: asyncio.Task) -> None:
+        self._inflight.discard(t)
+        if not t.cancelled() and t.exception() is not None:
+            logger.warning(f"webhook delivery task error: {t.exception()}")
+        if self._wake is not None:
+            self._wake.set()
+
+    def _claim(self, limit: int) -> list[dict]:
+        now = _utcnow()
+        due = or_(
+            and_(WebhookOutbox.status == "pending", WebhookOutbox.next_attempt_at <= now),
+            and_(WebhookOutbox.status == "delivering", WebhookOutbox.locked_until < now),
+        )
+        db = SessionLocal()
+        try:
+            ids = [i for (i,) in db.query(WebhookOutbox.id).join(Webhook, WebhookOutbox.webhook_id == Webhook.id).filter(
+                due, Webhook.active.is_(True)).order_by(WebhookOutbox.id.asc()).limit(limit).all()]
+            if not ids:
+                return []
+            # 条件 UPDATE 抢占：候选行若已被其它实例领取，条件不再成立，不会被重复领取
+            db.execute(update(WebhookOutbox).where(WebhookOutbox.id.in_(ids), due).values(
+                status="delivering", locked_by=self.owner, locked_until=now + timedelta(seconds=self.lease)),
+                execution_options={"synchronize_session": False})
+            db.commit()
+            rows = db.query(WebhookOutbox.id, WebhookOutbox.event, WebhookOutbox.payload, WebhookOutbox.attempts,
+                            Webhook.id, Webhook.url, Webhook.secret_ciphertext, Webhook.max_concurrency).join(
+                Webhook, WebhookOutbox.webhook_id == Webhook.id).filter(
+                WebhookOutbox.id.in_(ids), WebhookOutbox.status == "delivering",
+                WebhookOutbox.locked_by == self.owner).all()
+            jobs, bad = [], []
+            for r in rows:
+                # 逐行解密签名密钥：解密失败只把该行标记为 failed，不影响同批其它行
+                try:
+                    secret = self._secret(r[4], r[6])
+                except Exception as e:
+                    bad.append(r[0])
+                    logger.warning(f"webhook {r[4]} secret cannot be decrypted, delivery {r[0]} failed: {e}")
+                    continue
+                jobs.append({"id": r[0], "event": r[1], "payload": r[2], "attempts": r[3], "webhook_id": r[4],
+                             "url": r[5], "secret": secret, "max_concurrency": r[7]})
+            if bad:
+                db.execute(update(WebhookOutbox).where(WebhookOutbox.id.in_(bad),
+                                                       WebhookOutbox.locked_by == self.owner).values(
+                    status="failed", last_error="webhook secret cannot be decrypted", locked_by=None,
+                    locked_until=None), execution_options={"synchronize_session": False})
+                db.commit()
+                self.stats["failed"] += len(bad)
+                WEBHOOK_DELIVERIES.labels("failed").inc(len(bad))
+        finally:
+            db.close()
+        self.stats["claimed"] += len(jobs)
+        return jobs
+
+    def _secret(self, webhook_id: int, cipher: bytes) -> str:
+        cached = self._secrets.get(webhook_id)
+        if cached is not None and cached[0] == cipher:
+            return cached[1]
+        plain = decrypt_sk(cipher)
+        self._secrets[webhook_id] = (cipher, plain)
+        return plain
+
+    def _semaphore(self, webhook_id: int, limit: int) -> asyncio.Semaphore:
+        limit = max(int(limit or 1), 1)
+        entry = self._sems.get(webhook_id)
+        if entry is None or entry[0] != limit:
+            entry = (limit, asyncio.Semaphore(limit))
+            self._sems[webhook_id] = entry
+        return entry[1]
+
+    async def _deliver(self, job: dict) -> None:
+        async with self._semaphore(job["webhook_id"], job["max_concurrency"]):
+            body = job["payload"]
+            ts = str(int(time.time()))
+            headers = {
+                "Content-Type": "application/json",
+                "X-FastConfig-Event": job["event"],
+                "X-FastConfig-Delivery": str(job["id"]),
+                "X-FastConfig-Timestamp": ts,
+                "X-FastConfig-Signature": f"sha256={sign(job['secret'], ts, body)}",
+            }
+            status = None
+            error = None
+            start = time.perf_counter()
+            try:
+                resp = await self._client.post(job["url"], content=body.encode(), headers=headers)
+                status = resp.status_code
+                if not 200 <= status < 300:
+                    error = f"HTTP {status}"
+            except httpx.HTTPError as e:
+                error = f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+            finally:
+                WEBHOOK_LATENCY.observe(time.perf_counter() - start)
+        await anyio.to_thread.run_sync(self._finish, job, status, error)
+
+    def _finish(self, job: dict, status: int | None, error: str | None) -> None:
+        now = _utcnow()
+        attempts = job["attempts"] + 1
+        if error is None:
+            values = {"status": "delivered", "delivered_at": now, "last_error": None}
+            result = "delivered"
+        elif attempts >= self.max_attempts:
+            values = {"status": "failed", "last_error": error[:512]}
+            result = "failed"
+        else:
+            delay = backoff(attempts, self.backoff_base, self.backoff_cap)
+            values = {"status": "pending", "next_attempt_at": now + timedelta(seconds=delay),
+                      "last_error": error[:512]}
+            result = "retried"
+        values.update(attempts=attempts, last_status=status, locked_by=None, locked_until=None)
+        db = SessionLocal()
+        try:
+            # 只回写自己仍持有的行；租约已过期被其它实例接管时放弃本次结果
+            db.execute(update(WebhookOutbox).where(WebhookOutbox.id == job["id"],
+                                                   WebhookOutbox.locked_by == self.owner).values(**values),
+                       execution_options={"synchronize_session": False})
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"webhook delivery {job['id']} result not saved: {e}")
+        else:
+            # 删除时仍在投递的 webhook：最后一个在途投递结束后硬删除
+            try:
+                purge_deleted_webhooks(db, [job["webhook_id"]])
+            except Exception as e:
+                db.rollback()
+                logger.warning(f"webhook {job['webhook_id']} purge failed: {e}")
+        finally:
+            db.close()
+        self.stats[result] += 1
+        WEBHOOK_DELIVERIES.labels(result).inc()
+        if result != "delivered":
+            logger.warning(f"webhook delivery {job['id']} {result} (attempt {attempts}): {error}")
+
+    def status(self) -> dict:
+        return {"owner": self.owner, "running": self.running, "inflight": len(self._inflight), **self.stats}
+
+
+dispatcher = WebhookDispatcher()
+
+
+async def start_dispatcher() -> None:
+    if str(settings.WEBHOOK_ENABLED or "1").strip().lower() in {"0", "false", "no", "off"}:
+        return
+    await dispatcher.start()
@@ -0,0 +1,106 @@
+# 维护类周期任务
+from sqlalchemy import func
+
+from database import SessionLocal
+from models.v1.configs import Config, ConfigVersion
+from settings import settings
+from services.credential_service import expire_grace_credentials
+from services.change_service import purge_changes
+from services.token_service import purge_expired_tokens, purge_revocations
+from services.webhook_service import purge_deleted_webhooks
+from tasks.task_registry import register_task
+from utils.ip_allow import ip_rules
+
+
+@register_task("cache_refresh", interval=float(settings.CACHE_REFRESH_INTERVAL or 60), leader_only=False)
+def refresh_caches() -> dict:
+    # 其它实例上的规则变更不会通知本进程，定期整表重载兜底
+    ip_rules.invalidate()
+    ip_rules.ensure_fresh()
+    return {}
+
+
+@register_task("history_compaction", interval=float(settings.HISTORY_COMPACTION_INTERVAL or 3600))
+def compact_history(keep: int | None = None, batch_size: int = 500) -> dict:
+    """每个配置只保留最近 keep 个历史版本（当前版本始终保留），按批删除避免长事务。
+
+    删除历史不可恢复，默认不执行：只有显式配置 CONFIG_HISTORY_KEEP（或手动调用时传入 keep）才压缩。
+    """
+    keep = keep or int(settings.CONFIG_HISTORY_KEEP or 0)
+    if keep <= 0:
+        return {}
+    db = SessionLocal()
+    deleted = 0
+    try:
+        over = db.query(ConfigVersion.config_id).group_by(ConfigVersion.config_id).having(
+            func.count(ConfigVersion.id) > keep).all()
+        for (config_id,) in over:
+            cutoff = db.query(ConfigVersion.id).filter(ConfigVersion.config_id == config_id).order_by(
+                ConfigVersion.id.desc()).offset(keep).limit(1).scalar()
+            if cutoff is None:
+                continue
+            current = db.query(Config.version).filter(Config.id == config_id).scalar()
+            while True:
+                ids = [i for (i,) in db.query(ConfigVersion.id).filter(
+                    ConfigVersion.config_id == config_id, ConfigVersion.id <= cutoff,
+                    ConfigVersion.version != current).order_by(ConfigVersion.id.asc()).limit(batch_size).all()]
+                if not ids:
+                    break
+                db.query(ConfigVersion).filter(ConfigVersion.id.in_(ids)).delete(synchronize_session=False)
+                db.commit()
+                deleted += len(ids)
+    finally:
+        db.close()
+    return {"configs": len(over), "deleted": deleted} if deleted else {}
+
+
+@register_task("token_purge", interval=float(settings.TOKEN_PURGE_INTERVAL or 3600))
+def purge_tokens() -> dict:
+    db = SessionLocal()
+    try:
+        result = purge_expired_tokens(
+            db,
+            batch_size=int(settings.TOKEN_PURGE_BATCH_SIZE or 500),
+            pause=float(settings.TOKEN_PURGE_PAUSE or 0.2),
+            grace_seconds=int(settings.TOKEN_PURGE_GRACE_SECONDS or 0),
+            archive_dir=settings.TOKEN_ARCHIVE_DIR or None,
+        )
+        revoked = purge_revocations(db, batch_size=int(settings.TOKEN_PURGE_BATCH_SIZE or 500),
+                                    grace_seconds=int(settings.TOKEN_PURGE_GRACE_SECONDS or 0))
+        if revoked:
+            result["revocations"] = revoked
+    finally:
+        db.close()
+    return result if result["deleted"] or result.get("revocations") else {}
+
+
+@register_task("credential_expiry", interval=float(settings.CREDENTIAL_EXPIRY_INTERVAL or 60))
+def expire_credentials() -> dict:
+    db = SessionLocal()
+    try:
+        disabled = expire_grace_credentials(db)
+    finally:
+        db.close()
+    return {"disabled": disabled} if disabled else {}
+
+
+@register_task("changes_purge", interval=float(settings.CHANGES_PURGE_INTERVAL or 3600))
+def purge_change_feed() -> dict:
+    """变更流水保留 CHANGES_RETENTION_DAYS 天，游标早于保留范围的消费方收到 410 后需重新全量同步。"""
+    db = SessionLocal()
+    try:
+        deleted = purge_changes(db, int(settings.CHANGES_RETENTION_DAYS or 30))
+    finally:
+        db.close()
+    return {"deleted": deleted} if deleted else {}
+
+
+@register_task("webhook_purge", interval=float(settings.WEBHOOK_PURGE_INTERVAL or 300))
+def purge_webhooks() -> dict:
+    """兜底清理已删除的 webhook：投递进程崩溃时在途行的租约过期后不会再被领取，由这里硬删除。"""
+    db = SessionLocal()
+    try:
+        deleted = purge_deleted_webhooks(db)
+    finally:
+        db.close()
+    return {"deleted": deleted} if deleted else {}
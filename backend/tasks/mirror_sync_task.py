@@ -0,0 +1,186 @@
+# 边缘镜像同步任务
+# MIRROR_PRIMARY_URL 非空时本进程为只读镜像：拉取接口由本地库（SQLite 或内存库）提供，管理端写请求被拒绝，
+# 同步协程启动时按主库清单比对一次，之后每 MIRROR_SYNC_INTERVAL 秒从 revision 游标读取变更流水，只拉取涉及的行，
+# 见 services.mirror_service 与 services.change_service。
+# 镜像模式下不启动调度器与 webhook 投递，本地库只由同步写入。
+import asyncio
+import time
+
+import anyio
+import httpx
+
+from database import Base, SessionLocal, engine
+from services import mirror_service
+from services.credential_service import credentials
+from settings import settings
+from utils.ip_allow import ip_rules
+from utils.logging import get_logger
+from utils.metrics import MIRROR_SYNCS
+from utils.revocation import revocations
+
+logger = get_logger(__name__)
+
+USER_AGENT = "fast-config-mirror/1"
+
+
+def mirror_enabled() -> bool:
+    return bool(str(settings.MIRROR_PRIMARY_URL or "").strip())
+
+
+class MirrorSync:
+    def __init__(self):
+        self.primary = str(settings.MIRROR_PRIMARY_URL or "").strip().rstrip("/")
+        self.interval = float(settings.MIRROR_SYNC_INTERVAL or 2)
+        self.batch_size = min(int(settings.MIRROR_BATCH_SIZE or 500), 2000)
+        self.timeout = float(settings.MIRROR_TIMEOUT or 10)
+        self.revision: int | None = None
+        self.synced_at: float | None = None
+        self.last_error: str | None = None
+        self._task: asyncio.Task | None = None
+        self._client: httpx.AsyncClient | None = None
+        self.stats = {"rounds": 0, "bootstraps": 0, "changes": 0, "unchanged": 0, "rows": 0, "deleted": 0, "errors": 0}
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        self._client = httpx.AsyncClient(
+            base_url=self.primary, timeout=self.timeout,
+            headers={"User-Agent": USER_AGENT, "Authorization": f"Bearer {settings.MIRROR_SYNC_TOKEN or ''}"},
+        )
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"mirror sync started: primary={self.primary}")
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is None:
+            return
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await self._client.aclose()
+        self._client = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.sync_once()
+            except Exception as e:
+                # 主库不可达时继续用本地数据服务，下一轮重试
+                self.stats["errors"] += 1
+                self.last_error = f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+                MIRROR_SYNCS.labels("error").inc()
+                logger.warning(f"mirror sync failed: {self.last_error}")
+            await asyncio.sleep(self.interval)
+
+    async def _get(self, path: str, **kw) -> dict:
+        resp = await self._client.get(path, **kw)
+        resp.raise_for_status()
+        return resp.json()
+
+    async def _fetch(self, ids: dict[str, list[int]]) -> dict[str, list[dict]]:
+        rows: dict[str, list[dict]] = {}
+        for name, wanted in ids.items():
+            rows[name] = []
+            for i in range(0, len(wanted), self.batch_size):
+                resp = await self._client.post("/api/v1/mirror/rows",
+                                               json={"tables": {name: wanted[i:i + self.batch_size]}})
+                resp.raise_for_status()
+                rows[name].extend(resp.json().get(name) or [])
+        return rows
+
+    async def _bootstrap(self) -> None:
+        data = await self._get("/api/v1/mirror/manifest")
+        local = await anyio.to_thread.run_sync(self._local_manifest)
+        fetch, drop = mirror_service.plan(data["tables"], local)
+        rows = await self._fetch(fetch)
+        await anyio.to_thread.run_sync(self._apply, drop, rows)
+        self.revision = data["revision"]
+        self.stats["bootstraps"] += 1
+        self._synced("bootstrap")
+
+    async def sync_once(self) -> None:
+        self.stats["rounds"] += 1
+        if self.revision is None:
+            await self._bootstrap()
+            return
+        applied = False
+        while True:
+            resp = await self._client.get("/api/v1/mirror/changes",
+                                          params={"since": self.revision, "limit": self.batch_size})
+            if resp.status_code == 410:
+                # 游标之后的流水已被主库清理，回到清单比对
+                logger.warning(f"mirror revision {self.revision} purged on primary, resyncing from manifest")
+                self.revision = None
+                await self._bootstrap()
+                return
+            resp.raise_for_status()
+            page = resp.json()
+            ids = mirror_service.changed_ids(page["changes"])
+            if ids:
+                rows = await self._fetch(ids)
+                # 主库上已不存在的行（含先建后删）即为删除
+                drop = {name: sorted(set(wanted) - {r["id"] for r in rows.get(name, [])})
+                        for name, wanted in ids.items()}
+                await anyio.to_thread.run_sync(self._apply, drop, rows)
+                applied = True
+            self.stats["changes"] += len(page["changes"])
+            self.revision = page["next"]
+            if not page["has_more"]:
+                break
+        self._synced("applied" if applied else "unchanged")
+
+    def _synced(self, result: str) -> None:
+        self.synced_at = time.time()
+        self.last_error = None
+        if result == "unchanged":
+            self.stats["unchanged"] += 1
+        MIRROR_SYNCS.labels(result).inc()
+
+    def _local_manifest(self) -> dict[str, dict[int, str]]:
+        db = SessionLocal()
+        try:
+            return mirror_service.build_manifest(db)
+        finally:
+            db.close()
+
+    def _apply(self, drop: dict[str, list[int]], rows: dict[str, list[dict]]) -> dict:
+        db = SessionLocal()
+        try:
+            result = mirror_service.apply_changes(db, drop, rows, self.batch_size)
+        except Exception:
+            db.rollback()
+            # 读取流水与拉取行数据之间主库又有变更（如父行已删除）时本轮放弃，下一轮按清单重新比对
+            self.revision = None
+            raise
+        finally:
+            db.close()
+        changed = result["counts"]
+        self.stats["rows"] += sum(len(r) for r in rows.values())
+        self.stats["deleted"] += sum(len(d) for d in drop.values())
+        if changed:
+            logger.info(f"mirror sync applied: {changed}")
+        if {"services", "service_credentials"} & changed.keys():
+            credentials.reload()
+        if {"services", "service_ip_allow"} & changed.keys():
+            ip_rules.invalidate()
+        if result["revoked"]:
+            # 同步进来的 revoked_at 可能早于吊销集合的增量窗口，直接加入
+            revocations.add_many(result["revoked"])
+        return result
+
+    def status(self) -> dict:
+        age = None if self.synced_at is None else round(time.time() - self.synced_at, 1)
+        return {"enabled": True, "primary": self.primary, "running": self.running, "synced": self.synced_at is not None,
+                "age_seconds": age, "revision": self.revision, "last_error": self.last_error, **self.stats}
+
+
+mirror = MirrorSync()
+
+
+async def start_mirror() -> None:
+    # 本地库是主库的派生副本，启动时按模型建表
+    await anyio.to_thread.run_sync(Base.metadata.create_all, engine)
+    await mirror.start()
@@ -1 +1,34 @@
-# 任务注册
\ No newline at end of file
+# 任务注册
+# 周期任务在模块导入时通过 register_task 登记，由 services.task_scheduler 统一调度。
+# leader_only=True 的任务在整个集群只由持有调度锁的实例执行；False 的任务每个进程各自执行（如刷新本地缓存）。
+from typing import Callable
+
+
+class TaskSpec:
+    __slots__ = ("name", "func", "interval", "leader_only")
+
+    def __init__(self, name: str, func: Callable[[], dict | None], interval: float, leader_only: bool):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.leader_only = leader_only
+
+
+TASKS: dict[str, TaskSpec] = {}
+
+
+def register_task(name: str, interval: float, leader_only: bool = True):
+    def deco(fn: Callable[[], dict | None]):
+        if name in TASKS:
+            raise ValueError(f"task '{name}' already registered")
+        TASKS[name] = TaskSpec(name, fn, float(interval), leader_only)
+        return fn
+
+    return deco
+
+
+def load_tasks() -> dict[str, TaskSpec]:
+    # 导入任务模块以触发注册
+    import tasks.maintenance_tasks  # noqa: F401
+
+    return TASKS
@@ -0,0 +1,60 @@
+# 进程内缓存
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+from utils.metrics import cache_counters
+
+_MISSING = object()
+
+
+class TTLCache:
+    """线程安全的有界 LRU 缓存，可选按条目过期（秒）。给出 name 时命中/未命中计入 fast_config_cache_requests_total。"""
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None, name: Optional[str] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        self._hits, self._misses = cache_counters(name) if name else (None, None)
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is not _MISSING:
+                expires_at, value = item
+                if expires_at and expires_at < time.monotonic():
+                    del self._data[key]
+                    item = _MISSING
+                else:
+                    self._data.move_to_end(key)
+        if item is _MISSING:
+            if self._misses is not None:
+                self._misses.inc()
+            return default
+        if self._hits is not None:
+            self._hits.inc()
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else 0.0
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.pop(key, _MISSING)
+        return default if item is _MISSING else item[1]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
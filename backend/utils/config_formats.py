@@ -0,0 +1,117 @@
+# 配置格式解析与渲染：json / yaml / toml / ini
+# 写入时解析一次得到规范化的扁平字符串映射（见 services.config_service.to_str_map），
+# 拉取时按需把规范映射渲染回目标格式，不再重复解析原文。
+import configparser
+import io
+import json
+import re
+import tomllib
+
+import yaml
+
+try:
+    _YamlLoader = yaml.CSafeLoader
+    _YamlDumper = yaml.CSafeDumper
+except AttributeError:
+    _YamlLoader = yaml.SafeLoader
+    _YamlDumper = yaml.SafeDumper
+
+FORMATS = ("json", "yaml", "toml", "ini")
+
+MEDIA_TYPES = {
+    "json": "application/json",
+    "yaml": "application/yaml",
+    "toml": "application/toml",
+    "ini": "text/x-ini",
+}
+
+ACCEPT_FORMATS = {
+    "application/json": "json",
+    "application/yaml": "yaml",
+    "application/x-yaml": "yaml",
+    "text/yaml": "yaml",
+    "application/toml": "toml",
+    "text/x-ini": "ini",
+    "text/ini": "ini",
+}
+
+_TOML_BARE_KEY = re.compile(r"[A-Za-z0-9_-]+")
+
+
+class FormatError(ValueError):
+    pass
+
+
+def _parse_ini(text: str) -> dict:
+    cp = configparser.ConfigParser(interpolation=None)
+    cp.optionxform = str
+    cp.read_string(text)
+    # DEFAULT 段的键放在顶层，其余每个段作为一个嵌套对象
+    defaults = cp.defaults()
+    data = dict(defaults)
+    for section in cp.sections():
+        data[section] = {k: v for k, v in cp.items(section, raw=True) if defaults.get(k) != v}
+    return data
+
+
+def parse(fmt: str, text: str):
+    try:
+        if fmt == "json":
+            return json.loads(text)
+        if fmt == "yaml":
+            return yaml.load(text, Loader=_YamlLoader)
+        if fmt == "toml":
+            return tomllib.loads(text)
+        if fmt == "ini":
+            return _parse_ini(text)
+    except (ValueError, yaml.YAMLError, configparser.Error) as e:
+        raise FormatError(str(e))
+    raise FormatError(f"unsupported format '{fmt}'")
+
+
+def _toml_key(k: str) -> str:
+    return k if _TOML_BARE_KEY.fullmatch(k) else json.dumps(k, ensure_ascii=False)
+
+
+def _as_section(v: str):
+    if not v.startswith("{"):
+        return None
+    try:
+        obj = json.loads(v)
+    except ValueError:
+        return None
+    if isinstance(obj, dict) and all(not isinstance(i, (dict, list)) for i in obj.values()):
+        return obj
+    return None
+
+
+def render(fmt: str, str_map: dict[str, str]) -> str:
+    if fmt == "json":
+        return json.dumps(str_map, ensure_ascii=False, indent=2)
+    if fmt == "yaml":
+        return yaml.dump(str_map, Dumper=_YamlDumper, allow_unicode=True, sort_keys=False)
+    if fmt == "toml":
+        return "".join(f"{_toml_key(k)} = {json.dumps(v, ensure_ascii=False)}\n" for k, v in str_map.items())
+    if fmt == "ini":
+        cp = configparser.ConfigParser(interpolation=None)
+        cp.optionxform = str
+        for k, v in str_map.items():
+            section = _as_section(v)
+            if section is not None:
+                cp[k] = {sk: str(sv) for sk, sv in section.items()}
+            else:
+                cp["DEFAULT"][k] = v
+        buf = io.StringIO()
+        cp.write(buf)
+        return buf.getvalue()
+    raise FormatError(f"unsupported format '{fmt}'")
+
+
+def negotiate(accept: str | None) -> str | None:
+    if not accept:
+        return None
+    for part in accept.split(","):
+        fmt = ACCEPT_FORMATS.get(part.split(";", 1)[0].strip().lower())
+        if fmt:
+            return fmt
+    return None
@@ -0,0 +1,179 @@
+# 配置 schema 校验
+# schema_def 采用 JSON Schema 的一个子集，针对“字符串化”后的扁平配置：
+# {
+#   "required": ["DB_HOST"],
+#   "additionalProperties": true,
+#   "properties": {
+#     "DB_PORT": {"type": "integer", "minimum": 1, "maximum": 65535},
+#     "DB_HOST": {"type": "string", "pattern": "^[a-z0-9.-]+$", "minLength": 1},
+#     "MODE": {"enum": ["dev", "prod"]},
+#     "DB_PASSWORD": {"type": "string", "secret": true}
+#   }
+# }
+# secret 为 true 的键以信封加密方式落库（见 services.secret_service）。
+# 同一份 schema_def 文本只编译一次（按文本缓存），写路径上只执行预编译好的检查函数。
+import json
+import math
+import re
+from functools import lru_cache
+from typing import Any, Callable, Optional
+
+_INT_RE = re.compile(r"[+-]?\d+")
+_BOOL_VALUES = frozenset({"true", "false", "1", "0", "yes", "no", "on", "off"})
+_TYPES = {"string", "integer", "number", "boolean", "object", "array"}
+
+
+class SchemaError(ValueError):
+    pass
+
+
+def _check_integer(v: str) -> Optional[str]:
+    if _INT_RE.fullmatch(v) is None:
+        return "expected integer"
+    return None
+
+
+def _check_number(v: str) -> Optional[str]:
+    try:
+        float(v)
+    except ValueError:
+        return "expected number"
+    return None
+
+
+def _check_boolean(v: str) -> Optional[str]:
+    if v.lower() not in _BOOL_VALUES:
+        return "expected boolean"
+    return None
+
+
+def _json_checker(kind: type, name: str) -> Callable[[str], Optional[str]]:
+    def check(v: str) -> Optional[str]:
+        try:
+            if isinstance(json.loads(v), kind):
+                return None
+        except ValueError:
+            pass
+        return f"expected {name}"
+
+    return check
+
+
+_TYPE_CHECKERS = {
+    "integer": _check_integer,
+    "number": _check_number,
+    "boolean": _check_boolean,
+    "object": _json_checker(dict, "object"),
+    "array": _json_checker(list, "array"),
+}
+
+
+def _length_keyword(key: str, spec: dict, name: str) -> int:
+    v = spec[name]
+    # bool 是 int 的子类，需单独排除
+    if isinstance(v, bool) or not isinstance(v, int) or v < 0:
+        raise SchemaError(f"property '{key}' {name} must be a non-negative integer")
+    return v
+
+
+def _number_keyword(key: str, spec: dict, name: str) -> Optional[float]:
+    v = spec.get(name)
+    if v is None:
+        return None
+    if isinstance(v, bool) or not isinstance(v, (int, float)) or not math.isfinite(v):
+        raise SchemaError(f"property '{key}' {name} must be a number")
+    return v
+
+
+def _compile_property(key: str, spec: Any) -> tuple[Callable[[str], Optional[str]], ...]:
+    if not isinstance(spec, dict):
+        raise SchemaError(f"property '{key}' must be an object")
+    checks: list[Callable[[str], Optional[str]]] = []
+    t = spec.get("type")
+    if t is not None:
+        if t not in _TYPES:
+            raise SchemaError(f"property '{key}' has unsupported type '{t}'")
+        if t in _TYPE_CHECKERS:
+            checks.append(_TYPE_CHECKERS[t])
+    if "enum" in spec:
+        if not isinstance(spec["enum"], list):
+            raise SchemaError(f"property '{key}' enum must be a list")
+        allowed = frozenset(str(i) for i in spec["enum"])
+        checks.append(lambda v: None if v in allowed else "value not in enum")
+    if "pattern" in spec:
+        try:
+            rx = re.compile(spec["pattern"])
+        except (re.error, TypeError):
+            raise SchemaError(f"property '{key}' has invalid pattern")
+        checks.append(lambda v: None if rx.search(v) else f"does not match pattern '{rx.pattern}'")
+    if "minLength" in spec:
+        min_len = _length_keyword(key, spec, "minLength")
+        checks.append(lambda v: None if len(v) >= min_len else f"shorter than {min_len}")
+    if "maxLength" in spec:
+        max_len = _length_keyword(key, spec, "maxLength")
+        checks.append(lambda v: None if len(v) <= max_len else f"longer than {max_len}")
+    if "minimum" in spec or "maximum" in spec:
+        if t not in ("integer", "number"):
+            raise SchemaError(f"property '{key}' minimum/maximum requires integer or number type")
+        lo = _number_keyword(key, spec, "minimum")
+        hi = _number_keyword(key, spec, "maximum")
+
+        def check_range(v: str) -> Optional[str]:
+            try:
+                n = float(v)
+            except ValueError:
+                return None
+            if lo is not None and n < lo:
+                return f"less than minimum {lo}"
+            if hi is not None and n > hi:
+                return f"greater than maximum {hi}"
+            return None
+
+        checks.append(check_range)
+    return tuple(checks)
+
+
+class CompiledSchema:
+    __slots__ = ("required", "properties", "additional", "secret_keys")
+
+    def __init__(self, schema: dict):
+        required = schema.get("required", [])
+        if not isinstance(required, list) or not all(isinstance(k, str) for k in required):
+            raise SchemaError("required must be a list of strings")
+        props = schema.get("properties", {})
+        if not isinstance(props, dict):
+            raise SchemaError("properties must be an object")
+        self.required = tuple(required)
+        self.properties = {k: _compile_property(k, spec) for k, spec in props.items()}
+        self.additional = bool(schema.get("additionalProperties", True))
+        self.secret_keys = frozenset(k for k, spec in props.items() if spec.get("secret") is True)
+
+    def validate(self, content: dict[str, str]) -> list[dict]:
+        errors = []
+        for k in self.required:
+            if k not in content:
+                errors.append({"key": k, "error": "required"})
+        props = self.properties
+        for k, v in content.items():
+            checks = props.get(k)
+            if checks is None:
+                if not self.additional:
+                    errors.append({"key": k, "error": "additional property not allowed"})
+                continue
+            for check in checks:
+                err = check(v)
+                if err:
+                    errors.append({"key": k, "error": err})
+                    break
+        return errors
+
+
+@lru_cache(maxsize=256)
+def compile_schema(schema_def: str) -> CompiledSchema:
+    try:
+        schema = json.loads(schema_def)
+    except ValueError:
+        raise SchemaError("schema_def must be valid json")
+    if not isinstance(schema, dict):
+        raise SchemaError("schema_def must be object")
+    return CompiledSchema(schema)
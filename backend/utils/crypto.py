@@ -1,15 +1,42 @@
 import base64
 import os
-from cryptography.fernet import Fernet
+import threading
+from cryptography.fernet import Fernet, MultiFernet, InvalidToken
 
 from settings import settings
 
 
-def _get_fernet():
-    key = settings.CRED_MASTER_KEY
-    if not key:
-        raise RuntimeError("CRED_MASTER_KEY missing")
-    return Fernet(key.encode())
+class _CryptoProvider:
+    # CRED_MASTER_KEY 支持逗号分隔的多把密钥：第一把用于加密，其余仅用于解密（轮换过渡期）
+    __slots__ = ("primary", "fernet")
+
+    def __init__(self, source: str):
+        keys = [k.strip() for k in source.split(",") if k.strip()]
+        if not keys:
+            raise RuntimeError("CRED_MASTER_KEY missing")
+        fernets = [Fernet(k.encode()) for k in keys]
+        self.primary = fernets[0]
+        self.fernet = MultiFernet(fernets)
+
+
+_provider: _CryptoProvider | None = None
+_provider_lock = threading.Lock()
+
+
+def _get_provider() -> _CryptoProvider:
+    # 进程内只构建一次，避免每次调用都重新解码 base64 密钥；更换 CRED_MASTER_KEY 需重启进程
+    global _provider
+    p = _provider
+    if p is not None:
+        return p
+    with _provider_lock:
+        if _provider is None:
+            _provider = _CryptoProvider(settings.CRED_MASTER_KEY or "")
+        return _provider
+
+
+def _get_fernet() -> MultiFernet:
+    return _get_provider().fernet
 
 
 def encrypt_sk(sk: str) -> bytes:
@@ -26,3 +53,22 @@ def gen_ak_sk() -> tuple[str, str]:
     ak = base64.urlsafe_b64encode(os.urandom(18)).decode().rstrip("=")
     sk = base64.urlsafe_b64encode(os.urandom(32)).decode().rstrip("=")
     return ak, sk
+
+
+def wrap_key(key: bytes) -> bytes:
+    return _get_fernet().encrypt(key)
+
+
+def unwrap_key(cipher: bytes) -> bytes:
+    return _get_fernet().decrypt(cipher)
+
+
+def rotate_cipher(cipher: bytes) -> bytes | None:
+    """用当前主密钥重新加密；已由当前主密钥加密时返回 None。"""
+    p = _get_provider()
+    try:
+        p.primary.decrypt(cipher)
+        return None
+    except InvalidToken:
+        pass
+    return p.fernet.rotate(cipher)
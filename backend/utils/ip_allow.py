@@ -1,11 +1,32 @@
 from fastapi import Request, HTTPException
 from sqlalchemy.orm import Session
 from models.v1.services import ServiceIpAllow
+from functools import lru_cache
 import ipaddress
+import threading
+import time
 
 from settings import settings
 
 
+def parse_cidr_list(value) -> tuple:
+    if not value:
+        return ()
+    items = value.split(",") if isinstance(value, str) else value
+    nets = []
+    for cidr in items:
+        try:
+            nets.append(ipaddress.ip_network(str(cidr).strip(), strict=False))
+        except ValueError:
+            continue
+    return tuple(nets)
+
+
+@lru_cache(maxsize=8)
+def _trusted_proxies(value: str) -> tuple:
+    return parse_cidr_list(value)
+
+
 def extract_client_ip(request: Request) -> str:
     if settings.REAL_IP_HEADER:
         h = request.headers.get(settings.REAL_IP_HEADER)
@@ -15,13 +36,10 @@ def extract_client_ip(request: Request) -> str:
     trusted = False
     try:
         ip_obj = ipaddress.ip_address(client)
-        for cidr in settings.TRUSTED_PROXIES:
-            try:
-                if ip_obj in ipaddress.ip_network(cidr, strict=False):
-                    trusted = True
-                    break
-            except Exception:
-                continue
+        # TRUSTED_PROXIES 可以是逗号分隔字符串或列表，解析结果按原值缓存
+        proxies = settings.TRUSTED_PROXIES
+        nets = _trusted_proxies(proxies if isinstance(proxies, str) else ",".join(proxies or []))
+        trusted = any(ip_obj in net for net in nets)
     except Exception:
         trusted = False
     if trusted:
@@ -60,3 +78,96 @@ def is_ip_allowed(db: Session, service_id: int, env: str, client_ip: str) -> boo
         except Exception:
             continue
     return False
+
+
+_ALLOW_ALL = ("0.0.0.0", "0.0.0.0/0", "*", "0.0.0.0/32")
+
+
+class _ServiceRules:
+    __slots__ = ("service_id", "by_env", "any_env")
+
+    def __init__(self, service_id: int):
+        self.service_id = service_id
+        self.by_env: dict[str, list] = {}
+        self.any_env: list = []
+
+
+class IpRuleCache:
+    """service_ip_allow 的编译视图：service_code -> 已解析的网段，按 TTL 整表重载。
+
+    过期后由一个线程重载，其余并发请求继续使用旧视图；本进程内的规则变更会立即 invalidate。
+    """
+
+    def __init__(self, ttl: float = 10.0):
+        self.ttl = ttl
+        self._rules: dict[str, _ServiceRules] | None = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def _load(self) -> dict[str, _ServiceRules]:
+        from database import SessionLocal
+        from models.v1.services import Service
+
+        db = SessionLocal()
+        try:
+            rows = db.query(Service.code, Service.id, ServiceIpAllow.env, ServiceIpAllow.cidr).outerjoin(
+                ServiceIpAllow, ServiceIpAllow.service_id == Service.id).all()
+        finally:
+            db.close()
+        rules: dict[str, _ServiceRules] = {}
+        for code, service_id, env, cidr in rows:
+            sr = rules.get(code)
+            if sr is None:
+                sr = rules[code] = _ServiceRules(service_id)
+            if cidr is None:
+                continue
+            cidr = cidr.strip()
+            if cidr in _ALLOW_ALL:
+                net = None
+            else:
+                try:
+                    net = ipaddress.ip_network(cidr, strict=False)
+                except ValueError:
+                    continue
+            target = sr.by_env.setdefault(env, []) if env is not None else sr.any_env
+            target.append(net)
+        return rules
+
+    def ensure_fresh(self) -> None:
+        if self._rules is not None and time.monotonic() - self._loaded_at < self.ttl:
+            return
+        if not self._lock.acquire(blocking=self._rules is None):
+            return
+        try:
+            if self._rules is None or time.monotonic() - self._loaded_at >= self.ttl:
+                self._rules = self._load()
+                self._loaded_at = time.monotonic()
+        finally:
+            self._lock.release()
+
+    def needs_refresh(self) -> bool:
+        return self._rules is None or time.monotonic() - self._loaded_at >= self.ttl
+
+    def invalidate(self) -> None:
+        self._loaded_at = 0.0
+
+    @property
+    def loaded(self) -> bool:
+        return self._rules is not None
+
+    def has_service(self, service_code: str) -> bool:
+        return service_code in (self._rules or {})
+
+    def is_allowed(self, service_code: str, env: str, ip_obj) -> bool:
+        self.ensure_fresh()
+        sr = (self._rules or {}).get(service_code)
+        if sr is None:
+            return False
+        for nets in (sr.by_env.get(env, ()), sr.any_env):
+            for net in nets:
+                if net is None or (net.version == ip_obj.version and ip_obj in net):
+                    return True
+        return False
+
+
+ip_rules = IpRuleCache(ttl=float(settings.IP_RULES_CACHE_TTL or 10))
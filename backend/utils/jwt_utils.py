@@ -1,18 +1,40 @@
+import time
+
 import jwt
 from fastapi import HTTPException, status
-from models.v1.services import Service, ServiceCredential, ServiceToken
+
+from database import SessionLocal, engine
+from models.v1.services import Service, ServiceToken
 from sqlalchemy.orm import Session
 
 from settings import settings
-from utils.crypto import decrypt_sk
+from services.credential_service import credentials
+from utils.metrics import VERIFY_FAILURES, VERIFY_LATENCY
+from utils.revocation import revocations
+
+
+def stateless_enabled() -> bool:
+    return str(settings.PULL_TOKEN_STATELESS or "0").strip().lower() in {"1", "true", "yes", "on"}
 
 
+def _reject(reason: str, detail: str) -> HTTPException:
+    VERIFY_FAILURES.labels(reason).inc()
+    return HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=detail)
+
 
 def verify_bearer(token: str, db: Session, service_code: str, env: str):
+    start = time.perf_counter()
+    try:
+        return _verify_bearer(token, db, service_code, env)
+    finally:
+        VERIFY_LATENCY.observe(time.perf_counter() - start)
+
+
+def _verify_bearer(token: str, db: Session, service_code: str, env: str):
     try:
         header = jwt.get_unverified_header(token)
     except Exception:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="malformed token header")
+        raise _reject("malformed_header", "malformed token header")
     kid = header.get("kid")
     if not kid:
         try:
@@ -22,24 +44,44 @@ def verify_bearer(token: str, db: Session, service_code: str, env: str):
         except Exception:
             pass
     if not kid:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="kid missing")
-    cred = db.query(ServiceCredential).join(Service).filter(Service.code == service_code, ServiceCredential.ak == kid,
-                                                            ServiceCredential.status == "active").first()
-    if not cred:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
-                            detail="credential not found or inactive for service")
-    sk = decrypt_sk(bytes(cred.sk_ciphertext))
+        raise _reject("kid_missing", "kid missing")
+    cred = credentials.get(kid)
+    if cred is None or not cred.active or cred.service_code != service_code:
+        raise _reject("credential_not_found", "credential not found or inactive for service")
+    sk = cred.sk
     try:
         payload = jwt.decode(token, sk, algorithms=["HS256"], options={"require": ["exp", "iat", "aud", "sub"]},
                              leeway=int(settings.JWT_CLOCK_SKEW), audience="fast_config_pull")
+    except jwt.ExpiredSignatureError as e:
+        raise _reject("expired", f"invalid token: {str(e)}")
     except Exception as e:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=f"invalid token: {str(e)}")
+        raise _reject("invalid_token", f"invalid token: {str(e)}")
     if payload.get("sub") != service_code:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="sub mismatch")
+        raise _reject("sub_mismatch", "sub mismatch")
     if payload.get("env") != env:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="env mismatch")
-    exists = db.query(ServiceToken).join(Service).filter(Service.code == service_code,
-                                                         ServiceToken.token == token).first()
-    if not exists:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="token revoked or not found")
+        raise _reject("env_mismatch", "env mismatch")
+    jti = payload.get("jti")
+    if jti and stateless_enabled():
+        # 无状态模式：签名与 exp 即可信，吊销只查内存集合
+        if revocations.is_revoked(jti):
+            raise _reject("revoked", "token revoked or not found")
+        return payload
+    if not _token_exists(db, service_code, token, jti):
+        # 只读副本可能还没同步到刚签发的 token，未命中时回主库确认一次
+        if db.get_bind() is engine or not _with_primary(_token_exists, service_code, token, jti):
+            raise _reject("revoked", "token revoked or not found")
     return payload
+
+
+def _token_exists(db: Session, service_code: str, token: str, jti: str | None) -> bool:
+    q = db.query(ServiceToken.id).join(Service).filter(Service.code == service_code)
+    q = q.filter(ServiceToken.jti == jti) if jti else q.filter(ServiceToken.token == token)
+    return q.first() is not None
+
+
+def _with_primary(fn, *args):
+    db = SessionLocal()
+    try:
+        return fn(db, *args)
+    finally:
+        db.close()
@@ -1,26 +1,57 @@
 # 日志中间件
+# 请求路径上的 logger 只挂一个 QueueHandler：记录在调用线程里补齐上下文、合并 message 后入队，
+# 格式化与控制台/文件 I/O 全部由 QueueListener 的写线程完成；队列满时丢弃并计数，不阻塞请求。
+import atexit
 import logging
 import os
+import queue
+import random
 import sys
 import threading
+import time
 from pathlib import Path
-from logging.handlers import TimedRotatingFileHandler, RotatingFileHandler
+from logging.handlers import TimedRotatingFileHandler, RotatingFileHandler, QueueHandler, QueueListener
 import json
-from datetime import datetime, timezone
+from datetime import datetime
 import contextvars
+from contextlib import contextmanager
 
 _request_id_var = contextvars.ContextVar("request_id", default=None)
 _user_id_var = contextvars.ContextVar("user_id", default=None)
+# 当前请求各阶段耗时（毫秒），由 middleware.logging.RequestContextMiddleware 在请求开始时放入一个新 dict
+_timings_var: contextvars.ContextVar[dict | None] = contextvars.ContextVar("timings", default=None)
 
 _initialized = False
 _lock = threading.Lock()
 
 _servername = "s-fast-config"
 
+_listener: QueueListener | None = None
+
+
+def _utc_offset() -> str:
+    off = datetime.now().astimezone().strftime("%z")
+    return f"{off[:3]}:{off[3:]}" if off else "+00:00"
+
+
 class JSONFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__()
+        # 时间取自 record.created；时区偏移只算一次，秒级前缀按秒缓存
+        self._offset = _utc_offset()
+        self._last_sec = -1
+        self._sec_prefix = ""
+
+    def _time(self, created: float) -> str:
+        sec = int(created)
+        if sec != self._last_sec:
+            self._sec_prefix = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(sec))
+            self._last_sec = sec
+        return f"{self._sec_prefix}.{int((created - sec) * 1000):03d}{self._offset}"
+
     def format(self, record: logging.LogRecord) -> str:
         data = {
-            "time": datetime.now(timezone.utc).astimezone().isoformat(),
+            "time": self._time(record.created),
             "level": record.levelname,
             "logger": record.name,
             "message": record.getMessage(),
@@ -33,8 +64,13 @@ class JSONFormatter(logging.Formatter):
             "request_id": getattr(record, "request_id", None),
             "user_id": getattr(record, "user_id", None),
         }
-        if record.exc_info:
-            data["exc"] = self.formatException(record.exc_info)
+        timings = getattr(record, "timings", None)
+        if timings:
+            data["timings"] = timings
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data["exc"] = record.exc_text
         return json.dumps(data, ensure_ascii=False)
 
 
@@ -45,6 +81,43 @@ class ContextFilter(logging.Filter):
         return True
 
 
+class SamplingFilter(logging.Filter):
+    """按比例采样 INFO 及以下级别的记录，WARNING 及以上始终保留。"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or random.random() < self.rate
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 只合并 message、把异常转成文本，完整格式化留给写线程
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class _Listener(QueueListener):
+    def enqueue_sentinel(self) -> None:
+        # 停止时队列可能是满的，哨兵必须阻塞等待入队
+        self.queue.put(self._sentinel)
+
+
 def _str2bool(v: str) -> bool:
     return str(v).strip().lower() in {"1", "true", "yes", "y", "on"}
 
@@ -67,7 +140,7 @@ def add_trace_level() -> None:
 
 
 def init_logger() -> None:
-    global _initialized
+    global _initialized, _listener
     if _initialized:
         return
     with _lock:
@@ -75,51 +148,82 @@ def init_logger() -> None:
             return
         add_trace_level()
         base_logger = logging.getLogger(_servername)
-        base_logger.setLevel(getattr(logging, "INFO", logging.INFO))
+        base_logger.setLevel(getattr(logging, os.getenv("LOG_LEVEL", "INFO").upper(), logging.INFO))
         base_logger.propagate = False
         if not base_logger.handlers:
-            log_dir = Path("logs")
-            log_file = log_dir / "app.log"
-            use_json = _str2bool("0")
-            to_console = _str2bool("1")
-            to_file = _str2bool("1")
-            rotation = "time"
-            backup_count = 7
+            log_dir = Path(os.getenv("LOG_DIR", "logs"))
+            log_file = log_dir / os.getenv("LOG_FILE_NAME", "app.log")
+            use_json = _str2bool(os.getenv("LOG_JSON", "0"))
+            to_console = _str2bool(os.getenv("LOG_TO_CONSOLE", "1"))
+            to_file = _str2bool(os.getenv("LOG_TO_FILE", "1"))
+            use_queue = _str2bool(os.getenv("LOG_ASYNC", "1"))
+            rotation = os.getenv("LOG_ROTATION", "time").lower()
+            backup_count = int(os.getenv("LOG_BACKUP_COUNT", "7"))
             fmt = JSONFormatter() if use_json else logging.Formatter(
                 fmt="%(asctime)s %(levelname)s %(name)s %(filename)s:%(lineno)d %(funcName)s - %(message)s [request_id=%(request_id)s user_id=%(user_id)s]",
                 datefmt="%Y-%m-%d %H:%M:%S%z",
             )
             context_filter = ContextFilter()
+            handlers: list[logging.Handler] = []
             if to_console:
                 ch = logging.StreamHandler(stream=sys.stdout)
                 ch.setLevel(base_logger.level)
                 ch.setFormatter(fmt)
-                ch.addFilter(context_filter)
-                base_logger.addHandler(ch)
+                handlers.append(ch)
             if to_file:
                 try:
                     _ensure_dir(log_dir)
                     if rotation == "size":
-                        max_bytes = 10 * 1024 * 1024
+                        max_bytes = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
                         fh = RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count,
                                                  encoding="utf-8")
                     else:
-                        when = "midnight"
-                        interval = 1
+                        when = os.getenv("LOG_ROTATION_WHEN", "midnight")
+                        interval = int(os.getenv("LOG_ROTATION_INTERVAL", "1"))
                         fh = TimedRotatingFileHandler(log_file, when=when, interval=interval, backupCount=backup_count,
                                                       encoding="utf-8", utc=False)
                     fh.setLevel(base_logger.level)
                     fh.setFormatter(fmt)
-                    fh.addFilter(context_filter)
-                    base_logger.addHandler(fh)
+                    handlers.append(fh)
                 except Exception as e:
-                    try:
-                        base_logger.warning(f"文件日志初始化失败: {e}. 已退回到控制台日志。")
-                    except Exception:
-                        pass
+                    sys.stderr.write(f"文件日志初始化失败: {e}. 已退回到控制台日志。\n")
+            if use_queue and handlers:
+                # 上下文变量只能在调用线程读取，所以 ContextFilter 挂在 QueueHandler 上
+                qh = _NonBlockingQueueHandler(queue.Queue(maxsize=int(os.getenv("LOG_QUEUE_SIZE", "10000"))))
+                qh.addFilter(context_filter)
+                base_logger.addHandler(qh)
+                _listener = _Listener(qh.queue, *handlers, respect_handler_level=True)
+                _listener.start()
+                atexit.register(stop_logger)
+            else:
+                for h in handlers:
+                    h.addFilter(context_filter)
+                    base_logger.addHandler(h)
         _initialized = True
 
 
+def stop_logger() -> None:
+    """停止写线程并写完队列中剩余的记录。"""
+    global _listener
+    listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
+
+
+def dropped_records() -> int:
+    for h in logging.getLogger(_servername).handlers:
+        if isinstance(h, _NonBlockingQueueHandler):
+            return h.dropped
+    return 0
+
+
+def sample_logger(logger: logging.Logger, rate: float) -> logging.Logger:
+    """给高频 logger 挂采样过滤器；rate >= 1 时不做任何处理。"""
+    if rate < 1 and not any(isinstance(f, SamplingFilter) for f in logger.filters):
+        logger.addFilter(SamplingFilter(max(rate, 0.0)))
+    return logger
+
+
 def get_logger(name: str | None = None) -> logging.Logger:
     init_logger()
     if name:
@@ -139,6 +243,34 @@ def clear_request_context() -> None:
     _user_id_var.set(None)
 
 
+def get_request_id() -> str | None:
+    return _request_id_var.get()
+
+
+def get_user_id() -> str | None:
+    return _user_id_var.get()
+
+
+def add_timing(name: str, ms: float) -> None:
+    timings = _timings_var.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + ms
+
+
+@contextmanager
+def phase(name: str):
+    """累计一个阶段的耗时；不在请求上下文中（后台线程等）时不记录。"""
+    timings = _timings_var.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.0) + (time.perf_counter() - start) * 1000
+
+
 def set_level(level: str | int) -> None:
     init_logger()
     logger = logging.getLogger(_servername)
@@ -146,3 +278,6 @@ def set_level(level: str | int) -> None:
     logger.setLevel(lvl)
     for h in logger.handlers:
         h.setLevel(lvl)
+    if _listener is not None:
+        for h in _listener.handlers:
+            h.setLevel(lvl)
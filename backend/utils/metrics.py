@@ -0,0 +1,79 @@
+# Prometheus 指标
+# 多 worker（gunicorn）部署时设置 PROMETHEUS_MULTIPROC_DIR，各进程把样本写入该目录下的 mmap 文件，
+# /metrics 用 MultiProcessCollector 汇总；未设置时直接使用进程内默认 registry。
+# 请求路径上只做计数器/直方图的原子累加，带标签的子指标尽量预先绑定。
+import os
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, \
+    generate_latest
+from prometheus_client import multiprocess
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+PULL_REQUESTS = Counter("fast_config_pull_requests_total", "Pull requests by service, env and status",
+                        ["service", "env", "status"])
+REQUEST_LATENCY = Histogram("fast_config_request_duration_seconds", "Request latency by route",
+                            ["method", "route"], buckets=LATENCY_BUCKETS)
+VERIFY_LATENCY = Histogram("fast_config_verify_bearer_duration_seconds", "verify_bearer latency",
+                           buckets=LATENCY_BUCKETS)
+VERIFY_FAILURES = Counter("fast_config_verify_bearer_failures_total", "verify_bearer failures by reason", ["reason"])
+IP_DENIED = Counter("fast_config_ip_denied_total", "Requests rejected by the IP gate", ["scope"])
+CACHE_REQUESTS = Counter("fast_config_cache_requests_total", "In-process cache lookups", ["cache", "result"])
+DB_POOL_CHECKED_OUT = Gauge("fast_config_db_pool_checked_out", "DB connections currently checked out",
+                            multiprocess_mode="livesum")
+DB_POOL_CONNECTIONS = Gauge("fast_config_db_pool_connections", "DB connections currently open",
+                            multiprocess_mode="livesum")
+DB_POOL_SIZE = Gauge("fast_config_db_pool_size", "Configured DB pool size", multiprocess_mode="livesum")
+JOB_RUNS = Counter("fast_config_job_runs_total", "Scheduled job runs by result", ["job", "result"])
+JOB_DURATION = Histogram("fast_config_job_duration_seconds", "Scheduled job duration", ["job"],
+                         buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0))
+JOB_LAST_SUCCESS = Gauge("fast_config_job_last_success_timestamp_seconds", "Last successful run of a job", ["job"],
+                         multiprocess_mode="max")
+TOKENS_PURGED = Counter("fast_config_tokens_purged_total", "Expired service tokens deleted by the purge job")
+SCHEDULER_LEADER = Gauge("fast_config_scheduler_leader", "1 when this process holds the scheduler lock",
+                         multiprocess_mode="livesum")
+REPLICA_READS = Counter("fast_config_db_read_routes_total", "Read-only requests by routed target and reason",
+                        ["target", "reason"])
+REPLICA_LAG = Gauge("fast_config_db_replica_lag", "Replica lag in change revisions behind the primary (-1 unreachable)",
+                    ["replica"], multiprocess_mode="max")
+WEBHOOK_DELIVERIES = Counter("fast_config_webhook_deliveries_total", "Webhook delivery attempts by result", ["result"])
+WEBHOOK_LATENCY = Histogram("fast_config_webhook_delivery_duration_seconds", "Webhook HTTP round trip",
+                            buckets=LATENCY_BUCKETS)
+
+MIRROR_SYNCS = Counter("fast_config_mirror_syncs_total", "Mirror sync rounds by result", ["result"])
+
+
+def cache_counters(name: str):
+    return CACHE_REQUESTS.labels(name, "hit"), CACHE_REQUESTS.labels(name, "miss")
+
+
+def instrument_pool(engine) -> None:
+    from sqlalchemy import event
+
+    size = getattr(engine.pool, "size", None)
+    if callable(size):
+        DB_POOL_SIZE.set(size())
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_conn, record):
+        DB_POOL_CONNECTIONS.inc()
+
+    @event.listens_for(engine, "close")
+    def _on_close(dbapi_conn, record):
+        DB_POOL_CONNECTIONS.dec()
+
+    @event.listens_for(engine, "checkout")
+    def _on_checkout(dbapi_conn, record, proxy):
+        DB_POOL_CHECKED_OUT.inc()
+
+    @event.listens_for(engine, "checkin")
+    def _on_checkin(dbapi_conn, record):
+        DB_POOL_CHECKED_OUT.dec()
+
+
+def render_latest() -> tuple[bytes, str]:
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,88 @@
+# 拉取 token 吊销集合
+# PULL_TOKEN_STATELESS 模式下 token 只校验签名与 exp，吊销通过 revoked_tokens 表传播：
+# 每个进程持有未过期吊销记录的 jti 集合，首次使用时全量加载，之后每 TOKEN_REVOCATION_REFRESH 秒按 revoked_at 增量拉取。
+# 增量窗口回看 _OVERLAP 秒，覆盖事务提交晚于 revoked_at 的记录；重复的 jti 对集合无影响。
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from settings import settings
+
+_OVERLAP = timedelta(seconds=30)
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class RevocationSet:
+    def __init__(self, ttl: float = 2.0):
+        self.ttl = ttl
+        self._jtis: dict[str, datetime] | None = None
+        self._since: datetime | None = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def _fetch(self, since: datetime | None) -> tuple[list, datetime]:
+        from database import SessionLocal
+        from models.v1.services import RevokedToken
+
+        now = _utcnow()
+        db = SessionLocal()
+        try:
+            q = db.query(RevokedToken.jti, RevokedToken.expires_at).filter(RevokedToken.expires_at > now)
+            if since is not None:
+                q = q.filter(RevokedToken.revoked_at >= since - _OVERLAP)
+            rows = q.all()
+        finally:
+            db.close()
+        return rows, now
+
+    def ensure_fresh(self) -> None:
+        if self._jtis is not None and time.monotonic() - self._loaded_at < self.ttl:
+            return
+        if not self._lock.acquire(blocking=self._jtis is None):
+            return
+        try:
+            if self._jtis is not None and time.monotonic() - self._loaded_at < self.ttl:
+                return
+            rows, now = self._fetch(self._since if self._jtis is not None else None)
+            jtis = dict(self._jtis or {})
+            for jti, exp in rows:
+                jtis[jti] = exp
+            # 已过期的 token 会被 exp 校验拒绝，无需继续记住
+            for jti in [k for k, exp in jtis.items() if exp <= now]:
+                del jtis[jti]
+            self._jtis = jtis
+            self._since = now
+            self._loaded_at = time.monotonic()
+        finally:
+            self._lock.release()
+
+    def add(self, jti: str, expires_at: datetime) -> None:
+        """本进程吊销立即生效，其它进程在下一次增量刷新时生效。"""
+        self.add_many([(jti, expires_at)])
+
+    def add_many(self, items) -> None:
+        with self._lock:
+            if self._jtis is not None:
+                jtis = dict(self._jtis)
+                jtis.update(items)
+                self._jtis = jtis
+
+    def invalidate(self) -> None:
+        self._loaded_at = 0.0
+
+    @property
+    def loaded(self) -> bool:
+        return self._jtis is not None
+
+    def __len__(self) -> int:
+        return len(self._jtis or {})
+
+    def is_revoked(self, jti: str) -> bool:
+        self.ensure_fresh()
+        return jti in (self._jtis or {})
+
+
+revocations = RevocationSet(ttl=float(settings.TOKEN_REVOCATION_REFRESH or 2))
@@ -34,7 +34,7 @@ MAX_HEALTH_CHECK_ATTEMPTS=30
 HEALTH_CHECK_INTERVAL=2
 SERVICE_VERSION="${VERSION}"
 
-HEALTH_CHECK_URL="http://localhost:${TEMP_PORT}/api/health"
+HEALTH_CHECK_URL="http://localhost:${TEMP_PORT}/api/health/ready"
 
 ENV_FILE="/tmp/.env"
 DOCKER_ENV_FILE_OPTION=""
@@ -155,7 +155,7 @@ docker rm "$TEMP_CONTAINER_ID" >/dev/null 2>&1
 # 最终健康检查
 echo "步骤6: 最终健康检查..."
 sleep 3
-FINAL_HEALTH_URL="http://localhost:${PRODUCTION_PORT}/api/health"
+FINAL_HEALTH_URL="http://localhost:${PRODUCTION_PORT}/api/health/ready"
 if ! health_check "$FINAL_HEALTH_URL" 10 2; then
     echo "警告: 最终健康检查失败，但容器已启动"
 fi
@@ -66,13 +66,18 @@ export async function deleteToken(service: string, tokenId: number) {
   return r.json()
 }
 
-export async function listTokensMonitor(params?: { days?: number; env?: string }) {
+type TokenBuckets = { expired: number; lt_1d: number; lt_7d: number; lt_30d: number; later: number }
+type TokenGroup = { key: string; total: number; soon: number; buckets: TokenBuckets }
+
+export async function listTokensMonitor(params?: { days?: number; env?: string; page?: number; pageSize?: number }) {
   const u = new URL(`${API_BASE}/api/v1/services/tokens/monitor`)
   if (params?.days) u.searchParams.set('days', String(params.days))
   if (params?.env) u.searchParams.set('env', params.env)
+  if (params?.page) u.searchParams.set('page', String(params.page))
+  if (params?.pageSize) u.searchParams.set('page_size', String(params.pageSize))
   const r = await request(u.toString())
   if (!r.ok) throw new Error('list tokens monitor failed')
-  return r.json() as Promise<{ total: number; soon: number; items: Array<{ id: number; service_code: string; env: string; created_at: string; expires_at: string }> }>
+  return r.json() as Promise<{ total: number; soon: number; buckets: TokenBuckets; by_env: TokenGroup[]; by_service: TokenGroup[]; page: number; page_size: number; items: Array<{ id: number; service_code: string; env: string; created_at: string; expires_at: string }> }>
 }
 
 export async function createConfig(body: { service_code: string; env: string; format: string; content: string; schema_def?: string; version?: string }) {
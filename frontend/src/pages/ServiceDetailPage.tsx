@@ -174,6 +174,9 @@ export default function ServiceDetailPage() {
                       }`}>
                         {c.status === 'active' ? 'Active' : 'Disabled'}
                       </span>
+                      {c.status === 'active' && c.grace_until && (
+                        <span className="ml-2 text-xs text-amber-600">轮换宽限至 {new Date(c.grace_until + 'Z').toLocaleString()}</span>
+                      )}
                     </td>
                     <td className="px-6 py-4 text-gray-500">{new Date(c.created_at).toLocaleString()}</td>
                     <td className="px-6 py-4 text-right">
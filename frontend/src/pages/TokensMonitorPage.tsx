@@ -1,16 +1,20 @@
-import { useQuery } from '@tanstack/react-query'
+import { keepPreviousData, useQuery } from '@tanstack/react-query'
 import { listTokensMonitor } from '../api'
 import { useMemo, useState } from 'react'
-import { Shield, AlertTriangle, Clock, CheckCircle, RefreshCw } from 'lucide-react'
-
-interface TokenItem {
-  id: number
-  token: string
-  env: string
-  expires_at: string
-  created_at: string
-  service_code: string
-}
+import { Shield, AlertTriangle, Clock, CheckCircle, RefreshCw, XCircle, ChevronLeft, ChevronRight } from 'lucide-react'
+
+type TokenMonitor = Awaited<ReturnType<typeof listTokensMonitor>>
+
+const SOON_DAYS = 7
+const PAGE_SIZES = [50, 100, 200, 500]
+
+const BUCKET_LABELS: Array<[keyof TokenMonitor['buckets'], string]> = [
+  ['expired', '已过期'],
+  ['lt_1d', '1天内'],
+  ['lt_7d', '1-7天'],
+  ['lt_30d', '7-30天'],
+  ['later', '30天以上'],
+]
 
 function daysLeft(expiresAt: string) {
   const exp = new Date(expiresAt).getTime()
@@ -19,23 +23,34 @@ function daysLeft(expiresAt: string) {
 }
 
 export default function TokensMonitorPage() {
+  const [page, setPage] = useState(1)
+  const [pageSize, setPageSize] = useState(100)
+  const [showSoonOnly, setShowSoonOnly] = useState(false)
+
+  // 统计由后端按全量聚合，明细按到期时间升序分页（即将到期的排在最前）
   const tokensQ = useQuery({
-    queryKey: ['tokens-monitor'],
-    queryFn: async () => {
-      const r = await listTokensMonitor({ days: 7 })
-      return r.items as TokenItem[]
-    }
+    queryKey: ['tokens-monitor', page, pageSize],
+    queryFn: () => listTokensMonitor({ days: SOON_DAYS, page, pageSize }),
+    placeholderData: keepPreviousData,
   })
 
-  const [showSoonOnly, setShowSoonOnly] = useState(false)
+  const data = tokensQ.data
+  const total = data?.total || 0
+  const soon = data?.soon || 0
+  // 仅看即将到期时，只有前 soon 条明细需要翻页
+  const pages = Math.max(1, Math.ceil((showSoonOnly ? soon : total) / pageSize))
 
   const items = useMemo(() => {
-    const list: TokenItem[] = tokensQ.data || []
-    return showSoonOnly ? list.filter(it => daysLeft(it.expires_at) <= 7) : list
-  }, [tokensQ.data, showSoonOnly])
+    const list = data?.items || []
+    return showSoonOnly ? list.filter(it => daysLeft(it.expires_at) <= SOON_DAYS) : list
+  }, [data, showSoonOnly])
+
+  const groupTables: Array<{ title: string; column: string; groups: TokenMonitor['by_env'] }> = [
+    { title: '按环境', column: '环境', groups: data?.by_env || [] },
+    { title: '按服务', column: '服务', groups: data?.by_service || [] },
+  ]
 
-  const total = tokensQ.data?.length || 0
-  const soon = tokensQ.data ? tokensQ.data.filter((it: TokenItem) => daysLeft(it.expires_at) <= 7).length : 0
+  const goto = (p: number) => setPage(Math.min(Math.max(1, p), pages))
 
   return (
     <div className="space-y-6">
@@ -47,10 +62,7 @@ export default function TokensMonitorPage() {
           </div>
           <button
             className="flex items-center px-3 py-1.5 rounded-lg text-sm font-medium transition-colors border border-gray-200 bg-white text-gray-700 hover:bg-gray-50 shadow-sm"
-            onClick={() => {
-              servicesQ.refetch()
-              tokensQ.refetch()
-            }}
+            onClick={() => tokensQ.refetch()}
           >
             <RefreshCw className={`w-4 h-4 mr-1.5 ${tokensQ.isFetching ? 'animate-spin' : ''}`} />
             刷新
@@ -59,24 +71,82 @@ export default function TokensMonitorPage() {
         <p className="text-sm text-gray-600 mt-1">展示全部服务的拉取 Token 及其有效期，便于及时轮换。</p>
       </div>
 
-      <div className="grid grid-cols-1 md:grid-cols-3 gap-4">
+      <div className="grid grid-cols-1 md:grid-cols-4 gap-4">
         <div className="bg-white p-4 rounded-xl border border-gray-100">
           <div className="flex items-center gap-2 text-gray-600"><CheckCircle className="w-4 h-4" />总Token数</div>
           <div className="text-2xl font-bold mt-2">{total}</div>
         </div>
         <div className="bg-white p-4 rounded-xl border border-gray-100">
-          <div className="flex items-center gap-2 text-gray-600"><AlertTriangle className="w-4 h-4 text-orange-500" />7天内到期</div>
+          <div className="flex items-center gap-2 text-gray-600"><AlertTriangle className="w-4 h-4 text-orange-500" />{SOON_DAYS}天内到期</div>
           <div className="text-2xl font-bold mt-2 text-orange-600">{soon}</div>
         </div>
+        <div className="bg-white p-4 rounded-xl border border-gray-100">
+          <div className="flex items-center gap-2 text-gray-600"><XCircle className="w-4 h-4 text-red-500" />已过期</div>
+          <div className="text-2xl font-bold mt-2 text-red-600">{data?.buckets.expired || 0}</div>
+        </div>
         <div className="bg-white p-4 rounded-xl border border-gray-100">
           <div className="flex items-center gap-2 text-gray-600"><Clock className="w-4 h-4" />筛选</div>
           <label className="mt-2 inline-flex items-center gap-2 text-sm">
-            <input type="checkbox" checked={showSoonOnly} onChange={e=>setShowSoonOnly(e.target.checked)} />
-            仅显示7天内到期
+            <input
+              type="checkbox"
+              checked={showSoonOnly}
+              onChange={e => {
+                setShowSoonOnly(e.target.checked)
+                setPage(1)
+              }}
+            />
+            仅显示{SOON_DAYS}天内到期
           </label>
         </div>
       </div>
 
+      <div className="bg-white p-4 rounded-xl shadow">
+        <h3 className="text-sm font-semibold text-gray-700 mb-3">到期分布</h3>
+        <div className="grid grid-cols-2 md:grid-cols-5 gap-3">
+          {BUCKET_LABELS.map(([key, label]) => (
+            <div key={key} className="p-3 rounded-lg bg-gray-50">
+              <div className="text-xs text-gray-500">{label}</div>
+              <div className="text-lg font-semibold mt-1">{data ? data.buckets[key] : 0}</div>
+            </div>
+          ))}
+        </div>
+      </div>
+
+      <div className="grid grid-cols-1 md:grid-cols-2 gap-4">
+        {groupTables.map(({ title, column, groups }) => (
+          <div key={title} className="bg-white p-4 rounded-xl shadow">
+            <h3 className="text-sm font-semibold text-gray-700 mb-3">{title}</h3>
+            <div className="overflow-auto max-h-72 border rounded-lg">
+              <table className="w-full text-sm">
+                <thead className="bg-gray-50 border-b">
+                  <tr className="text-left text-gray-600">
+                    <th className="p-2 font-medium">{column}</th>
+                    <th className="p-2 font-medium">总数</th>
+                    <th className="p-2 font-medium">{SOON_DAYS}天内到期</th>
+                    <th className="p-2 font-medium">已过期</th>
+                  </tr>
+                </thead>
+                <tbody className="divide-y divide-gray-100">
+                  {groups.map(g => (
+                    <tr key={g.key}>
+                      <td className="p-2 font-mono">{g.key}</td>
+                      <td className="p-2">{g.total}</td>
+                      <td className={`p-2 ${g.soon ? 'text-orange-600 font-semibold' : 'text-gray-700'}`}>{g.soon}</td>
+                      <td className={`p-2 ${g.buckets.expired ? 'text-red-600 font-semibold' : 'text-gray-700'}`}>{g.buckets.expired}</td>
+                    </tr>
+                  ))}
+                  {groups.length === 0 && (
+                    <tr>
+                      <td colSpan={4} className="p-6 text-center text-gray-400">暂无数据</td>
+                    </tr>
+                  )}
+                </tbody>
+              </table>
+            </div>
+          </div>
+        ))}
+      </div>
+
       <div className="bg-white p-4 rounded-xl shadow">
         <div className="overflow-hidden border rounded-lg">
           <table className="w-full text-sm">
@@ -92,7 +162,7 @@ export default function TokensMonitorPage() {
             <tbody className="divide-y divide-gray-100">
               {items.map(it => {
                 const left = daysLeft(it.expires_at)
-                const danger = left <= 7
+                const danger = left <= SOON_DAYS
                 return (
                   <tr key={`${it.service_code}-${it.id}`} className="hover:bg-gray-50/50 transition-colors">
                     <td className="p-3 font-mono">{it.service_code}</td>
@@ -113,6 +183,42 @@ export default function TokensMonitorPage() {
             </tbody>
           </table>
         </div>
+
+        <div className="flex items-center justify-between mt-4 text-sm text-gray-600">
+          <div className="flex items-center gap-2">
+            每页
+            <select
+              className="border border-gray-200 rounded-lg px-2 py-1 bg-white"
+              value={pageSize}
+              onChange={e => {
+                setPageSize(Number(e.target.value))
+                setPage(1)
+              }}
+            >
+              {PAGE_SIZES.map(n => <option key={n} value={n}>{n}</option>)}
+            </select>
+            条，共 {showSoonOnly ? soon : total} 条
+          </div>
+          <div className="flex items-center gap-2">
+            <button
+              className="flex items-center px-2 py-1 rounded-lg border border-gray-200 bg-white hover:bg-gray-50 disabled:opacity-50 disabled:cursor-not-allowed"
+              disabled={page <= 1}
+              onClick={() => goto(page - 1)}
+            >
+              <ChevronLeft className="w-4 h-4" />
+              上一页
+            </button>
+            <span>第 {page} / {pages} 页</span>
+            <button
+              className="flex items-center px-2 py-1 rounded-lg border border-gray-200 bg-white hover:bg-gray-50 disabled:opacity-50 disabled:cursor-not-allowed"
+              disabled={page >= pages}
+              onClick={() => goto(page + 1)}
+            >
+              下一页
+              <ChevronRight className="w-4 h-4" />
+            </button>
+          </div>
+        </div>
       </div>
     </div>
   )
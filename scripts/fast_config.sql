@@ -17,6 +17,25 @@
 SET NAMES utf8mb4;
 SET FOREIGN_KEY_CHECKS = 0;
 
+-- ----------------------------
+-- Table structure for api_logs
+-- ----------------------------
+DROP TABLE IF EXISTS `api_logs`;
+CREATE TABLE `api_logs`  (
+  `id` bigint UNSIGNED NOT NULL AUTO_INCREMENT,
+  `service_code` varchar(64) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NOT NULL,
+  `env` varchar(32) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NOT NULL,
+  `instance` varchar(128) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NULL DEFAULT NULL,
+  `version` varchar(64) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NULL DEFAULT NULL,
+  `status` int NOT NULL,
+  `latency_ms` int NOT NULL,
+  `client_ip` varchar(64) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NULL DEFAULT NULL,
+  `created_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (`id`) USING BTREE,
+  INDEX `idx_apilog_svc_env`(`service_code` ASC, `env` ASC, `created_at` ASC) USING BTREE,
+  INDEX `idx_apilog_created`(`created_at` ASC) USING BTREE
+) ENGINE = InnoDB AUTO_INCREMENT = 1 CHARACTER SET = utf8mb4 COLLATE = utf8mb4_0900_ai_ci ROW_FORMAT = DYNAMIC;
+
 -- ----------------------------
 -- Table structure for app_backend_bases
 -- ----------------------------
@@ -50,6 +69,93 @@ CREATE TABLE `audit_logs`  (
   INDEX `idx_audit_created`(`created_at` ASC) USING BTREE
 ) ENGINE = InnoDB AUTO_INCREMENT = 1 CHARACTER SET = utf8mb4 COLLATE = utf8mb4_0900_ai_ci ROW_FORMAT = DYNAMIC;
 
+-- ----------------------------
+-- Table structure for change_seq
+-- ----------------------------
+DROP TABLE IF EXISTS `change_seq`;
+CREATE TABLE `change_seq`  (
+  `name` varchar(64) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NOT NULL,
+  `value` bigint UNSIGNED NOT NULL DEFAULT 0,
+  PRIMARY KEY (`name`) USING BTREE
+) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_0900_ai_ci ROW_FORMAT = DYNAMIC;
+
+-- ----------------------------
+-- Records of change_seq
+-- ----------------------------
+INSERT INTO `change_seq` VALUES ('changes', 0);
+
+-- ----------------------------
+-- Table structure for changes
+-- ----------------------------
+DROP TABLE IF EXISTS `changes`;
+CREATE TABLE `changes`  (
+  `id` bigint UNSIGNED NOT NULL AUTO_INCREMENT,
+  `entity` varchar(64) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NOT NULL,
+  `entity_id` bigint UNSIGNED NOT NULL,
+  `op` enum('create','update','delete') CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NOT NULL,
+  `service_id` bigint UNSIGNED NULL DEFAULT NULL,
+  `env` varchar(32) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NULL DEFAULT NULL,
+  `detail` varchar(256) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NULL DEFAULT NULL,
+  `actor` varchar(128) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NULL DEFAULT NULL,
+  `created_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (`id`) USING BTREE,
+  INDEX `idx_changes_service`(`service_id` ASC, `id` ASC) USING BTREE,
+  INDEX `idx_changes_created`(`created_at` ASC) USING BTREE
+) ENGINE = InnoDB AUTO_INCREMENT = 1 CHARACTER SET = utf8mb4 COLLATE = utf8mb4_0900_ai_ci ROW_FORMAT = DYNAMIC;
+
+-- ----------------------------
+-- Table structure for config_data_keys
+-- ----------------------------
+DROP TABLE IF EXISTS `config_data_keys`;
+CREATE TABLE `config_data_keys`  (
+  `id` bigint UNSIGNED NOT NULL AUTO_INCREMENT,
+  `config_id` bigint UNSIGNED NOT NULL,
+  `wrapped_key` varbinary(512) NOT NULL,
+  `created_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  `rotated_at` timestamp NULL DEFAULT NULL,
+  PRIMARY KEY (`id`) USING BTREE,
+  UNIQUE INDEX `uk_datakey_cfg`(`config_id` ASC) USING BTREE,
+  CONSTRAINT `fk_datakey_cfg` FOREIGN KEY (`config_id`) REFERENCES `configs` (`id`) ON DELETE CASCADE ON UPDATE RESTRICT
+) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_0900_ai_ci ROW_FORMAT = DYNAMIC;
+
+-- ----------------------------
+-- Table structure for config_layers
+-- ----------------------------
+DROP TABLE IF EXISTS `config_layers`;
+CREATE TABLE `config_layers`  (
+  `id` bigint UNSIGNED NOT NULL AUTO_INCREMENT,
+  `scope` enum('global','service','instance') CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NOT NULL,
+  `service_id` bigint UNSIGNED NULL DEFAULT NULL,
+  `env` varchar(32) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NULL DEFAULT NULL,
+  `instance` varchar(128) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NULL DEFAULT NULL,
+  `scope_key` varchar(200) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NOT NULL,
+  `content` longtext CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NOT NULL,
+  `version` bigint UNSIGNED NOT NULL DEFAULT 1,
+  `updated_by` varchar(128) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NULL DEFAULT NULL,
+  `updated_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  PRIMARY KEY (`id`) USING BTREE,
+  UNIQUE INDEX `uk_layer_scope`(`scope_key` ASC) USING BTREE,
+  INDEX `idx_layer_service`(`service_id` ASC) USING BTREE,
+  CONSTRAINT `fk_layer_service` FOREIGN KEY (`service_id`) REFERENCES `services` (`id`) ON DELETE CASCADE ON UPDATE RESTRICT
+) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_0900_ai_ci ROW_FORMAT = DYNAMIC;
+
+-- ----------------------------
+-- Table structure for config_merged_views
+-- ----------------------------
+DROP TABLE IF EXISTS `config_merged_views`;
+CREATE TABLE `config_merged_views`  (
+  `id` bigint UNSIGNED NOT NULL AUTO_INCREMENT,
+  `config_id` bigint UNSIGNED NOT NULL,
+  `instance` varchar(128) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NOT NULL DEFAULT '',
+  `content` longtext CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NOT NULL,
+  `etag` varchar(64) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NOT NULL,
+  `deps` varchar(256) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NOT NULL,
+  `updated_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  PRIMARY KEY (`id`) USING BTREE,
+  UNIQUE INDEX `uk_view_cfg_instance`(`config_id` ASC, `instance` ASC) USING BTREE,
+  CONSTRAINT `fk_view_cfg` FOREIGN KEY (`config_id`) REFERENCES `configs` (`id`) ON DELETE CASCADE ON UPDATE RESTRICT
+) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_0900_ai_ci ROW_FORMAT = DYNAMIC;
+
 -- ----------------------------
 -- Table structure for config_versions
 -- ----------------------------
@@ -89,6 +195,34 @@ CREATE TABLE `configs`  (
   CONSTRAINT `fk_cfg_service` FOREIGN KEY (`service_id`) REFERENCES `services` (`id`) ON DELETE CASCADE ON UPDATE RESTRICT
 ) ENGINE = InnoDB AUTO_INCREMENT = 14 CHARACTER SET = utf8mb4 COLLATE = utf8mb4_0900_ai_ci ROW_FORMAT = DYNAMIC;
 
+-- ----------------------------
+-- Table structure for revoked_tokens
+-- ----------------------------
+DROP TABLE IF EXISTS `revoked_tokens`;
+CREATE TABLE `revoked_tokens`  (
+  `id` bigint UNSIGNED NOT NULL AUTO_INCREMENT,
+  `jti` varchar(64) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NOT NULL,
+  `service_id` bigint UNSIGNED NOT NULL,
+  `expires_at` timestamp NOT NULL,
+  `revoked_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (`id`) USING BTREE,
+  UNIQUE INDEX `uk_revoked_jti`(`jti` ASC) USING BTREE,
+  INDEX `idx_revoked_at`(`revoked_at` ASC) USING BTREE,
+  INDEX `idx_revoked_expires`(`expires_at` ASC) USING BTREE
+) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_0900_ai_ci ROW_FORMAT = DYNAMIC;
+
+-- ----------------------------
+-- Table structure for scheduler_locks
+-- ----------------------------
+DROP TABLE IF EXISTS `scheduler_locks`;
+CREATE TABLE `scheduler_locks`  (
+  `name` varchar(64) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NOT NULL,
+  `owner` varchar(128) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NOT NULL,
+  `expires_at` timestamp NOT NULL,
+  `updated_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  PRIMARY KEY (`name`) USING BTREE
+) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_0900_ai_ci ROW_FORMAT = DYNAMIC;
+
 -- ----------------------------
 -- Table structure for service_credentials
 -- ----------------------------
@@ -101,6 +235,7 @@ CREATE TABLE `service_credentials`  (
   `status` enum('active','disabled') CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NOT NULL DEFAULT 'active',
   `created_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
   `last_rotated_at` timestamp NULL DEFAULT NULL,
+  `grace_until` timestamp NULL DEFAULT NULL,
   PRIMARY KEY (`id`) USING BTREE,
   UNIQUE INDEX `ak`(`ak` ASC) USING BTREE,
   INDEX `idx_cred_service`(`service_id` ASC) USING BTREE,
@@ -133,11 +268,14 @@ CREATE TABLE `service_tokens`  (
   `id` bigint UNSIGNED NOT NULL AUTO_INCREMENT,
   `service_id` bigint UNSIGNED NOT NULL,
   `token` text CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NOT NULL,
+  `jti` varchar(64) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NULL DEFAULT NULL,
   `env` varchar(32) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NOT NULL,
-  `expires_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  `expires_at` timestamp NOT NULL,
   `created_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
   PRIMARY KEY (`id`) USING BTREE,
-  INDEX `service_id`(`service_id` ASC) USING BTREE
+  UNIQUE INDEX `uk_token_jti`(`jti` ASC) USING BTREE,
+  INDEX `service_id`(`service_id` ASC) USING BTREE,
+  INDEX `idx_token_expires`(`expires_at` ASC) USING BTREE
 ) ENGINE = InnoDB AUTO_INCREMENT = 21 CHARACTER SET = utf8mb4 COLLATE = utf8mb4_0900_ai_ci ROW_FORMAT = DYNAMIC;
 
 -- ----------------------------
@@ -170,4 +308,47 @@ CREATE TABLE `users`  (
   UNIQUE INDEX `username`(`username` ASC) USING BTREE
 ) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_0900_ai_ci ROW_FORMAT = DYNAMIC;
 
+-- ----------------------------
+-- Table structure for webhook_outbox
+-- ----------------------------
+DROP TABLE IF EXISTS `webhook_outbox`;
+CREATE TABLE `webhook_outbox`  (
+  `id` bigint UNSIGNED NOT NULL AUTO_INCREMENT,
+  `webhook_id` bigint UNSIGNED NOT NULL,
+  `event` varchar(64) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NOT NULL,
+  `payload` longtext CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NOT NULL,
+  `status` enum('pending','delivering','delivered','failed') CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NOT NULL DEFAULT 'pending',
+  `attempts` int NOT NULL DEFAULT 0,
+  `next_attempt_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  `locked_by` varchar(128) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NULL DEFAULT NULL,
+  `locked_until` timestamp NULL DEFAULT NULL,
+  `last_status` int NULL DEFAULT NULL,
+  `last_error` varchar(512) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NULL DEFAULT NULL,
+  `created_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  `delivered_at` timestamp NULL DEFAULT NULL,
+  PRIMARY KEY (`id`) USING BTREE,
+  INDEX `idx_outbox_status_next`(`status` ASC, `next_attempt_at` ASC) USING BTREE,
+  INDEX `idx_outbox_webhook`(`webhook_id` ASC, `id` ASC) USING BTREE,
+  CONSTRAINT `fk_outbox_webhook` FOREIGN KEY (`webhook_id`) REFERENCES `webhooks` (`id`) ON DELETE CASCADE ON UPDATE RESTRICT
+) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_0900_ai_ci ROW_FORMAT = DYNAMIC;
+
+-- ----------------------------
+-- Table structure for webhooks
+-- ----------------------------
+DROP TABLE IF EXISTS `webhooks`;
+CREATE TABLE `webhooks`  (
+  `id` bigint UNSIGNED NOT NULL AUTO_INCREMENT,
+  `service_id` bigint UNSIGNED NOT NULL,
+  `env` varchar(32) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NULL DEFAULT NULL,
+  `url` varchar(512) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NOT NULL,
+  `secret_ciphertext` varbinary(512) NOT NULL,
+  `active` tinyint(1) NOT NULL DEFAULT 1,
+  `max_concurrency` int NOT NULL DEFAULT 4,
+  `created_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  `updated_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  PRIMARY KEY (`id`) USING BTREE,
+  INDEX `idx_webhook_service`(`service_id` ASC, `env` ASC) USING BTREE,
+  CONSTRAINT `fk_webhook_service` FOREIGN KEY (`service_id`) REFERENCES `services` (`id`) ON DELETE CASCADE ON UPDATE RESTRICT
+) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_0900_ai_ci ROW_FORMAT = DYNAMIC;
+
 SET FOREIGN_KEY_CHECKS = 1;
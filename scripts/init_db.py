@@ -1 +1,38 @@
-# 数据库初始化
\ No newline at end of file
+# 数据库初始化
+# 按 ORM 模型建表（已存在的表跳过），MySQL 与 SQLite 通用；MySQL 生产库仍以 fast_config.sql 为准。
+# 用法（项目根目录）：
+#   python scripts/init_db.py                  使用 .env 中的 DATABASE_URL / DB_BACKEND / DB_* 配置
+#   python scripts/init_db.py sqlite:///x.db   指定连接串
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from sqlalchemy import inspect
+
+from settings import settings
+
+if len(sys.argv) > 1:
+    settings.config["DATABASE_URL"] = sys.argv[1]
+
+from database import Base, engine
+import models.api_log  # noqa: F401
+import models.task  # noqa: F401
+import models.v1.changes  # noqa: F401
+import models.v1.configs  # noqa: F401
+import models.v1.meta  # noqa: F401
+import models.v1.services  # noqa: F401
+import models.v1.webhooks  # noqa: F401
+
+
+def main() -> None:
+    before = set(inspect(engine).get_table_names())
+    Base.metadata.create_all(engine)
+    created = sorted(set(inspect(engine).get_table_names()) - before)
+    print(f"{engine.url.render_as_string(hide_password=True)}: created {len(created)} tables")
+    for name in created:
+        print(f"  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+# 凭证加解密微基准：对比每次调用新建 Fernet 与复用缓存的 provider
+# 用法（项目根目录）：python tests/bench_crypto.py [次数]
+import os
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from cryptography.fernet import Fernet, MultiFernet
+
+from settings import settings
+from utils import crypto
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+if not settings.CRED_MASTER_KEY:
+    settings.config["CRED_MASTER_KEY"] = f"{Fernet.generate_key().decode()},{Fernet.generate_key().decode()}"
+
+_, sk = crypto.gen_ak_sk()
+cipher = crypto.encrypt_sk(sk)
+key = settings.CRED_MASTER_KEY
+
+
+def per_call_decrypt():
+    MultiFernet([Fernet(k.strip().encode()) for k in key.split(",")]).decrypt(cipher)
+
+
+def per_call_encrypt():
+    MultiFernet([Fernet(k.strip().encode()) for k in key.split(",")]).encrypt(sk.encode())
+
+
+cases = [
+    ("encrypt (per-call Fernet)", per_call_encrypt),
+    ("encrypt_sk (cached provider)", lambda: crypto.encrypt_sk(sk)),
+    ("decrypt (per-call Fernet)", per_call_decrypt),
+    ("decrypt_sk (cached provider)", lambda: crypto.decrypt_sk(cipher)),
+]
+
+print(f"python {sys.version.split()[0]}, pid {os.getpid()}, n={N}")
+for name, fn in cases:
+    fn()
+    t = timeit.timeit(fn, number=N)
+    print(f"{name:<32} {t / N * 1e6:8.2f} us/op  {N / t:10.0f} ops/s")
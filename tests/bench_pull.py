@@ -0,0 +1,66 @@
+# 拉取接口基准：在临时 SQLite（WAL）库上建表、造数并压测 GET /api/v1/pull，无需 MySQL
+# 用法（项目根目录）：python tests/bench_pull.py [次数] [服务数]
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from cryptography.fernet import Fernet
+
+from settings import settings
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+SERVICES = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+tmp = tempfile.mkdtemp(prefix="fast_config_bench_")
+settings.config.update({
+    "DATABASE_URL": f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+    "CRED_MASTER_KEY": settings.CRED_MASTER_KEY or Fernet.generate_key().decode(),
+    "ADMIN_JWT_SECRET": "bench-" + "x" * 32,
+    "ADMIN_USERNAME": "admin",
+    "ADMIN_PASSWORD": "bench",
+    "JWT_CLOCK_SKEW": settings.JWT_CLOCK_SKEW or "60",
+    "ACCESS_LOG_ENABLED": "0",
+    "RATE_LIMIT_ENABLED": "0",
+    "SCHEDULER_ENABLED": "0",
+    "WEBHOOK_ENABLED": "0",
+})
+
+from fastapi.testclient import TestClient
+
+import database
+import main
+import models.api_log  # noqa: F401
+import models.task  # noqa: F401
+
+database.Base.metadata.create_all(database.engine)
+
+with TestClient(main.app, client=("127.0.0.1", 50000)) as client:
+    admin = client.post("/api/v1/auth/login", json={"username": "admin", "password": "bench"}).json()["token"]
+    h = {"Authorization": f"Bearer {admin}"}
+    tokens = []
+    for i in range(SERVICES):
+        code = f"bench{i:03d}"
+        client.post("/api/v1/services", json={"code": code, "name": code}, headers=h)
+        client.post(f"/api/v1/services/{code}/allow-ips", json={"cidr": "0.0.0.0/0"}, headers=h)
+        content = "{" + ",".join(f'"K{j}": "v{j}"' for j in range(50)) + "}"
+        client.post("/api/v1/configs", json={"service_code": code, "env": "prod", "format": "json",
+                                             "content": content, "version": "1.0.0"}, headers=h)
+        tokens.append((code, client.post(f"/api/v1/services/{code}/envs/prod/token", headers=h).json()["token"]))
+
+    lat = []
+    start = time.perf_counter()
+    for n in range(N):
+        code, token = tokens[n % len(tokens)]
+        t = time.perf_counter()
+        r = client.get(f"/api/v1/pull/{code}/prod", headers={"Authorization": f"Bearer {token}"})
+        lat.append(time.perf_counter() - t)
+        assert r.status_code == 200, r.text
+    total = time.perf_counter() - start
+
+lat.sort()
+print(f"sqlite pull x{N} over {SERVICES} services: {N / total:.0f} req/s, "
+      f"p50={lat[len(lat) // 2] * 1000:.2f}ms p99={lat[int(len(lat) * 0.99)] * 1000:.2f}ms")
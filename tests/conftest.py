@@ -0,0 +1,40 @@
+# 测试公共环境：临时 SQLite 库 + 随机主密钥，无需 MySQL
+# 各测试模块共用同一进程内的 settings / database / main，必须在任何模块导入它们之前完成配置，因此放在 conftest。
+# 用法（项目根目录）：python -m pytest tests
+import sys
+import tempfile
+from pathlib import Path
+
+# backend 需排在 tests 之前：tests/main.py 与 backend/main.py 同名
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from cryptography.fernet import Fernet
+
+from settings import settings
+
+tmp = tempfile.mkdtemp(prefix="fast_config_test_")
+settings.config.update({
+    "DATABASE_URL": f"sqlite:///{tmp}/test.db",
+    "CRED_MASTER_KEY": Fernet.generate_key().decode(),
+    "ADMIN_JWT_SECRET": "fast-config-test-" + "x" * 32,
+    "ADMIN_USERNAME": "admin",
+    "ADMIN_PASSWORD": "test",
+    "JWT_CLOCK_SKEW": "60",
+    "ACCESS_LOG_ENABLED": "0",
+    "RATE_LIMIT_ENABLED": "0",
+    "SCHEDULER_ENABLED": "0",
+})
+
+
+def pytest_sessionstart(session):
+    import database
+    import models.api_log  # noqa: F401
+    import models.task  # noqa: F401
+    import models.v1.changes  # noqa: F401
+    import models.v1.configs  # noqa: F401
+    import models.v1.meta  # noqa: F401
+    import models.v1.services  # noqa: F401
+    import models.v1.webhooks  # noqa: F401
+
+    database.Base.metadata.create_all(database.engine)
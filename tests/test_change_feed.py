@@ -0,0 +1,140 @@
+# 变更流水的 revision 分配与分页读取（services/change_service.py）
+# 用法（项目根目录）：python -m pytest tests/test_change_feed.py
+import itertools
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+import database
+from models.v1.changes import Change, ChangeSeq
+from models.v1.services import Service
+from services.change_service import list_changes, purge_changes, read_page, record_changes, stable_revision
+
+_seq = itertools.count(1)
+
+
+@pytest.fixture
+def db():
+    s = database.SessionLocal()
+    try:
+        yield s
+    finally:
+        s.rollback()
+        s.close()
+
+
+def _service(db) -> Service:
+    n = next(_seq)
+    svc = Service(code=f"feed{n}", name=f"feed{n}")
+    db.add(svc)
+    db.commit()
+    return svc
+
+
+def _ids(db) -> list[int]:
+    return [i for (i,) in db.query(Change.id).order_by(Change.id).all()]
+
+
+def _contiguous(db) -> None:
+    ids = _ids(db)
+    assert ids == list(range(ids[0], ids[-1] + 1))
+    assert db.query(ChangeSeq.value).filter(ChangeSeq.name == "changes").scalar() == ids[-1] == stable_revision(db)
+
+
+def test_orm_writes_recorded_in_order(db):
+    before = stable_revision(db)
+    svc = _service(db)
+    svc.name = "renamed"
+    db.commit()
+    rows = db.query(Change).filter(Change.id > before).order_by(Change.id).all()
+    assert [(r.id, r.entity, r.entity_id, r.op, r.detail) for r in rows] == [
+        (before + 1, "services", svc.id, "create", svc.code), (before + 2, "services", svc.id, "update", svc.code)]
+    _contiguous(db)
+
+
+def test_rollback_leaves_no_gap(db):
+    before = stable_revision(db)
+    db.add(Service(code="feed_rolled_back", name="x"))
+    db.flush()
+    db.rollback()
+    assert stable_revision(db) == before
+    svc = _service(db)
+    assert db.query(Change.id).filter(Change.entity_id == svc.id, Change.entity == "services").scalar() == before + 1
+    _contiguous(db)
+
+
+def test_uncommitted_revision_not_visible(db):
+    before = stable_revision(db)
+    db.add(Service(code=f"feed_pending{next(_seq)}", name="x"))
+    db.flush()
+    other = database.SessionLocal()
+    try:
+        # 读到 stable 之后不会再有更小的 revision 提交：未提交的流水对其他会话不可见
+        assert stable_revision(other) == before
+        db.commit()
+        other.rollback()
+        assert stable_revision(other) == before + 1
+    finally:
+        other.close()
+
+
+def test_record_changes_allocates_contiguous_block(db):
+    svc = _service(db)
+    before = stable_revision(db)
+    assert record_changes(db, "service_tokens", "delete", [(i, svc.id, "prod", f"jti{i}") for i in range(7)],
+                          chunk_size=3) == 7
+    assert record_changes(db, "service_tokens", "delete", []) == 0
+    db.commit()
+    rows = db.query(Change).filter(Change.id > before).order_by(Change.id).all()
+    assert [(r.id, r.entity_id, r.detail) for r in rows] == [(before + 1 + i, i, f"jti{i}") for i in range(7)]
+    _contiguous(db)
+
+
+def test_missing_counter_row_continues_from_max_id(db):
+    before = stable_revision(db)
+    # create_all 建的库没有初始计数行
+    db.query(ChangeSeq).delete()
+    db.commit()
+    _service(db)
+    assert stable_revision(db) == before + 1
+    _contiguous(db)
+
+
+def test_list_changes_pages_and_filters(db):
+    a, b = _service(db), _service(db)
+    since = stable_revision(db)
+    for svc in (a, b, a):
+        svc.name += "!"
+        db.commit()
+    page = list_changes(db, since, 2)
+    assert [r.service_id for r in page["changes"]] == [a.id, b.id]
+    assert page["has_more"] and page["next"] == since + 2 and page["revision"] == since + 3
+    page = list_changes(db, page["next"], 2)
+    assert [r.service_id for r in page["changes"]] == [a.id]
+    assert not page["has_more"] and page["next"] == since + 3
+    # 过滤后不足一页：游标直接推进到 stable
+    page = list_changes(db, since, 5, service_id=b.id)
+    assert [r.id for r in page["changes"]] == [since + 2] and page["next"] == since + 3
+    assert list_changes(db, since, 5, entity="configs")["changes"] == []
+
+
+def test_read_page_after_purge(db):
+    _service(db)
+    ids = _ids(db)
+    old = ids[:3]
+    db.query(Change).filter(Change.id.in_(old)).update({"created_at": datetime(2000, 1, 1)},
+                                                       synchronize_session=False)
+    db.commit()
+    assert purge_changes(db, retention_days=1) == 3
+    oldest = old[-1] + 1
+    assert read_page(db, oldest - 1, len(ids))["next"] == ids[-1]
+    with pytest.raises(HTTPException) as e:
+        read_page(db, oldest - 2, 10)
+    assert e.value.status_code == 410
+    # since=0 表示全量同步，不受清理影响
+    assert read_page(db, 0, 10)["changes"][0].id == oldest
+    assert stable_revision(db) == ids[-1]
+    # 清理不影响后续分配
+    _service(db)
+    _contiguous(db)
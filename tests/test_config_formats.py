@@ -0,0 +1,84 @@
+# 配置格式的解析、规范化与渲染（utils/config_formats.py、services/config_service.py）
+# 用法（项目根目录）：python -m pytest tests/test_config_formats.py
+import json
+
+import pytest
+from fastapi import HTTPException
+
+from services.config_service import normalize_content, parse_content, to_str_map
+from utils.config_formats import FormatError, negotiate, parse, render
+
+
+def test_ini_sections():
+    text = "[DEFAULT]\nlevel = info\nport = 1\n\n[db]\nhost = h\nport = 5\n\n[cache]\nport = 1\n"
+    m = to_str_map(parse("ini", text))
+    # DEFAULT 段在顶层；段内只保留与 DEFAULT 不同的键，段整体为 JSON 字符串
+    assert {k: json.loads(v) if v.startswith("{") else v for k, v in m.items()} == \
+           {"level": "info", "port": "1", "db": {"host": "h", "port": "5"}, "cache": {}}
+    out = render("ini", {"level": "info", "db": '{"host": "h", "port": "5"}'})
+    assert out == "[DEFAULT]\nlevel = info\n\n[db]\nhost = h\nport = 5\n\n"
+    assert to_str_map(parse("ini", out)) == {"level": "info", "db": '{"host": "h", "port": "5"}'}
+
+
+def test_ini_keeps_case_and_raw_values():
+    m = to_str_map(parse("ini", "[DEFAULT]\nDB_Host = %(x)s\n"))
+    assert m == {"DB_Host": "%(x)s"}
+
+
+def test_ini_nested_values_rendered_in_default():
+    # 嵌套对象或数组不能成为 INI 段，按字符串放在 DEFAULT 段
+    out = render("ini", {"a": '{"b": {"c": 1}}', "l": "[1, 2]"})
+    assert out == '[DEFAULT]\na = {"b": {"c": 1}}\nl = [1, 2]\n\n'
+
+
+def test_toml_stringification():
+    text = 'a = 1\nb = true\nf = 1.5\nd = 2024-01-02\nt = 2024-01-02T03:04:05Z\n"k x" = "v"\n' \
+           '[s]\nx = [1, 2]\nwhen = 2024-01-02\n'
+    m = to_str_map(parse("toml", text))
+    assert m == {"a": "1", "b": "True", "f": "1.5", "d": "2024-01-02", "t": "2024-01-02 03:04:05+00:00",
+                 "k x": "v", "s": '{"x": [1, 2], "when": "2024-01-02"}'}
+    out = render("toml", m)
+    assert out.splitlines()[:2] == ['a = "1"', 'b = "True"']
+    assert '"k x" = "v"' in out
+    # 渲染结果仍是合法 TOML，且规范映射不变
+    assert to_str_map(parse("toml", out)) == m
+
+
+def test_yaml_dates():
+    m = to_str_map(parse("yaml", "d: 2024-01-02\nts: 2024-01-02 03:04:05\nn: [2024-01-02, 1]\n"
+                                 "o: {when: 2024-01-02, tags: {2024-01-02: x}}\n1: one\nx: null\n"))
+    assert m == {"d": "2024-01-02", "ts": "2024-01-02 03:04:05", "n": '["2024-01-02", 1]',
+                 "o": '{"when": "2024-01-02", "tags": {"2024-01-02": "x"}}', "1": "one", "x": "None"}
+    assert to_str_map(parse("yaml", render("yaml", m))) == m
+
+
+def test_json_normalized_other_formats_kept():
+    stored, m = normalize_content("json", '{"b": 1, "a": {"x": true}}')
+    assert m == {"b": "1", "a": '{"x": true}'}
+    assert json.loads(stored) == m
+    text = "a: 1\n# comment\n"
+    assert normalize_content("yaml", text) == (text, {"a": "1"})
+
+
+@pytest.mark.parametrize("fmt, text", [
+    ("json", "{"), ("yaml", "a: [1"), ("toml", "a = "), ("ini", "no section"), ("xml", "<a/>"),
+])
+def test_parse_errors(fmt, text):
+    with pytest.raises(FormatError):
+        parse(fmt, text)
+    with pytest.raises(HTTPException) as e:
+        parse_content(fmt, text)
+    assert e.value.status_code == 400
+
+
+def test_content_must_be_object():
+    with pytest.raises(HTTPException) as e:
+        parse_content("yaml", "- 1\n- 2\n")
+    assert e.value.detail == "content must be object"
+
+
+def test_negotiate():
+    assert negotiate(None) is None
+    assert negotiate("text/html, application/x-yaml;q=0.9") == "yaml"
+    assert negotiate("APPLICATION/TOML") == "toml"
+    assert negotiate("*/*") is None
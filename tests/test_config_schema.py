@@ -0,0 +1,82 @@
+# schema_def 子集的编译与校验（utils/config_schema.py）
+# 用法（项目根目录）：python -m pytest tests/test_config_schema.py
+import json
+
+import pytest
+
+from utils.config_schema import SchemaError, compile_schema
+
+
+def _schema(**props) -> str:
+    return json.dumps({"properties": props})
+
+
+def _errors(schema_def: str, content: dict) -> dict:
+    return {e["key"]: e["error"] for e in compile_schema(schema_def).validate(content)}
+
+
+def test_type_checks():
+    schema = _schema(PORT={"type": "integer"}, RATIO={"type": "number"}, DEBUG={"type": "boolean"},
+                     OPTS={"type": "object"}, HOSTS={"type": "array"}, NAME={"type": "string"})
+    ok = {"PORT": "-8080", "RATIO": "0.5", "DEBUG": "Yes", "OPTS": '{"a": 1}', "HOSTS": "[1, 2]", "NAME": "x"}
+    assert _errors(schema, ok) == {}
+    bad = {"PORT": "80.5", "RATIO": "half", "DEBUG": "maybe", "OPTS": "[1]", "HOSTS": "{}", "NAME": "1"}
+    assert _errors(schema, bad) == {"PORT": "expected integer", "RATIO": "expected number",
+                                    "DEBUG": "expected boolean", "OPTS": "expected object", "HOSTS": "expected array"}
+
+
+def test_keywords():
+    schema = _schema(PORT={"type": "integer", "minimum": 1, "maximum": 65535},
+                     MODE={"enum": ["dev", "prod", 1]},
+                     HOST={"type": "string", "pattern": "^[a-z.]+$", "minLength": 3, "maxLength": 8})
+    assert _errors(schema, {"PORT": "443", "MODE": "1", "HOST": "a.b.c"}) == {}
+    assert _errors(schema, {"PORT": "0", "MODE": "test", "HOST": "A.B"}) == {
+        "PORT": "less than minimum 1", "MODE": "value not in enum", "HOST": "does not match pattern '^[a-z.]+$'"}
+    assert _errors(schema, {"PORT": "70000", "HOST": "ab"}) == {"PORT": "greater than maximum 65535",
+                                                                 "HOST": "shorter than 3"}
+    assert _errors(schema, {"HOST": "abcdefghi"}) == {"HOST": "longer than 8"}
+    # 类型不符时只报类型错误，不再做范围检查
+    assert _errors(schema, {"PORT": "x"}) == {"PORT": "expected integer"}
+
+
+def test_required_and_additional_properties():
+    schema = json.dumps({"required": ["A"], "additionalProperties": False, "properties": {"A": {}, "B": {}}})
+    assert _errors(schema, {"A": "1", "B": "2"}) == {}
+    assert _errors(schema, {"B": "2", "C": "3"}) == {"A": "required", "C": "additional property not allowed"}
+    assert _errors(json.dumps({"properties": {"A": {}}}), {"C": "3"}) == {}
+
+
+def test_secret_keys():
+    schema = compile_schema(_schema(PW={"type": "string", "secret": True}, USER={"secret": "yes"}, HOST={}))
+    assert schema.secret_keys == frozenset({"PW"})
+
+
+@pytest.mark.parametrize("schema_def, message", [
+    ("not json", "schema_def must be valid json"),
+    ("[]", "schema_def must be object"),
+    ('{"required": "A"}', "required must be a list of strings"),
+    ('{"properties": []}', "properties must be an object"),
+    (_schema(A=1), "property 'A' must be an object"),
+    (_schema(A={"type": "uuid"}), "property 'A' has unsupported type 'uuid'"),
+    (_schema(A={"enum": "a"}), "property 'A' enum must be a list"),
+    (_schema(A={"pattern": "("}), "property 'A' has invalid pattern"),
+    (_schema(A={"pattern": 1}), "property 'A' has invalid pattern"),
+    (_schema(A={"minLength": -1}), "property 'A' minLength must be a non-negative integer"),
+    (_schema(A={"minLength": "3"}), "property 'A' minLength must be a non-negative integer"),
+    (_schema(A={"maxLength": True}), "property 'A' maxLength must be a non-negative integer"),
+    (_schema(A={"maxLength": 2.5}), "property 'A' maxLength must be a non-negative integer"),
+    (_schema(A={"type": "string", "minimum": 1}), "property 'A' minimum/maximum requires integer or number type"),
+    (_schema(A={"type": "integer", "minimum": "1"}), "property 'A' minimum must be a number"),
+    (_schema(A={"type": "number", "maximum": False}), "property 'A' maximum must be a number"),
+    ('{"properties": {"A": {"type": "number", "maximum": Infinity}}}', "property 'A' maximum must be a number"),
+    ('{"properties": {"A": {"type": "number", "minimum": NaN}}}', "property 'A' minimum must be a number"),
+])
+def test_invalid_schema(schema_def, message):
+    with pytest.raises(SchemaError) as e:
+        compile_schema(schema_def)
+    assert str(e.value) == message
+
+
+def test_compiled_once_per_text():
+    schema_def = _schema(A={"type": "integer"})
+    assert compile_schema(schema_def) is compile_schema(schema_def)
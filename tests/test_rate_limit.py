@@ -0,0 +1,52 @@
+# 进程内令牌桶的计数与淘汰（middleware/rate_limit.py MemoryBuckets），时钟由测试推进
+# 用法（项目根目录）：python -m pytest tests/test_rate_limit.py
+import asyncio
+
+import pytest
+
+from middleware import rate_limit
+from middleware.rate_limit import MemoryBuckets
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rate_limit.time, "monotonic", lambda: now[0])
+    return now
+
+
+def _take(b: MemoryBuckets, key: str, rate: float = 2, burst: float = 3) -> float:
+    return asyncio.run(b.acquire(key, rate, burst))
+
+
+def test_burst_then_wait(clock):
+    b = MemoryBuckets()
+    assert [_take(b, "k") for _ in range(3)] == [0, 0, 0]
+    # 桶空：还差 1 个令牌，按 2/s 补充需 0.5s
+    assert _take(b, "k") == pytest.approx(0.5)
+    clock[0] += 0.25
+    assert _take(b, "k") == pytest.approx(0.25)
+    clock[0] += 0.25
+    assert _take(b, "k") == 0
+    # 各键独立计数
+    assert _take(b, "other") == 0
+
+
+def test_refill_capped_at_burst(clock):
+    b = MemoryBuckets()
+    for _ in range(3):
+        _take(b, "k")
+    clock[0] += 100
+    assert [_take(b, "k") for _ in range(3)] == [0, 0, 0]
+    assert _take(b, "k") > 0
+
+
+def test_evicts_lru_and_idle_keys(clock):
+    b = MemoryBuckets(max_keys=2, idle_ttl=10)
+    for key in ("a", "b", "c"):
+        _take(b, key)
+    # 超出 max_keys 时淘汰最久未访问的键；空闲超过 idle_ttl 的键也被淘汰
+    assert len(b) == 2 and "a" not in b._buckets
+    clock[0] += 11
+    _take(b, "d")
+    assert list(b._buckets) == ["d"]
@@ -0,0 +1,116 @@
+# secret 键的信封加密（services/secret_service.py）：封装、沿用密文、回传密文还原
+# 用法（项目根目录）：python -m pytest tests/test_secret_sealing.py
+import itertools
+
+import pytest
+from fastapi import HTTPException
+
+import database
+from models.v1.configs import Config, ConfigDataKey
+from models.v1.services import Service
+from services.secret_service import ENC_PREFIX, decrypt_map, is_encrypted, open_submitted, seal
+
+_seq = itertools.count(1)
+SECRETS = frozenset({"PW", "TOKEN"})
+
+
+@pytest.fixture
+def db():
+    s = database.SessionLocal()
+    try:
+        yield s
+    finally:
+        s.rollback()
+        s.close()
+
+
+def _config(db) -> Config:
+    n = next(_seq)
+    svc = Service(code=f"seal{n}", name=f"seal{n}")
+    db.add(svc)
+    db.flush()
+    c = Config(service_id=svc.id, env="prod", format="json", content="{}", version="1.0.0")
+    db.add(c)
+    # 提交后 id 不会被回滚复用：DEK 按 config_id 缓存在进程内
+    db.commit()
+    return c
+
+
+def test_seal_encrypts_only_secret_keys(db):
+    c = _config(db)
+    sealed = seal(db, c, {"PW": "p@ss", "HOST": "h"}, SECRETS, {})
+    assert sealed["HOST"] == "h"
+    assert is_encrypted(sealed["PW"]) and "p@ss" not in sealed["PW"]
+    # 每个配置一把数据密钥，由主密钥包裹后落库
+    db.flush()
+    assert db.query(ConfigDataKey).filter(ConfigDataKey.config_id == c.id).count() == 1
+    assert decrypt_map(db, c.id, sealed) == {"PW": "p@ss", "HOST": "h"}
+
+
+def test_seal_without_secret_keys_is_noop(db):
+    c = _config(db)
+    m = {"HOST": "h"}
+    assert seal(db, c, m, SECRETS, {}) is m
+    assert db.query(ConfigDataKey).filter(ConfigDataKey.config_id == c.id).count() == 0
+
+
+def test_seal_reuses_unchanged_ciphertext(db):
+    c = _config(db)
+    first = seal(db, c, {"PW": "a", "TOKEN": "t"}, SECRETS, {})
+    # 明文未变的键沿用上一版本密文，版本 diff 中不出现无意义的变动
+    second = seal(db, c, {"PW": "a", "TOKEN": "t2"}, SECRETS, first)
+    assert second["PW"] == first["PW"]
+    assert second["TOKEN"] != first["TOKEN"]
+    assert decrypt_map(db, c.id, second) == {"PW": "a", "TOKEN": "t2"}
+    # 上一版本的值不是密文（例如 schema 新标记为 secret）时重新加密
+    third = seal(db, c, {"PW": "a"}, SECRETS, {"PW": "a"})
+    assert is_encrypted(third["PW"]) and third["PW"] != first["PW"]
+
+
+def test_open_submitted_restores_echoed_ciphertext(db):
+    c = _config(db)
+    sealed = seal(db, c, {"PW": "a", "HOST": "h"}, SECRETS, {})
+    # 控制台原样回传密文：还原为明文后再统一校验与封装
+    assert open_submitted(db, c, {"PW": sealed["PW"], "HOST": "h2"}) == {"PW": "a", "HOST": "h2"}
+    plain = {"PW": "b"}
+    assert open_submitted(db, c, plain) is plain
+
+
+def test_open_submitted_rejects_foreign_ciphertext(db):
+    c, other = _config(db), _config(db)
+    sealed = seal(db, other, {"PW": "a"}, SECRETS, {})
+    # 没有数据密钥的配置
+    with pytest.raises(HTTPException) as e:
+        open_submitted(db, c, {"PW": sealed["PW"]})
+    assert (e.value.status_code, e.value.detail) == (400, "encrypted value without data key")
+    # 用另一个配置的数据密钥加密的值
+    seal(db, c, {"PW": "x"}, SECRETS, {})
+    with pytest.raises(HTTPException) as e:
+        open_submitted(db, c, {"PW": sealed["PW"]})
+    assert (e.value.status_code, e.value.detail) == (400, "PW: encrypted value cannot be decrypted")
+    with pytest.raises(HTTPException):
+        open_submitted(db, c, {"PW": ENC_PREFIX + "garbage"})
+
+
+def test_sealed_values_through_api():
+    from fastapi.testclient import TestClient
+
+    import main
+    from settings import settings
+
+    client = TestClient(main.app, client=("127.0.0.1", 50000))
+    h = {"Authorization": "Bearer " + client.post("/api/v1/auth/login", json={
+        "username": settings.ADMIN_USERNAME, "password": settings.ADMIN_PASSWORD}).json()["token"]}
+    assert client.post("/api/v1/services", json={"code": "sealapi", "name": "sealapi"}, headers=h).status_code == 200
+    schema = '{"properties": {"PW": {"type": "string", "secret": true}}}'
+    r = client.post("/api/v1/configs", json={"service_code": "sealapi", "env": "prod", "format": "json",
+                                             "content": '{"PW": "p", "HOST": "h"}', "schema_def": schema,
+                                             "version": "1.0.0"}, headers=h)
+    assert r.status_code == 200, r.text
+    c = r.json()
+    assert '"p"' not in c["content"] and ENC_PREFIX in c["content"]
+    # 原样回写（含密文）得到相同的密文
+    r = client.put(f"/api/v1/configs/{c['id']}", json={"content": c["content"], "schema_def": schema,
+                                                       "base_version": "1.0.0", "version": "1.0.1"}, headers=h)
+    assert r.status_code == 200, r.text
+    assert r.json()["content"] == c["content"]
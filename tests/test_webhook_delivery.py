@@ -0,0 +1,216 @@
+# webhook 推送链路测试：临时 SQLite 库（tests/conftest.py）+ 线程内的接收端桩（tests/webhook_stub.py），无需 MySQL
+# 用法（项目根目录）：python -m pytest tests/test_webhook_delivery.py
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+
+import httpx
+
+from settings import settings
+
+# 缩短轮询与退避，重试在秒级内完成；WebhookDispatcher 在构造时读取
+settings.config.update({
+    "WEBHOOK_POLL_INTERVAL": "0.05",
+    "WEBHOOK_BACKOFF_BASE": "0.1",
+    "WEBHOOK_BACKOFF_CAP": "0.4",
+    "WEBHOOK_MAX_ATTEMPTS": "30",
+})
+
+from fastapi.testclient import TestClient
+
+import database
+import main
+from models.v1.webhooks import Webhook, WebhookOutbox
+from services.webhook_service import purge_deleted_webhooks
+from tasks.app_data_push_task import WebhookDispatcher, sign
+from webhook_stub import WebhookStub
+
+client = TestClient(main.app, client=("127.0.0.1", 50000))
+H = {"Authorization": "Bearer " + client.post(
+    "/api/v1/auth/login", json={"username": settings.ADMIN_USERNAME, "password": settings.ADMIN_PASSWORD}).json()["token"]}
+
+
+def _setup(code: str, stub: WebhookStub) -> int:
+    assert client.post("/api/v1/services", json={"code": code, "name": code}, headers=H).status_code == 200
+    r = client.post("/api/v1/webhooks", json={"service_code": code, "url": stub.url, "secret": stub.secret}, headers=H)
+    assert r.status_code == 200, r.text
+    return r.json()["id"]
+
+
+def _change(code: str, n: int) -> None:
+    """创建配置后再更新 n-1 次，每次变更写一行发件箱。"""
+    r = client.post("/api/v1/configs", json={"service_code": code, "env": "prod", "format": "json",
+                                             "content": '{"V": "0"}', "version": "1.0.0"}, headers=H)
+    assert r.status_code == 200, r.text
+    cid = r.json()["id"]
+    for i in range(1, n):
+        r = client.put(f"/api/v1/configs/{cid}", json={"content": f'{{"V": "{i}"}}', "base_version": f"1.0.{i - 1}",
+                                                       "version": f"1.0.{i}"}, headers=H)
+        assert r.status_code == 200, r.text
+
+
+def _outbox(webhook_id: int) -> list[WebhookOutbox]:
+    db = database.SessionLocal()
+    try:
+        return db.query(WebhookOutbox).filter(WebhookOutbox.webhook_id == webhook_id).order_by(WebhookOutbox.id).all()
+    finally:
+        db.close()
+
+
+async def _drain(webhook_id: int, timeout: float = 30, linger: float = 0.0) -> WebhookDispatcher:
+    """启动一个新的投递协程（相当于进程重启），直到该 webhook 的发件箱全部投递完成，再多运行 linger 秒。"""
+    d = WebhookDispatcher()
+    await d.start()
+    try:
+        deadline = time.monotonic() + timeout
+        while any(r.status != "delivered" for r in _outbox(webhook_id)):
+            assert time.monotonic() < deadline, [(r.id, r.status, r.attempts, r.last_error) for r in _outbox(webhook_id)]
+            await asyncio.sleep(0.05)
+        await asyncio.sleep(linger)
+    finally:
+        await d.stop()
+    return d
+
+
+def test_signature_verified_by_stub():
+    stub = WebhookStub("sig-secret").start()
+    try:
+        hook_id = _setup("sig", stub)
+        _change("sig", 3)
+        asyncio.run(_drain(hook_id))
+        rows = _outbox(hook_id)
+        assert len(rows) == 3
+        assert stub.rejected == 0
+        assert sorted(stub.delivered) == sorted(str(r.id) for r in rows)
+        assert [p[0]["version"] for _, p in sorted(stub.delivered.items(), key=lambda i: int(i[0]))] == \
+               ["1.0.0", "1.0.1", "1.0.2"]
+        # 错误的密钥签名会被接收端拒绝
+        ts = str(int(time.time()))
+        bad = httpx.post(stub.url, content=b"{}", headers={"X-FastConfig-Timestamp": ts, "X-FastConfig-Delivery": "x",
+                                                           "X-FastConfig-Signature": "sha256=" + sign("wrong", ts, "{}")})
+        assert bad.status_code == 401
+    finally:
+        stub.stop()
+
+
+def test_retry_with_backoff_until_delivered():
+    stub = WebhookStub("retry-secret", fail_rate=0.5, seed=7).start()
+    try:
+        hook_id = _setup("retry", stub)
+        _change("retry", 20)
+        d = asyncio.run(_drain(hook_id))
+        rows = _outbox(hook_id)
+        assert stub.rejected == 0
+        assert d.stats["retried"] > 0
+        retried = [r for r in rows if r.attempts > 1]
+        assert retried
+        base, cap = float(settings.WEBHOOK_BACKOFF_BASE), float(settings.WEBHOOK_BACKOFF_CAP)
+        for r in retried:
+            attempts = stub.attempts[str(r.id)]
+            assert len(attempts) == r.attempts
+            assert [code for _, code in attempts[:-1]] == [500] * (r.attempts - 1)
+            assert attempts[-1][1] == 204
+            # 第 n 次失败后至少等待 min(cap, base*2^(n-1)) / 2
+            for n, ((t0, _), (t1, _)) in enumerate(zip(attempts, attempts[1:]), start=1):
+                assert t1 - t0 >= min(cap, base * 2 ** (n - 1)) / 2 * 0.9
+        # 每条变更最终恰好成功接收一次
+        assert all(len(stub.delivered[str(r.id)]) == 1 for r in rows)
+    finally:
+        stub.stop()
+
+
+def test_exactly_once_after_restart():
+    stub = WebhookStub("restart-secret").start()
+    try:
+        hook_id = _setup("restart", stub)
+        # 投递协程未运行时写入的变更留在发件箱中
+        _change("restart", 5)
+        rows = _outbox(hook_id)
+        assert [r.status for r in rows] == ["pending"] * 5
+        # 模拟崩溃：一行已被旧进程领取但租约已过期，另一行在旧进程上已投递完成
+        db = database.SessionLocal()
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        db.query(WebhookOutbox).filter(WebhookOutbox.id == rows[0].id).update(
+            {"status": "delivering", "locked_by": "dead-owner", "locked_until": now - timedelta(seconds=1)})
+        db.query(WebhookOutbox).filter(WebhookOutbox.id == rows[1].id).update(
+            {"status": "delivered", "attempts": 1, "delivered_at": now})
+        db.commit()
+        db.close()
+
+        asyncio.run(_drain(hook_id))
+        expected = {str(r.id) for r in rows[2:]} | {str(rows[0].id)}
+        assert set(stub.delivered) == expected
+        assert all(len(v) == 1 for v in stub.delivered.values())
+
+        # 再次重启：发件箱已清空，不会重复投递
+        d = asyncio.run(_drain(hook_id, linger=0.5))
+        assert d.stats["claimed"] == 0
+        assert set(stub.delivered) == expected
+        assert all(len(v) == 1 for v in stub.delivered.values())
+    finally:
+        stub.stop()
+
+
+def test_undecryptable_secret_fails_only_its_rows():
+    stub = WebhookStub("good-secret").start()
+    try:
+        good = _setup("badkey", stub)
+        bad = client.post("/api/v1/webhooks", json={"service_code": "badkey", "url": stub.url, "secret": "x"},
+                          headers=H).json()["id"]
+        db = database.SessionLocal()
+        db.query(Webhook).filter(Webhook.id == bad).update({"secret_ciphertext": b"not-a-fernet-token"})
+        db.commit()
+        db.close()
+        _change("badkey", 3)
+        d = asyncio.run(_drain(good))
+        assert len(stub.delivered) >= 3
+        assert [(r.status, r.last_error) for r in _outbox(bad)] == [("failed", "webhook secret cannot be decrypted")] * 3
+        assert d.stats["failed"] == 3
+    finally:
+        stub.stop()
+
+
+def test_deleted_webhook_purged_after_in_flight_delivery():
+    stub = WebhookStub("purge-secret").start()
+    try:
+        hook_id = _setup("purge", stub)
+        _change("purge", 2)
+        d = WebhookDispatcher()
+        jobs = d._claim(1)
+        assert len(jobs) == 1
+        # 一行投递中：只停用，其余未完成的行作废
+        assert client.delete(f"/api/v1/webhooks/{hook_id}", headers=H).json() == \
+               {"ok": True, "deleted": False, "in_flight": 1}
+        assert [r.status for r in _outbox(hook_id)] == ["delivering"]
+        # 最后一个在途投递结束后硬删除
+        d._finish(jobs[0], 204, None)
+        db = database.SessionLocal()
+        try:
+            assert db.get(Webhook, hook_id) is None
+        finally:
+            db.close()
+        assert _outbox(hook_id) == []
+    finally:
+        stub.stop()
+
+
+def test_purge_deleted_webhook_after_lease_expired():
+    stub = WebhookStub("lease-secret").start()
+    try:
+        hook_id = _setup("lease", stub)
+        _change("lease", 1)
+        assert WebhookDispatcher()._claim(1)
+        assert client.delete(f"/api/v1/webhooks/{hook_id}", headers=H).json()["deleted"] is False
+        db = database.SessionLocal()
+        try:
+            # 投递进程崩溃：租约未过期前不清理，过期后由 webhook_purge 清理
+            assert purge_deleted_webhooks(db) == 0
+            db.query(WebhookOutbox).filter(WebhookOutbox.webhook_id == hook_id).update(
+                {"locked_until": datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=1)})
+            db.commit()
+            assert purge_deleted_webhooks(db) == 1
+            assert db.get(Webhook, hook_id) is None
+        finally:
+            db.close()
+    finally:
+        stub.stop()
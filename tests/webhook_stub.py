@@ -0,0 +1,95 @@
+# 本地 webhook 接收端桩：校验签名并记录每次投递，可按比例返回 500 以观察退避重试
+# 用法（项目根目录）：python tests/webhook_stub.py <secret> [端口] [失败比例]
+# 然后注册 webhook：POST /api/v1/webhooks {"service_code": "...", "url": "http://127.0.0.1:<端口>/hook", "secret": "<secret>"}
+# 自动化测试（tests/test_webhook_delivery.py）在线程中启动 WebhookStub，按 attempts / delivered 断言。
+import hashlib
+import hmac
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MAX_SKEW = 300
+
+
+class WebhookStub:
+    def __init__(self, secret: str, port: int = 0, fail_rate: float = 0.0, seed: int | None = None, verbose: bool = False):
+        self.secret = secret
+        self.fail_rate = fail_rate
+        self.verbose = verbose
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        # delivery id -> [(时间, 状态码)]，按到达顺序
+        self.attempts: dict[str, list[tuple[float, int]]] = {}
+        # delivery id -> 成功接收的负载（含重复投递）
+        self.delivered: dict[str, list[dict]] = {}
+        self.rejected = 0
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}/hook"
+
+    def start(self) -> "WebhookStub":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _receive(self, headers, body: str) -> int:
+        ts = headers.get("X-FastConfig-Timestamp", "")
+        sig = headers.get("X-FastConfig-Signature", "")
+        delivery = headers.get("X-FastConfig-Delivery", "")
+        expected = "sha256=" + hmac.new(self.secret.encode(), f"{ts}.{body}".encode(), hashlib.sha256).hexdigest()
+        with self._lock:
+            if not hmac.compare_digest(sig, expected) or not ts.isdigit() or abs(time.time() - int(ts)) > MAX_SKEW:
+                self.rejected += 1
+                self._log(f"[reject] delivery={delivery} bad signature")
+                return 401
+            code = 500 if self._rng.random() < self.fail_rate else 204
+            self.attempts.setdefault(delivery, []).append((time.monotonic(), code))
+            if code == 500:
+                self._log(f"[fail]   delivery={delivery} simulated 500")
+                return code
+            dup = " (duplicate)" if delivery in self.delivered else ""
+            payload = json.loads(body)
+            self.delivered.setdefault(delivery, []).append(payload)
+        self._log(f"[ok]     delivery={delivery} event={headers.get('X-FastConfig-Event')}{dup} {payload}")
+        return code
+
+    def _log(self, msg: str) -> None:
+        if self.verbose:
+            print(msg)
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0)).decode()
+                self.send_response(stub._receive(self.headers, body))
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+if __name__ == "__main__":
+    secret = sys.argv[1] if len(sys.argv) > 1 else "change-me"
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else 9540
+    fail_rate = float(sys.argv[3]) if len(sys.argv) > 3 else 0.0
+    stub = WebhookStub(secret, port, fail_rate, verbose=True)
+    print(f"webhook stub listening on {stub.url} (fail rate {fail_rate})")
+    try:
+        stub._server.serve_forever()
+    except KeyboardInterrupt:
+        pass